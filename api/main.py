@@ -1,101 +1,92 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from typing import List, Dict, Optional
-
-from . import routes
-from .database import database, models
-from .services import openai_service
-from .utils import logger
-from .utils.utils import generate_token
-
-# Import Statements:
-from fastapi.security import OAuth2PasswordBearer
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from datetime import datetime
-from typing import List, Optional
-import os, json 
-
-# Third-Party Packages:
-from fastapi.responses import JSONResponse  # 0.115.2: Modern API framework for building APIs with type safety, automatic documentation, and ASGI support
-import uvicorn  # 0.32.0: ASGI server for running FastAPI applications
-from pydantic import BaseModel  # 2.9.2:  Data validation and type checking for API models
-from sqlalchemy import create_engine  # 2.0.36: Object-relational mapper for database interactions
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker  # Manage database sessions efficiently
-import openai  # 1.52.0: Interact with OpenAI's API for query processing
-import requests  # 2.32.3: Make HTTP requests to external APIs, including OpenAI
-import json  # Built-in library for working with JSON data
-from python_dotenv import load_dotenv  # 1.0.1: Load environment variables from a `.env` file
-import pyjwt  # 2.9.0: Generate and verify JSON Web Tokens (JWT) for authentication
-from bcrypt import hashpw, gensalt  # 4.2.0: Securely hash passwords using bcrypt
-import psycopg2_binary  # 2.9.10: PostgreSQL database connector for Python
-import redis  # 5.1.1: Redis library for caching frequently accessed data
-
-# Internal Modules:
-from .services.openai_service import OpenAIService  # Import OpenAI service for handling API interactions
-from .database.database import engine, SessionLocal, Base  # Import database configurations and session management
-from .database.models import User, Query  # Import data models for database interaction
-from .utils.logger import logger # Import logging module
-from .utils.utils import generate_token # Import utility functions
-
-# Environment Variable Loading:
-load_dotenv()
-
-# Configuration:
-DATABASE_URL = os.getenv("DATABASE_URL")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-JWT_SECRET = os.getenv("JWT_SECRET")
+"""
+Application entry point.
 
-# Package Initialization:
-openai.api_key = OPENAI_API_KEY
+`create_app()` builds the FastAPI application. Engines and connection pools
+are created in its startup hook and released in its shutdown hook, and
+modules that only the server needs are imported when they are first used,
+so importing this module stays cheap.
 
-# Database Connection:
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Run with:
+    uvicorn --factory api.main:create_app
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
-# Base Model:
-Base = declarative_base()
-
-# Redis Connection:
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
-
-# Main Components:
-app = FastAPI()
-
-# CORS Configuration:
-origins = ["*"]  # Adjust origins as needed for security
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Authentication Setup:
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
 
-# Dependency Injection:
-def get_db():
-    db = SessionLocal()
+from config.settings import settings
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Creates the shared engines and clients on startup and closes them on shutdown.
+    """
+    from api import routes
+    from core.database import database
+    from core.services import jobs
+    from core.utils.logger import logger  # Attaches the log handlers
+    from core.utils.redis_client import aclose_redis, close_redis
+    from core.utils.utils import shutdown_hashing_executor
+
+    database.get_engine()
+    if settings.WRITE_BEHIND_ENABLED:
+        database.get_write_behind_queue()
+    if settings.JOBS_ENABLED:
+        jobs.start_workers(routes.openai_service)
+    logger.info("Application started")
     try:
-        yield db
+        yield
     finally:
-        db.close()
-
-# Routes:
-app.include_router(routes.router)
+        jobs.stop_workers(settings.SERVER_GRACEFUL_TIMEOUT)
+        database.close_write_behind_queue()
+        await routes.openai_service.aclose()
+        shutdown_hashing_executor()
+        await database.dispose_async_engine()
+        database.dispose_engine()
+        await aclose_redis()
+        close_redis()
+        logger.info("Application stopped")
+
+def create_app() -> FastAPI:
+    """
+    Builds the application: middleware, routes and lifecycle hooks.
+    """
+    from api import routes
+    from core.utils.metrics import MetricsMiddleware
+
+    app = FastAPI(lifespan=lifespan)
+
+    # CORS Configuration:
+    origins = ["*"]  # Adjust origins as needed for security
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(MetricsMiddleware)  # No-op unless METRICS_ENABLED is set
+
+    # Routes:
+    app.include_router(routes.router)
+    return app
+
+def __getattr__(name: str) -> Any:
+    # `api.main:app` predates the factory; build the app on first access.
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Start Server:
 if __name__ == "__main__":
+    import uvicorn  # 0.32.0: ASGI server for running FastAPI applications
+
     uvicorn.run(
-        "api.main:app",
+        "api.main:create_app",
+        factory=True,
         host="0.0.0.0",
         port=8000,  # Or the port specified in the .env file
         reload=True,
-    )
\ No newline at end of file
+    )
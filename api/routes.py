@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from pydantic import BaseModel, conint, conlist
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import openai  # 0.28.1: Interact with OpenAI's API for query processing
+
+from config.settings import settings
+from core.database import database, transfer
+from core.services import jobs
+from core.services.openai_service import OpenAIService
+from core.utils import metrics
+from core.utils.utils import verify_token
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+openai_service = OpenAIService()
+
+class QueryRequest(BaseModel):
+    query: str
+    model: str = "text-davinci-003"
+    parameters: Dict[str, Any] = {}
+
+class BatchQueryRequest(BaseModel):
+    queries: conlist(QueryRequest, min_items=1, max_items=settings.QUERY_BATCH_MAX_ITEMS)
+
+class BatchQueryResult(BaseModel):
+    query_id: Optional[int] = None
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryResult]
+
+class JobRequest(QueryRequest):
+    priority: conint(ge=0, le=jobs.MAX_PRIORITY) = 5
+    webhook_url: Optional[str] = None
+
+class JobStatus(BaseModel):
+    query_id: int
+    status: str
+    attempts: int = 0
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+class QuerySummary(BaseModel):
+    id: int
+    model: str
+    timestamp: datetime
+
+    class Config:
+        orm_mode = True
+
+class QueryDetail(QuerySummary):
+    query_text: str
+    parameters: Optional[Dict[str, Any]]
+    response: Optional[str]  # None while the query's job is pending
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+class QueryPage(BaseModel):
+    items: List[Union[QueryDetail, QuerySummary]]
+    next_cursor: Optional[str]
+
+def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    """Resolves the authenticated user's ID from the bearer token."""
+    payload = verify_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload["user_id"]
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Formats a JSON payload as a Server-Sent Events message."""
+    message = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{message}" if event else message
+
+async def store_response(user_id: int, request: QueryRequest, response: str, prompt_tokens: Optional[int] = None):
+    """Persists a completed query in its own session, outside the request's lifetime."""
+    async with database.AsyncSessionLocal() as db:
+        return await database.astore_query_and_response(
+            db,
+            user_id=user_id,
+            query_text=request.query,
+            model=request.model,
+            parameters=request.parameters,
+            response=response,
+            prompt_tokens=prompt_tokens,
+        )
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics() -> Response:
+    """Exposes Prometheus metrics; 404 while METRICS_ENABLED is off."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled.")
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+@router.post("/query/stream")
+async def stream_query(request: QueryRequest, user_id: int = Depends(get_current_user_id)) -> StreamingResponse:
+    """
+    Streams a completion to the client as Server-Sent Events.
+
+    Each generated fragment is sent as a `data: {"text": ...}` message as soon
+    as it arrives. Once the stream ends the full response is stored and a
+    final `done` event carries its query ID (null while write-behind
+    persistence is enabled, as the row is not inserted yet). Upstream
+    failures end the stream with an `error` event instead.
+    """
+
+    async def events() -> AsyncIterator[str]:
+        fragments = []
+        usage = {}
+        try:
+            async for text in openai_service.astream_query(
+                request.query, request.model, request.parameters, user_id=user_id, usage=usage, fragments=fragments
+            ):
+                yield sse_event({"text": text})
+        except openai.error.OpenAIError as e:
+            logger.error("Streaming completion failed: %s", e)
+            yield sse_event({"detail": str(e)}, event="error")
+            return
+        query = await store_response(user_id, request, "".join(fragments), usage.get("prompt_tokens"))
+        yield sse_event({"query_id": query.id}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def batch_query(request: BatchQueryRequest, user_id: int = Depends(get_current_user_id)) -> BatchQueryResponse:
+    """
+    Processes several queries in one call, returning one result per query in request order.
+
+    Queries are fanned out upstream with at most QUERY_BATCH_CONCURRENCY in
+    flight. A failing query yields a result with `error` set while the others
+    still complete; the successful ones are stored in a single transaction.
+    """
+    items = [dict(query.dict(), usage={}) for query in request.queries]
+    responses = await openai_service.aprocess_queries(
+        items,
+        concurrency=settings.QUERY_BATCH_CONCURRENCY,
+        user_id=user_id,
+    )
+    results = []
+    stored = []
+    for query, item, response in zip(request.queries, items, responses):
+        if isinstance(response, Exception):
+            logger.error("Batch query failed: %s", response)
+            results.append(BatchQueryResult(error=str(response) or type(response).__name__))
+            continue
+        results.append(BatchQueryResult(response=response))
+        row = dict(
+            query_text=query.query,
+            model=query.model,
+            parameters=query.parameters,
+            response=response,
+            prompt_tokens=item["usage"].get("prompt_tokens"),
+        )
+        stored.append((results[-1], row))
+    if stored:
+        async with database.AsyncSessionLocal() as db:
+            query_ids = await database.astore_queries_and_responses(db, user_id, [row for _, row in stored])
+        for (result, _), query_id in zip(stored, query_ids):
+            result.query_id = query_id
+    return BatchQueryResponse(results=results)
+
+@router.post("/jobs", response_model=JobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    request: JobRequest,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(database.get_async_db),
+) -> JobStatus:
+    """
+    Queues a query for background processing and returns its ID at once.
+
+    Poll `GET /jobs/{query_id}` for the result, or pass `webhook_url` to have
+    it POSTed there when the job succeeds or fails for good.
+    """
+    broker = jobs.get_broker()
+    if broker is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Jobs are disabled.")
+    if request.webhook_url:
+        try:
+            await asyncio.to_thread(jobs.validate_webhook_url, request.webhook_url)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    query = await database.areserve_query(db, user_id, request.query, request.model, request.parameters)
+    payload = dict(request.dict(exclude={"priority"}), user_id=user_id)
+    await asyncio.to_thread(broker.enqueue, query.id, payload, request.priority)
+    jobs.notify_workers()
+    return JobStatus(query_id=query.id, status=jobs.QUEUED)
+
+@router.get("/jobs/{query_id}", response_model=JobStatus)
+async def get_job(
+    query_id: int,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(database.get_async_db),
+) -> JobStatus:
+    """Reports a job's status, with its response once it has succeeded."""
+    broker = jobs.get_broker()
+    job = await asyncio.to_thread(broker.get, query_id) if broker is not None else None
+    if job is None or job.payload.get("user_id") != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    result = JobStatus(query_id=job.id, status=job.status, attempts=job.attempts, error=job.error)
+    if job.status == jobs.SUCCEEDED:
+        result.response = await database.aget_response_by_id(db, query_id, user_id)
+    return result
+
+@router.get("/response/{query_id}")
+async def get_response(
+    query_id: int,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(database.get_async_db),
+) -> Dict[str, str]:
+    """Retrieves the stored response for one of the caller's query IDs."""
+    response = await database.aget_response_by_id(db, query_id, user_id)
+    if response is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Query not found.")
+    return {"response": response}
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+@router.get("/queries/export")
+async def export_queries(
+    format: str = Query("ndjson", regex="^(ndjson|parquet)$"),
+    user_id: int = Depends(get_current_user_id),
+) -> StreamingResponse:
+    """
+    Streams the caller's entire query history, oldest first, as NDJSON or Parquet.
+
+    Rows are read in batches through a streaming cursor and sent as they are
+    encoded, so the export never holds more than one batch in memory.
+    """
+    if format == "parquet" and transfer.pyarrow is None:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Parquet export is not available.")
+
+    async def chunks() -> AsyncIterator[bytes]:
+        async with database.AsyncSessionLocal() as db:
+            batches = transfer.aiter_export_batches(db, user_id, settings.EXPORT_BATCH_SIZE)
+            if format == "ndjson":
+                async for batch in batches:
+                    yield transfer.ndjson_chunk(batch)
+                return
+            encoder = transfer.ParquetEncoder()
+            async for batch in batches:
+                yield await asyncio.to_thread(encoder.encode, batch)
+            yield encoder.close()
+
+    return StreamingResponse(
+        chunks(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="queries.{format}"'},
+    )
+
+@router.get("/queries", response_model=QueryPage)
+async def list_queries(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    summary: bool = False,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(database.get_async_db),
+) -> QueryPage:
+    """
+    Lists the caller's queries newest first, one keyset page at a time.
+
+    Pass the returned `next_cursor` to fetch the following page. With
+    `summary=true` only id, model and timestamp are returned.
+    """
+    try:
+        queries, next_cursor = await database.aget_user_queries_page(db, user_id, limit, cursor, summary)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    item_model = QuerySummary if summary else QueryDetail
+    return QueryPage(items=[item_model.from_orm(query) for query in queries], next_cursor=next_cursor)
@@ -0,0 +1,270 @@
+"""
+Production server: a pre-forking supervisor for uvicorn workers.
+
+The supervisor builds the application once, binds the listening socket
+with the configured backlog, and forks SERVER_WORKERS workers that inherit
+both. Workers therefore start without re-importing anything and accept
+connections from the same socket, one event loop per core. Engines and
+connection pools are created per worker by the app's startup hook, after
+the fork.
+
+On SIGTERM or SIGINT every worker stops accepting connections, finishes
+its in-flight requests for up to SERVER_GRACEFUL_TIMEOUT seconds, and runs
+the app's shutdown hook. That hook stops the job workers, flushes pending
+database writes and closes the Redis and HTTP pools, and is given the
+shutdown budget, by default the time those steps are allowed to take.
+Workers still running once the drain and the budget have passed are
+killed. Workers that die unexpectedly, or exit after serving
+SERVER_MAX_REQUESTS requests, are replaced. Requires a POSIX `os.fork`.
+
+With METRICS_ENABLED the workers share a Prometheus multiprocess
+directory, PROMETHEUS_MULTIPROC_DIR or else a temporary one, so /metrics
+reports every worker. It is emptied when the supervisor starts.
+
+Usage:
+    python -m api.server --workers 4 --port 8000
+"""
+import argparse
+import atexit
+import glob
+import importlib
+import logging
+import math
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional
+
+from config.settings import settings
+import core.utils.logger  # noqa: F401  Attaches the log handlers before forking
+
+logger = logging.getLogger(__name__)
+
+# uvicorn's exit code when the app's startup hook fails.
+STARTUP_FAILURE = 3
+
+def load_factory(target: str) -> Callable[[], Any]:
+    """
+    Resolves a "module:function" string to an application factory.
+    """
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "create_app")
+
+def shutdown_budget() -> int:
+    """
+    Seconds the app's shutdown hook may take after the drain: stopping the
+    job workers and flushing write-behind rows, plus a margin.
+    """
+    budget = 5
+    if settings.JOBS_ENABLED:
+        budget += settings.SERVER_GRACEFUL_TIMEOUT
+    if settings.WRITE_BEHIND_ENABLED:
+        budget += math.ceil(settings.WRITE_BEHIND_CLOSE_TIMEOUT)
+    return budget
+
+class Supervisor:
+    """
+    Forks and supervises uvicorn workers serving one preloaded application.
+    """
+
+    def __init__(
+        self,
+        app_factory: Callable[[], Any],
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: int = 1,
+        backlog: int = 2048,
+        keepalive_timeout: int = 5,
+        graceful_timeout: int = 30,
+        max_requests: int = 0,
+        shutdown_timeout: int = 5,
+    ):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.worker_count = max(1, workers)
+        self.backlog = backlog
+        self.keepalive_timeout = keepalive_timeout
+        self.graceful_timeout = graceful_timeout
+        self.max_requests = max_requests
+        self.shutdown_timeout = shutdown_timeout
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.stopping = False
+        self.exit_code = 0
+        self.app: Any = None
+        self.socket: Optional[socket.socket] = None
+        self.metrics_dir: Optional[str] = None  # created by this supervisor, removed on exit
+
+    def bind(self) -> socket.socket:
+        """
+        Opens the listening socket shared by every worker.
+        """
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        return sock
+
+    def run(self) -> int:
+        """
+        Serves until stopped by a signal and returns the process exit code.
+        """
+        self._prepare_metrics_dir()
+        self.app = self.app_factory()
+        self.socket = self.bind()
+        logger.info("Listening on %s:%s with %d workers", self.host, self.port, self.worker_count)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGALRM, self._handle_graceful_timeout)
+        try:
+            for _ in range(self.worker_count):
+                self._spawn()
+            while self.workers:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                started = self.workers.pop(pid, None)
+                if started is None:
+                    continue
+                code = os.waitstatus_to_exitcode(status)
+                self._mark_dead(pid)
+                if self.stopping:
+                    continue
+                if code == STARTUP_FAILURE:
+                    logger.error("Worker %d failed to start; shutting down", pid)
+                    self.exit_code = STARTUP_FAILURE
+                    self.stop(signal.SIGTERM)
+                    continue
+                if code != 0:
+                    logger.warning("Worker %d exited with code %d; replacing it", pid, code)
+                if time.monotonic() - started < 1:
+                    time.sleep(1)  # Don't spin if workers die straight after starting
+                self._spawn()
+        finally:
+            signal.alarm(0)
+            self.socket.close()
+            if self.metrics_dir:
+                shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        logger.info("All workers stopped")
+        return self.exit_code
+
+    def stop(self, signum: int = signal.SIGTERM) -> None:
+        """
+        Asks every worker to drain and exit, killing stragglers once the
+        graceful timeout and the shutdown budget have passed.
+        """
+        if not self.stopping:
+            self.stopping = True
+            logger.info("Draining %d workers", len(self.workers))
+            signal.alarm(self.graceful_timeout + self.shutdown_timeout)
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _prepare_metrics_dir(self) -> None:
+        # Must run before the app, and with it prometheus_client, is imported:
+        # the client picks its per-process storage when first imported.
+        if not settings.METRICS_ENABLED:
+            return
+        path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+        if path:
+            os.makedirs(path, exist_ok=True)
+            for stale in glob.glob(os.path.join(path, "*.db")):
+                os.remove(stale)
+        else:
+            path = self.metrics_dir = tempfile.mkdtemp(prefix="prometheus-")
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+    def _mark_dead(self, pid: int) -> None:
+        from core.utils import metrics  # imported with the app, after _prepare_metrics_dir
+
+        metrics.mark_process_dead(pid)
+
+    def _handle_stop(self, signum: int, frame: Any) -> None:
+        # A second SIGINT is forwarded as-is, which makes uvicorn skip the drain.
+        self.stop(signum if self.stopping else signal.SIGTERM)
+
+    def _handle_graceful_timeout(self, signum: int, frame: Any) -> None:
+        if self.workers:
+            logger.warning("Killing %d workers that did not drain in time", len(self.workers))
+            self.stop(signal.SIGKILL)
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = time.monotonic()
+            return
+        code = 1
+        try:
+            code = self._serve()
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+        finally:
+            # Leave without unwinding into the supervisor loop, but run the
+            # exit hooks so queued log records and writes are flushed.
+            atexit._run_exitfuncs()
+            os._exit(code)
+
+    def _serve(self) -> int:
+        import uvicorn  # 0.32.0: ASGI server for running FastAPI applications
+
+        # Own process group: a terminal's Ctrl-C reaches only the supervisor,
+        # which then asks each worker to drain exactly once.
+        os.setpgid(0, 0)
+        config = uvicorn.Config(
+            self.app,
+            lifespan="on",
+            log_config=None,
+            backlog=self.backlog,
+            timeout_keep_alive=self.keepalive_timeout,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            limit_max_requests=self.max_requests or None,
+        )
+        server = uvicorn.Server(config)
+
+        def request_exit(signum: int, frame: Any) -> None:
+            server.should_exit = True
+
+        signal.signal(signal.SIGTERM, request_exit)
+        signal.signal(signal.SIGINT, request_exit)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        server.run(sockets=[self.socket])
+        return 0 if server.started else STARTUP_FAILURE
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="api.main:create_app", help="application factory as module:function")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+    parser.add_argument("--backlog", type=int, default=settings.SERVER_BACKLOG)
+    parser.add_argument("--keepalive-timeout", type=int, default=settings.SERVER_KEEPALIVE_TIMEOUT)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVER_GRACEFUL_TIMEOUT)
+    parser.add_argument("--max-requests", type=int, default=settings.SERVER_MAX_REQUESTS)
+    parser.add_argument(
+        "--shutdown-timeout", type=int, default=shutdown_budget(), help="seconds allowed for the shutdown hook after the drain"
+    )
+    args = parser.parse_args()
+
+    supervisor = Supervisor(
+        load_factory(args.app),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        keepalive_timeout=args.keepalive_timeout,
+        graceful_timeout=args.graceful_timeout,
+        max_requests=args.max_requests,
+        shutdown_timeout=args.shutdown_timeout,
+    )
+    raise SystemExit(supervisor.run())
+
+if __name__ == "__main__":
+    main()
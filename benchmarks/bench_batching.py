@@ -0,0 +1,75 @@
+"""
+Measures completion throughput with and without micro-batching.
+
+Both runs send distinct prompts through `OpenAIService.aprocess_query` against
+the local stub server. The stub charges a fixed cost per HTTP request plus a
+small cost per prompt, and only allows a limited number of concurrent
+requests through the service's connection pool, approximating an upstream
+where per-request overhead and connection limits dominate.
+
+Usage:
+    python -m benchmarks.bench_batching --requests 2000 --max-batch-size 16
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub_server import StubCompletionServer
+from config.settings import settings
+from core.services.batching import BatchDispatcher
+from core.services.openai_service import OpenAIService
+
+PARAMETERS = {"temperature": 0.0, "max_tokens": 32}
+
+
+async def run(label: str, service: OpenAIService, server: StubCompletionServer, total: int) -> None:
+    server.request_count = server.prompt_count = 0
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(service.aprocess_query(f"prompt {i}", parameters=PARAMETERS) for i in range(total)))
+    finally:
+        await service.aclose()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<10} prompts={total:<6} upstream_requests={server.request_count:<6} "
+        f"prompts/s={total / elapsed:>9.1f} elapsed={elapsed:>6.2f}s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--connections", type=int, default=32, help="Upstream connection pool size")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated cost per upstream request")
+    parser.add_argument("--per-prompt-ms", type=float, default=1.0, help="Simulated cost per prompt")
+    parser.add_argument("--max-batch-size", type=int, default=settings.BATCH_MAX_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.BATCH_MAX_WAIT_MS)
+    parser.add_argument("--max-inflight", type=int, default=settings.BATCH_MAX_INFLIGHT)
+    args = parser.parse_args()
+
+    server = StubCompletionServer(
+        ("127.0.0.1", 0),
+        latency=args.latency_ms / 1000,
+        per_prompt_latency=args.per_prompt_ms / 1000,
+    ).start()
+    settings.OPENAI_API_BASE = server.base_url
+    settings.OPENAI_MAX_CONNECTIONS = args.connections
+    try:
+        unbatched = OpenAIService()
+        unbatched.batcher = None
+        asyncio.run(run("unbatched", unbatched, server, args.requests))
+
+        batched = OpenAIService()
+        batched.batcher = BatchDispatcher(
+            batched,
+            max_batch_size=args.max_batch_size,
+            max_wait_ms=args.max_wait_ms,
+            max_inflight_batches=args.max_inflight,
+        )
+        asyncio.run(run("batched", batched, server, args.requests))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
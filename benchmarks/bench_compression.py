@@ -0,0 +1,112 @@
+"""
+Measures stored bytes per row and scan throughput of the compressed columns.
+
+Seeds one SQLite file per codec with the same synthetic responses and
+parameters, then reports the database file size, bytes per row of the
+response and parameters columns, and rows/second for a full history scan
+(which decompresses every response) and a summary scan (which does not).
+zstd runs are included when `zstandard` is installed, with and without a
+dictionary trained on the seeded rows.
+
+Usage:
+    python -m benchmarks.bench_compression --rows 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from config.settings import settings
+from core.database import compression, database, models
+
+SEED_BATCH = 5000
+WORDS = (
+    "the model answer question context token prompt language life meaning value system data user request "
+    "response result example because however therefore which would could should important different general"
+).split()
+
+
+def synthetic_rows(rows: int) -> list:
+    rng = random.Random(0)
+    base_time = datetime(2024, 1, 1)
+    return [
+        dict(
+            user_id=1,
+            query_text=f"query {i}",
+            model="text-davinci-003",
+            parameters={"temperature": round(rng.random(), 2), "max_tokens": rng.choice([64, 256, 512]), "top_p": 1},
+            response=" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 400))) + ".",
+            timestamp=base_time + timedelta(seconds=i),
+            content_hash=str(i),
+        )
+        for i in range(rows)
+    ]
+
+
+def seed(path: str, rows: list) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for start in range(0, len(rows), SEED_BATCH):
+            conn.execute(insert(models.Query), rows[start:start + SEED_BATCH])
+    engine.dispose()
+
+
+def scan(path: str, summary: bool) -> float:
+    engine = create_engine(f"sqlite:///{path}")
+    db = sessionmaker(bind=engine)()
+    try:
+        start = time.perf_counter()
+        count = sum(1 for query in database.iter_user_queries(db, 1, summary=summary) if summary or query.response)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+        engine.dispose()
+    return count / elapsed
+
+
+def run(label: str, directory: str, rows: list, codec: str, dict_path=None) -> None:
+    path = os.path.join(directory, f"{label}.db")
+    with patch.object(settings, "STORAGE_COMPRESSION", codec), patch.object(settings, "STORAGE_ZSTD_DICT_PATH", dict_path):
+        started = time.perf_counter()
+        seed(path, rows)
+        write_rate = len(rows) / (time.perf_counter() - started)
+        engine = create_engine(f"sqlite:///{path}")
+        stats = compression.storage_stats(engine)
+        engine.dispose()
+        full, summary = scan(path, summary=False), scan(path, summary=True)
+    print(
+        f"{label:<13} file={os.path.getsize(path) / len(rows):>7.1f}B/row "
+        f"response={stats['response_bytes_per_row']:>7.1f}B parameters={stats['parameters_bytes_per_row']:>5.1f}B "
+        f"insert={write_rate:>8.0f} rows/s full scan={full:>8.0f} rows/s summary scan={summary:>8.0f} rows/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    rows = synthetic_rows(args.rows)
+    run("none", directory, rows, "none")
+    run("zlib", directory, rows, "zlib")
+    if compression.zstandard is None:
+        print("zstandard is not installed; skipping zstd")
+        return
+    run("zstd", directory, rows, "zstd")
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'none.db')}")
+    dict_path = os.path.join(directory, "responses.dict")
+    compression.train_dictionary(engine, dict_path)
+    engine.dispose()
+    run("zstd+dict", directory, rows, "zstd", dict_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compares the sync and async database paths on a local SQLite file.
+
+The sync path runs `get_response_by_id` / `store_query_and_response` from a
+fixed-size thread pool, mirroring FastAPI's handling of blocking handlers;
+the async path runs their `a*` counterparts on one event loop through
+aiosqlite.
+
+Usage:
+    python -m benchmarks.bench_database --operations 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.database import database, models
+
+QUERY = {
+    "user_id": 1,
+    "query_text": "What is the meaning of life?",
+    "model": "text-davinci-003",
+    "parameters": {"temperature": 0.7, "max_tokens": 256},
+    "response": "The meaning of life is a profound question..." * 10,
+}
+
+
+def report(label: str, operations: int, elapsed: float) -> None:
+    print(f"{label:<12} operations={operations:<7} ops/s={operations / elapsed:>9.1f} elapsed={elapsed:>6.2f}s")
+
+
+def run_sync(path: str, seeded: int, operations: int, threads: int) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def read(_):
+        db = SessionLocal()
+        try:
+            database.get_response_by_id(db, random.randint(1, seeded))
+        finally:
+            db.close()
+
+    def write(_):
+        db = SessionLocal()
+        try:
+            database.store_query_and_response(db, **QUERY)
+        finally:
+            db.close()
+
+    for label, operation, count in (("sync read", read, operations), ("sync write", write, operations // 10)):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(operation, range(count)))
+        report(label, count, time.perf_counter() - started)
+    engine.dispose()
+
+
+async def run_async(path: str, seeded: int, operations: int, concurrency: int) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read():
+        async with semaphore, AsyncSessionLocal() as db:
+            await database.aget_response_by_id(db, random.randint(1, seeded))
+
+    async def write():
+        async with semaphore, AsyncSessionLocal() as db:
+            await database.astore_query_and_response(db, **QUERY)
+
+    for label, operation, count in (("async read", read, operations), ("async write", write, operations // 10)):
+        started = time.perf_counter()
+        await asyncio.gather(*(operation() for _ in range(count)))
+        report(label, count, time.perf_counter() - started)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--seed-rows", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=40, help="Sync worker threads (FastAPI's default pool is 40)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Async operations kept in flight")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+        models.Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(models.Query.__table__.insert(), [QUERY] * args.seed_rows)
+        engine.dispose()
+
+        run_sync(path, args.seed_rows, args.operations, args.threads)
+        asyncio.run(run_async(path, args.seed_rows, args.operations, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
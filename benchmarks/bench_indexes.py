@@ -0,0 +1,100 @@
+"""
+Measures query-history and content-hash lookups before and after the index migrations.
+
+Seeds a SQLite file with the legacy `queries` schema (no user/timestamp or
+content-hash indexes), times the lookups, applies `core.database.migrations`
+and times them again.
+
+Usage:
+    python -m benchmarks.bench_indexes --rows 1000000 --users 1000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from core.database import database, migrations
+from core.services.cache import make_cache_key
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, password VARCHAR)",
+    "CREATE TABLE queries (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), query_text VARCHAR, "
+    "model VARCHAR, parameters JSON, response VARCHAR, timestamp DATETIME, content_hash VARCHAR(64))",
+]
+SEED_BATCH = 50000
+
+
+def seed(engine, rows: int, users: int) -> None:
+    started = time.perf_counter()
+    base_time = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        insert = text(
+            "INSERT INTO queries (user_id, query_text, model, parameters, response, timestamp, content_hash) "
+            "VALUES (:user_id, :query_text, 'text-davinci-003', '{}', 'response', :timestamp, :content_hash)"
+        )
+        for start in range(0, rows, SEED_BATCH):
+            conn.execute(
+                insert,
+                [
+                    {
+                        "user_id": random.randint(1, users),
+                        "query_text": f"query {i}",
+                        "timestamp": base_time + timedelta(seconds=i),
+                        "content_hash": make_cache_key("text-davinci-003", f"query {i}", {}),
+                    }
+                    for i in range(start, min(start + SEED_BATCH, rows))
+                ],
+            )
+    print(f"seeded {rows} rows for {users} users in {time.perf_counter() - started:.1f}s")
+
+
+def measure(label: str, SessionLocal, rows: int, users: int, samples: int) -> None:
+    db = SessionLocal()
+    timings = {"history page": [], "content hash": []}
+    try:
+        for _ in range(samples):
+            start = time.perf_counter()
+            database.get_user_queries_page(db, random.randint(1, users), limit=50, summary=True)
+            timings["history page"].append(time.perf_counter() - start)
+
+            content_hash = make_cache_key("text-davinci-003", f"query {random.randrange(rows)}", {})
+            start = time.perf_counter()
+            database.get_query_by_content_hash(db, content_hash)
+            timings["content hash"].append(time.perf_counter() - start)
+            db.expunge_all()
+    finally:
+        db.close()
+    for name, values in timings.items():
+        print(f"{label:<7} {name:<13} mean={statistics.mean(values) * 1000:>9.3f}ms max={max(values) * 1000:>9.3f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        seed(engine, args.rows, args.users)
+        measure("before", SessionLocal, args.rows, args.users, args.samples)
+
+        started = time.perf_counter()
+        migrations.upgrade(engine)
+        print(f"migrated in {time.perf_counter() - started:.1f}s")
+        measure("after", SessionLocal, args.rows, args.users, args.samples)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compares log-call throughput and caller latency with and without the queue.
+
+Several threads log to a rotating file, either directly (every call formats
+and writes on the caller's thread) or through `attach_queue` (callers only
+enqueue; a listener thread formats and writes). Reports calls/sec and p99
+per-call latency as seen by the logging threads, the time until the file
+is fully written, and any records dropped because the queue was full.
+`--fsync` syncs every record to disk to stand in for a slow disk.
+
+Usage:
+    python -m benchmarks.bench_logging --threads 8 --calls 20000 --fsync
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import List
+
+from core.utils.logger import TEXT_FORMAT, DroppingQueueHandler, attach_queue
+
+
+class FsyncRotatingFileHandler(RotatingFileHandler):
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        if self.stream is not None:
+            os.fsync(self.stream.fileno())
+
+
+def make_handler(path: str, fsync: bool) -> logging.Handler:
+    handler_class = FsyncRotatingFileHandler if fsync else RotatingFileHandler
+    handler = handler_class(path, maxBytes=256 * 1024 * 1024, backupCount=1)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def hammer(target: logging.Logger, calls: int, latencies: List[float]) -> None:
+    local = []
+    for i in range(calls):
+        started = time.perf_counter()
+        target.info("Cached response for query ID: %s", i)
+        local.append(time.perf_counter() - started)
+    latencies.extend(local)
+
+
+def run(label: str, queued: bool, threads: int, calls: int, queue_size: int, fsync: bool) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        target = logging.getLogger(f"benchmarks.logging.{label}")
+        target.propagate = False
+        target.setLevel(logging.INFO)
+        handler = make_handler(os.path.join(directory, "app.log"), fsync)
+        listener = None
+        if queued:
+            listener = attach_queue(target, [handler], queue_size=queue_size)
+        else:
+            target.addHandler(handler)
+
+        latencies: List[float] = []
+        workers = [threading.Thread(target=hammer, args=(target, calls, latencies)) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        logged = time.perf_counter() - started
+        if listener is not None:
+            listener.stop()
+        written = time.perf_counter() - started
+
+        dropped = sum(h.dropped for h in target.handlers if isinstance(h, DroppingQueueHandler))
+        target.handlers.clear()
+        handler.close()
+
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    print(
+        f"{label:<7} calls/sec={threads * calls / logged:>10,.0f} "
+        f"p99={p99 * 1e6:>9.1f}µs written_in={written:>6.2f}s dropped={dropped}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=20_000, help="log calls per thread")
+    parser.add_argument("--queue-size", type=int, default=10_000)
+    parser.add_argument("--fsync", action="store_true", help="fsync after every record")
+    args = parser.parse_args()
+
+    run("direct", False, args.threads, args.calls, args.queue_size, args.fsync)
+    run("queued", True, args.threads, args.calls, args.queue_size, args.fsync)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures the per-call cost of the metrics instrumentation, disabled and enabled.
+
+Times an empty instrumented block (`metrics.timer`) and a cache-lookup
+counter against a bare loop, so the overhead added to each hot path can be
+read off directly.
+
+Usage:
+    python -m benchmarks.bench_metrics --iterations 1000000
+"""
+import argparse
+import time
+
+from core.utils import metrics
+
+
+def per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+def run(label: str, iterations: int) -> None:
+    def baseline() -> None:
+        pass
+
+    def timed() -> None:
+        with metrics.timer(metrics.UPSTREAM_LATENCY, outcome=True, model="text-davinci-003"):
+            pass
+
+    def counted() -> None:
+        metrics.count_cache_lookup("response", True)
+
+    base = per_call(baseline, iterations)
+    print(
+        f"{label:<9} timer={(per_call(timed, iterations) - base) * 1e9:>7.0f}ns "
+        f"cache_counter={(per_call(counted, iterations) - base) * 1e9:>7.0f}ns"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    metrics.configure(False)
+    run("disabled", args.iterations)
+    if metrics.configure(True):
+        run("enabled", args.iterations)
+    else:
+        print("prometheus_client is not installed; skipping the enabled run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares the sync and async OpenAIService paths against the local stub server.
+
+The sync path is driven from a fixed-size thread pool, mirroring how FastAPI
+runs blocking handlers; the async path runs every request on one event loop
+through the shared, pooled HTTP client.
+
+Usage:
+    python -m benchmarks.bench_openai_service --requests 500 --concurrency 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from benchmarks.stub_server import StubCompletionServer
+from config.settings import settings
+from core.services.openai_service import OpenAIService
+
+PROMPT = "What is the meaning of life?"
+PARAMETERS = {"temperature": 0.7, "max_tokens": 64}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label: str, latencies: List[float], elapsed: float) -> None:
+    print(
+        f"{label:<6} requests={len(latencies):<6} rps={len(latencies) / elapsed:>9.1f} "
+        f"p50={percentile(latencies, 50) * 1000:>8.1f}ms p99={percentile(latencies, 99) * 1000:>8.1f}ms "
+        f"mean={statistics.mean(latencies) * 1000:>8.1f}ms"
+    )
+
+
+def run_sync(service: OpenAIService, total: int, threads: int) -> None:
+    def call() -> float:
+        start = time.perf_counter()
+        service.process_query(PROMPT, parameters=PARAMETERS)
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(lambda _: call(), range(total)))
+    report("sync", latencies, time.perf_counter() - started)
+
+
+async def run_async(service: OpenAIService, total: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call() -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await service.aprocess_query(PROMPT, parameters=PARAMETERS)
+            return time.perf_counter() - start
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(call() for _ in range(total)))
+    report("async", list(latencies), time.perf_counter() - started)
+    await service.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=40, help="Sync worker threads (FastAPI's default pool is 40)")
+    parser.add_argument("--concurrency", type=int, default=200, help="Async requests kept in flight")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated upstream latency")
+    args = parser.parse_args()
+
+    server = StubCompletionServer(("127.0.0.1", 0), latency=args.latency_ms / 1000).start()
+    settings.OPENAI_API_BASE = server.base_url
+    try:
+        service = OpenAIService()
+        run_sync(service, args.requests, args.threads)
+        asyncio.run(run_async(service, args.requests, args.concurrency))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
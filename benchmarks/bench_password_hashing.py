@@ -0,0 +1,70 @@
+"""
+Measures login throughput and event-loop stalls during a burst of password checks.
+
+Runs the same burst of concurrent bcrypt verifications twice on one event
+loop: once calling `check_password` inline (as a naive async handler would)
+and once through `acheck_password` on the bounded worker pool. A heartbeat
+task records how late the loop wakes it, which is the latency every other
+request on that worker would see.
+
+Usage:
+    python -m benchmarks.bench_password_hashing --logins 64 --rounds 10
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from config.settings import settings
+from core.utils import utils
+
+
+async def heartbeat(lags: List[float], stop: asyncio.Event, interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def burst(label: str, check, hashed_password: str, logins: int) -> None:
+    lags: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(check("testpassword", hashed_password) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    assert all(results)
+    print(
+        f"{label:<8} logins={logins:<5} logins/s={logins / elapsed:>8.1f} "
+        f"max_loop_lag={max(lags, default=0) * 1000:>8.1f}ms"
+    )
+
+
+async def inline_check(password: str, hashed_password: str) -> bool:
+    return utils.check_password(password, hashed_password)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost factor")
+    parser.add_argument("--executor", choices=["thread", "process"], default=settings.BCRYPT_EXECUTOR)
+    args = parser.parse_args()
+
+    settings.BCRYPT_ROUNDS = args.rounds
+    settings.BCRYPT_EXECUTOR = args.executor
+    settings.BCRYPT_MAX_PENDING = max(settings.BCRYPT_MAX_PENDING, args.logins)
+    hashed_password = utils.hash_password("testpassword")
+
+    asyncio.run(burst("inline", inline_check, hashed_password, args.logins))
+    asyncio.run(burst("pool", utils.acheck_password, hashed_password, args.logins))
+    utils.shutdown_hashing_executor()
+
+
+if __name__ == "__main__":
+    main()
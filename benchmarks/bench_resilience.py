@@ -0,0 +1,100 @@
+"""
+Measures success rate and tail latency against a faulty upstream, with and without the resilience policy.
+
+The stub server fails a fraction of requests with 503 and stalls another
+fraction for a long time. The same load is run with no policy, with
+retries and deadlines, and with retries, deadlines and hedged requests.
+
+Usage:
+    python -m benchmarks.bench_resilience --requests 500 --error-rate 0.05 --slow-rate 0.02
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from benchmarks.bench_openai_service import PARAMETERS, percentile
+from benchmarks.stub_server import StubCompletionServer
+from config.settings import settings
+from core.services.openai_service import OpenAIService
+from core.services.resilience import ResiliencePolicy, RetryPolicy
+
+
+async def run(label: str, policy: Optional[ResiliencePolicy], total: int, concurrency: int) -> None:
+    service = OpenAIService(resilience=policy)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def call(i: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await service.aprocess_query(f"{label} prompt {i}", parameters=PARAMETERS)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        await asyncio.gather(*(call(i) for i in range(total)))
+    finally:
+        await service.aclose()
+    print(
+        f"{label:<16} success={(total - failures) / total * 100:>6.1f}% "
+        f"p50={percentile(latencies, 50) * 1000:>8.1f}ms p99={percentile(latencies, 99) * 1000:>8.1f}ms "
+        f"max={max(latencies) * 1000:>8.1f}ms"
+        + (f" {dict((k, v) for k, v in policy.counters.items() if v)}" if policy else "")
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.02)
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--deadline", type=float, default=2.0, help="Per-call deadline in seconds")
+    parser.add_argument("--hedge-ms", type=float, default=150.0)
+    args = parser.parse_args()
+    logging.getLogger("core.services.resilience").setLevel(logging.ERROR)
+
+    server = StubCompletionServer(
+        ("127.0.0.1", 0),
+        latency=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_ms / 1000,
+    ).start()
+    settings.OPENAI_API_BASE = server.base_url
+    settings.RESILIENCE_ENABLED = False
+    # A breaker that trips on the injected background error rate would hide the other effects.
+    breaker = dict(failure_threshold=args.requests, recovery_timeout=1)
+    try:
+        asyncio.run(run("no policy", None, args.requests, args.concurrency))
+        asyncio.run(run(
+            "retry+deadline",
+            ResiliencePolicy(RetryPolicy(max_attempts=3, base_delay=0.05), default_deadline=args.deadline, **breaker),
+            args.requests,
+            args.concurrency,
+        ))
+        asyncio.run(run(
+            "retry+hedge",
+            ResiliencePolicy(
+                RetryPolicy(max_attempts=3, base_delay=0.05),
+                default_deadline=args.deadline,
+                hedge_delay=args.hedge_ms / 1000,
+                **breaker,
+            ),
+            args.requests,
+            args.concurrency,
+        ))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
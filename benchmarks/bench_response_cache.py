@@ -0,0 +1,108 @@
+"""
+Measures `get_response_by_id` with and without the query response cache.
+
+Seeds a SQLite file with stored queries, then replays skewed lookups (a few
+hot IDs, a long tail and some unknown IDs) against the database alone and
+through the read-through cache. Pass --redis to include the Redis tier of
+a server at REDIS_HOST; otherwise only the in-process tier is used.
+
+Usage:
+    python -m benchmarks.bench_response_cache --rows 100000 --lookups 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from config.settings import settings
+from core.database import database, models
+from core.services import cache
+from core.services.cache import LRUCache, ReadThroughCache, encode_cached
+from core.utils.redis_client import get_redis
+
+SEED_BATCH = 10000
+RESPONSE = "The meaning of life is a question that has been pondered by philosophers for centuries. " * 24
+
+
+def seed(engine, rows: int) -> None:
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for start in range(0, rows, SEED_BATCH):
+            conn.execute(
+                insert(models.Query),
+                [
+                    dict(user_id=1, query_text=f"query {i}", model="text-davinci-003", parameters={},
+                         response=f"{i} {RESPONSE}", timestamp=datetime(2024, 1, 1), content_hash=str(i))
+                    for i in range(start, min(start + SEED_BATCH, rows))
+                ],
+            )
+
+
+def lookups(rows: int, count: int) -> list:
+    """Zipf-like IDs: most lookups hit a few hundred rows, 5% ask for unknown IDs."""
+    ids = []
+    for _ in range(count):
+        if random.random() < 0.05:
+            ids.append(rows + random.randint(1, 1000))
+        else:
+            ids.append(min(rows, int(random.paretovariate(1.2))))
+    return ids
+
+
+def measure(label: str, SessionLocal, ids: list) -> None:
+    db = SessionLocal()
+    timings = []
+    try:
+        for query_id in ids:
+            start = time.perf_counter()
+            database.get_response_by_id(db, query_id)
+            timings.append(time.perf_counter() - start)
+    finally:
+        db.close()
+    timings.sort()
+    print(
+        f"{label:<13} mean={statistics.mean(timings) * 1e6:>8.1f}us p50={timings[len(timings) // 2] * 1e6:>8.1f}us "
+        f"p99={timings[int(len(timings) * 0.99)] * 1e6:>8.1f}us total={sum(timings):.2f}s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=50000)
+    parser.add_argument("--redis", action="store_true", help="also use the Redis tier at REDIS_HOST")
+    args = parser.parse_args()
+
+    random.seed(0)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    seed(engine, args.rows)
+    SessionLocal = sessionmaker(bind=engine)
+    ids = lookups(args.rows, args.lookups)
+    print(f"{args.rows} rows, {args.lookups} lookups over {len(set(ids))} distinct IDs")
+    encoded = encode_cached(RESPONSE, settings.QUERY_CACHE_COMPRESS_MIN_BYTES)
+    print(f"response {len(RESPONSE)} bytes, {len(encoded)} bytes in Redis")
+
+    with patch.object(settings, "QUERY_CACHE_ENABLED", False):
+        measure("database", SessionLocal, ids)
+    read_through = ReadThroughCache(
+        local=LRUCache(max_entries=settings.QUERY_CACHE_MAX_ENTRIES, max_bytes=settings.QUERY_CACHE_MAX_BYTES),
+        redis_client=get_redis() if args.redis else None,
+        negative_ttl=settings.QUERY_CACHE_NEGATIVE_TTL,
+        compress_min_bytes=settings.QUERY_CACHE_COMPRESS_MIN_BYTES,
+    )
+    with patch.object(settings, "QUERY_CACHE_ENABLED", True), patch.object(cache, "_query_cache", read_through):
+        measure("read-through", SessionLocal, ids)
+    print(f"cache stats: {read_through.stats()}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
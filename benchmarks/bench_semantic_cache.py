@@ -0,0 +1,100 @@
+"""
+Measures semantic cache hit rate and lookup latency as the index grows.
+
+Stores synthetic prompts in a `SemanticCache` with the hashing embedder and,
+at each checkpoint size, replays lookups of which half are rewordings of
+stored prompts (a dropped word, swapped words, changed case, an added
+"please") and half are new prompts. Reports the hit rate on rewordings,
+false hits on new prompts, and lookup latency (embedding plus search),
+once with brute-force search and once with IVF.
+
+Usage:
+    python -m benchmarks.bench_semantic_cache --entries 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from core.services.semantic_cache import HashingEmbedder, SemanticCache
+
+MODEL = "text-davinci-003"
+PARAMETERS = {"temperature": 0.0, "max_tokens": 256}
+VOCABULARY = [f"w{i}" for i in range(5000)]
+
+
+def prompt(rng: random.Random) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20)))
+
+
+def reword(text: str, rng: random.Random) -> str:
+    words = text.split()
+    change = rng.randrange(4)
+    if change == 0:
+        del words[rng.randrange(len(words))]
+    elif change == 1:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    elif change == 2:
+        return text.upper() + "?"
+    else:
+        words.insert(0, "please")
+    return " ".join(words)
+
+
+def measure(cache: SemanticCache, stored: list, lookups: int, rng: random.Random) -> str:
+    latencies, reworded_hits, false_hits = [], 0, 0
+    for i in range(lookups):
+        if i % 2 == 0:
+            index = rng.randrange(len(stored))
+            text, expected = reword(stored[index], rng), str(index)
+        else:
+            text, expected = prompt(rng), None
+        started = time.perf_counter()
+        response = cache.lookup(MODEL, text, PARAMETERS)
+        latencies.append(time.perf_counter() - started)
+        if expected is not None:
+            reworded_hits += response == expected
+        else:
+            false_hits += response is not None
+    latencies.sort()
+    return (
+        f"reworded hit rate {2 * reworded_hits / lookups:>6.1%}  false hits {2 * false_hits / lookups:>6.2%}  "
+        f"lookup mean {1000 * statistics.fmean(latencies):>7.3f} ms  p99 {1000 * latencies[int(0.99 * len(latencies))]:>7.3f} ms"
+    )
+
+
+def run(label: str, checkpoints: list, lookups: int, threshold: float, dim: int, ivf_lists: int, nprobe: int) -> None:
+    rng = random.Random(0)
+    cache = SemanticCache(
+        HashingEmbedder(dim), default_threshold=threshold, max_entries=checkpoints[-1], ivf_lists=ivf_lists, ivf_nprobe=nprobe
+    )
+    stored = []
+    started = time.perf_counter()
+    for checkpoint in checkpoints:
+        while len(stored) < checkpoint:
+            text = prompt(rng)
+            cache.store(MODEL, text, PARAMETERS, str(len(stored)))
+            stored.append(text)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<6} {checkpoint:>8} entries  {measure(cache, stored, lookups, rng)}  (built in {elapsed:.0f}s)")
+        started = time.perf_counter()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--ivf-lists", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    checkpoints = [n for n in (1000, 10000, 100000) if n < args.entries] + [args.entries]
+    run("brute", checkpoints, args.lookups, args.threshold, args.dim, 0, args.nprobe)
+    run("ivf", checkpoints, args.lookups, args.threshold, args.dim, args.ivf_lists, args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Measures bulk history export and import throughput on SQLite.
+
+Seeds a SQLite file with one user's history, exports it to NDJSON (and
+Parquet when `pyarrow` is installed) with `core.database.transfer`, then
+imports the NDJSON file into a fresh database. Reports rows/second and how
+much the process's peak memory grew during each step; with
+--compare-load-all it also loads the whole history with `get_user_queries`
+for contrast.
+
+Usage:
+    python -m benchmarks.bench_transfer --rows 1000000
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from core.database import database, models, transfer
+
+SEED_BATCH = 50000
+RESPONSE = "The meaning of life is a question that has been pondered by philosophers for centuries. " * 4
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(engine, rows: int) -> None:
+    started = time.perf_counter()
+    models.Base.metadata.create_all(engine)
+    base_time = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for start in range(0, rows, SEED_BATCH):
+            conn.execute(
+                insert(models.Query),
+                [
+                    dict(user_id=1, query_text=f"query {i}", model="text-davinci-003",
+                         parameters={"temperature": 0.7, "max_tokens": 256}, response=f"{i} {RESPONSE}",
+                         timestamp=base_time + timedelta(seconds=i), content_hash=str(i),
+                         prompt_tokens=3, completion_tokens=80)
+                    for i in range(start, min(start + SEED_BATCH, rows))
+                ],
+            )
+    print(f"seeded {rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+def timed(label: str, rows_of, fn) -> None:
+    before = peak_rss_mb()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    rows = rows_of(result)
+    after = peak_rss_mb()
+    print(f"{label:<18} {rows:>9} rows {elapsed:>7.1f}s {rows / elapsed:>9.0f} rows/s peak RSS {after:.0f} MB (+{after - before:.0f})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--compare-load-all", action="store_true")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    source = create_engine(f"sqlite:///{os.path.join(directory, 'source.db')}")
+    seed(source, args.rows)
+    Session = sessionmaker(bind=source)
+
+    def export(format: str, path: str):
+        db = Session()
+        try:
+            with open(path, "wb") as output:
+                return transfer.export(db, output, format, user_id=1, batch_size=args.batch_size)
+        finally:
+            db.close()
+
+    ndjson_path = os.path.join(directory, "history.ndjson")
+    timed("export ndjson", lambda rows: rows, lambda: export("ndjson", ndjson_path))
+    print(f"{'':<18} {os.path.getsize(ndjson_path) / 1e6:.0f} MB")
+    if transfer.pyarrow is not None:
+        parquet_path = os.path.join(directory, "history.parquet")
+        timed("export parquet", lambda rows: rows, lambda: export("parquet", parquet_path))
+        print(f"{'':<18} {os.path.getsize(parquet_path) / 1e6:.0f} MB")
+    else:
+        print("pyarrow is not installed; skipping parquet")
+
+    target = create_engine(f"sqlite:///{os.path.join(directory, 'target.db')}")
+    models.Base.metadata.create_all(target)
+
+    def load():
+        with open(ndjson_path, "rb") as lines:
+            return transfer.import_rows(target, transfer.read_ndjson(lines), batch_size=5000)
+
+    timed("import ndjson", lambda rows: rows, load)
+
+    if args.compare_load_all:
+        def load_all():
+            db = Session()
+            try:
+                return database.get_user_queries(db, 1)
+            finally:
+                db.close()
+
+        timed("get_user_queries", len, load_all)
+    source.dispose()
+    target.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Measures the per-request cost of `verify_token` with and without the verified-token cache.
+
+Verifies a fixed pool of tokens repeatedly, as an API worker would for a
+set of active sessions, once with TOKEN_CACHE_ENABLED off (every call
+decodes and checks the HMAC signature) and once with it on.
+
+Usage:
+    python -m benchmarks.bench_verify_token --tokens 100 --requests 200000
+"""
+import argparse
+import random
+import time
+
+from config.settings import settings
+from core.utils import utils
+
+
+def run(label: str, tokens, requests: int) -> None:
+    utils.token_cache.clear()
+    picks = [random.choice(tokens) for _ in range(requests)]
+    started = time.perf_counter()
+    for token in picks:
+        assert utils.verify_token(token) is not None
+    elapsed = time.perf_counter() - started
+    print(f"{label:<9} requests={requests:<8} verifications/s={requests / elapsed:>10.0f} per_call={elapsed / requests * 1e6:>6.2f}us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=100, help="distinct active tokens")
+    parser.add_argument("--requests", type=int, default=200_000)
+    args = parser.parse_args()
+
+    settings.JWT_SECRET = settings.JWT_SECRET or "benchmark-secret"
+    tokens = [utils.generate_token(user_id) for user_id in range(args.tokens)]
+
+    settings.TOKEN_CACHE_ENABLED = False
+    run("uncached", tokens, args.requests)
+    settings.TOKEN_CACHE_ENABLED = True
+    run("cached", tokens, args.requests)
+
+
+if __name__ == "__main__":
+    main()
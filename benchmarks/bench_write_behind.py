@@ -0,0 +1,87 @@
+"""
+Compares per-row commits with the write-behind queue on a local SQLite file.
+
+Reports rows/sec until every row is durable, and the latency each caller
+pays for `store_query_and_response`-style persistence on its hot path.
+
+Usage:
+    python -m benchmarks.bench_write_behind --rows 20000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.database import models
+from core.database.write_behind import WriteBehindQueue
+
+ROW = {
+    "user_id": 1,
+    "query_text": "What is the meaning of life?",
+    "model": "text-davinci-003",
+    "parameters": {"temperature": 0.7, "max_tokens": 256},
+    "response": "The meaning of life is a profound question..." * 10,
+}
+
+
+def report(label: str, latencies: List[float], elapsed: float) -> None:
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{label:<13} rows={len(latencies):<7} rows/s={len(latencies) / elapsed:>9.1f} "
+        f"call_mean={statistics.mean(latencies) * 1e6:>8.1f}us call_p99={p99 * 1e6:>8.1f}us"
+    )
+
+
+def run_direct(SessionLocal, rows: int) -> None:
+    latencies = []
+    started = time.perf_counter()
+    db = SessionLocal()
+    for _ in range(rows):
+        start = time.perf_counter()
+        query = models.Query(**ROW, timestamp=datetime.utcnow())
+        db.add(query)
+        db.commit()
+        db.refresh(query)
+        latencies.append(time.perf_counter() - start)
+    db.close()
+    report("commit+refresh", latencies, time.perf_counter() - started)
+
+
+def run_write_behind(SessionLocal, rows: int, batch_size: int) -> None:
+    write_behind = WriteBehindQueue(SessionLocal, batch_size=batch_size, max_queue_size=rows)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rows):
+        start = time.perf_counter()
+        write_behind.enqueue(dict(ROW, timestamp=datetime.utcnow()))
+        latencies.append(time.perf_counter() - start)
+    write_behind.close()
+    report("write-behind", latencies, time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        def fresh_database(name: str):
+            engine = create_engine(f"sqlite:///{os.path.join(directory, name)}")
+            models.Base.metadata.create_all(engine)
+            return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        run_direct(fresh_database("direct.db"), args.rows)
+        run_write_behind(fresh_database("write_behind.db"), args.rows, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
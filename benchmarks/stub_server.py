@@ -0,0 +1,224 @@
+"""
+Local stub of the OpenAI completions endpoint for benchmarks and tests.
+
+Serves `POST /completions` and the legacy `POST /engines/{model}/completions`,
+including `stream=true` requests answered as Server-Sent Events, with a configurable fixed latency per request plus an optional latency per
+prompt, so client-side overhead can be measured without network noise or
+API spend.
+
+Faults can be injected to exercise retry, timeout and circuit-breaker
+handling: a random fraction of requests can fail with an HTTP error or be
+delayed, and `fail_next` scripts the outcome of the next requests exactly.
+
+Usage:
+    python -m benchmarks.stub_server --port 8089 --latency-ms 50
+    python -m benchmarks.stub_server --error-rate 0.1 --slow-rate 0.01 --slow-ms 2000
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    """
+    Request handler answering completion requests with canned text.
+    """
+
+    protocol_version = "HTTP/1.1"  # Keep connections alive between requests
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Silence per-request logging; it dominates the cost of a stub call.
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on this request (deadline or hedged duplicate).
+            self.close_connection = True
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        payload = self._read_json()
+        prompts = payload.get("prompt", "")
+        if not isinstance(prompts, list):
+            prompts = [prompts]
+        self.server.record_request(len(prompts))
+        error_status, delay = self.server.next_fault()
+        time.sleep(self.server.latency + self.server.per_prompt_latency * len(prompts) + delay)
+        if error_status is not None:
+            self._send_json(error_status, {"error": {"message": f"Injected fault ({error_status})", "type": "server_error"}})
+            return
+
+        if payload.get("stream"):
+            self._send_stream(payload.get("model"), prompts[0])
+            return
+        self._send_json(200, self.server.completion_body(payload.get("model"), prompts))
+
+    def _send_stream(self, model: Optional[str], prompt: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for token in self.server.completion_tokens(prompt):
+            time.sleep(self.server.token_latency)
+            chunk = {"object": "text_completion", "model": model, "choices": [{"text": token, "index": 0}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class StubCompletionServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server exposing the stub completion endpoint.
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        latency: float = 0.05,
+        per_prompt_latency: float = 0.0,
+        token_latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+    ):
+        super().__init__(address, StubCompletionHandler)
+        self.latency = latency
+        self.per_prompt_latency = per_prompt_latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._scripted_faults: List[Tuple[Optional[int], float]] = []
+        self.request_count = 0
+        self.prompt_count = 0
+        self._count_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self, prompts: int = 1) -> None:
+        with self._count_lock:
+            self.request_count += 1
+            self.prompt_count += prompts
+
+    def fail_next(self, count: int = 1, status: Optional[int] = 503, delay: float = 0.0) -> None:
+        """
+        Scripts the next `count` requests to fail with `status` after an extra
+        `delay` seconds; with `status=None` they are only delayed.
+        """
+        with self._count_lock:
+            self._scripted_faults.extend([(status, delay)] * count)
+
+    def next_fault(self) -> Tuple[Optional[int], float]:
+        """
+        Returns the (error status or None, extra delay) to apply to the next request.
+        """
+        with self._count_lock:
+            if self._scripted_faults:
+                return self._scripted_faults.pop(0)
+        error_status = self.error_status if random.random() < self.error_rate else None
+        delay = self.slow_latency if random.random() < self.slow_rate else 0.0
+        return error_status, delay
+
+    @staticmethod
+    def completion_text(prompt: str) -> str:
+        return f"Stub completion for: {prompt}"
+
+    @classmethod
+    def completion_tokens(cls, prompt: str) -> List[str]:
+        """
+        Splits the completion into word tokens that re-join to the full text.
+        """
+        words = cls.completion_text(prompt).split(" ")
+        return [words[0]] + [f" {word}" for word in words[1:]]
+
+    def completion_body(self, model: Optional[str], prompts: List[str]) -> Dict[str, Any]:
+        return {
+            "id": f"cmpl-stub-{self.request_count}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {"text": self.completion_text(prompt), "index": index, "logprobs": None, "finish_reason": "stop"}
+                for index, prompt in enumerate(prompts)
+            ],
+        }
+
+    def start(self) -> "StubCompletionServer":
+        """
+        Serves requests from a background daemon thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--per-prompt-ms", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubCompletionServer(
+        (args.host, args.port),
+        latency=args.latency_ms / 1000,
+        per_prompt_latency=args.per_prompt_ms / 1000,
+        token_latency=args.token_ms / 1000,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_ms / 1000,
+    )
+    print(f"Stub completion server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
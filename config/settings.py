@@ -1,18 +1,137 @@
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseSettings, validator
 
 load_dotenv()
 
 class Settings(BaseSettings):
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    ASYNC_DATABASE_URL: Optional[str] = os.getenv("ASYNC_DATABASE_URL")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    WRITE_BEHIND_ENABLED: bool = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+    WRITE_BEHIND_BATCH_SIZE: int = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 500))
+    WRITE_BEHIND_FLUSH_INTERVAL: float = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.5))
+    WRITE_BEHIND_MAX_QUEUE_SIZE: int = int(os.getenv("WRITE_BEHIND_MAX_QUEUE_SIZE", 10000))
+    WRITE_BEHIND_PUT_TIMEOUT: float = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT", 1.0))
+    WRITE_BEHIND_MAX_RETRY_DELAY: float = float(os.getenv("WRITE_BEHIND_MAX_RETRY_DELAY", 5.0))  # failed flushes retry until they commit
+    WRITE_BEHIND_CLOSE_TIMEOUT: float = float(os.getenv("WRITE_BEHIND_CLOSE_TIMEOUT", 30))
+    STORAGE_COMPRESSION: str = os.getenv("STORAGE_COMPRESSION", "none")  # "none", "zlib" or "zstd" for responses and parameters
+    STORAGE_COMPRESSION_LEVEL: int = int(os.getenv("STORAGE_COMPRESSION_LEVEL", -1))  # -1 = codec default
+    STORAGE_COMPRESSION_MIN_BYTES: int = int(os.getenv("STORAGE_COMPRESSION_MIN_BYTES", 128))
+    STORAGE_ZSTD_DICT_PATH: Optional[str] = os.getenv("STORAGE_ZSTD_DICT_PATH")
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
     JWT_SECRET: str = os.getenv("JWT_SECRET")
+    JWT_EXPIRATION_MINUTES: int = int(os.getenv("JWT_EXPIRATION_MINUTES", 30))
+    TOKEN_CACHE_ENABLED: bool = os.getenv("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+    TOKEN_CACHE_MAX_ENTRIES: int = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", 10000))
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+    BCRYPT_EXECUTOR: str = os.getenv("BCRYPT_EXECUTOR", "thread")  # "thread" or "process"
+    BCRYPT_WORKERS: int = int(os.getenv("BCRYPT_WORKERS", os.cpu_count() or 1))
+    BCRYPT_MAX_PENDING: int = int(os.getenv("BCRYPT_MAX_PENDING", 64))
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
-    ALLOWED_HOSTS: List[str] = os.getenv("ALLOWED_HOSTS", ["*"]).split(",")
+    REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
+    REDIS_PASSWORD: Optional[str] = os.getenv("REDIS_PASSWORD")
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2))
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", 1))
+    REDIS_HEALTH_CHECK_INTERVAL: int = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+    REDIS_POOL_TIMEOUT: float = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", 8000))
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", os.cpu_count() or 1))
+    SERVER_BACKLOG: int = int(os.getenv("SERVER_BACKLOG", 2048))
+    SERVER_KEEPALIVE_TIMEOUT: int = int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", 5))
+    SERVER_GRACEFUL_TIMEOUT: int = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+    SERVER_MAX_REQUESTS: int = int(os.getenv("SERVER_MAX_REQUESTS", 0))  # recycle workers after this many requests; 0 = never
+    DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+    LOG_LEVEL: Optional[str] = os.getenv("LOG_LEVEL")  # defaults to DEBUG when DEBUG is set, otherwise INFO
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # "text" or "json"
+    LOG_FILE_PATH: Optional[str] = os.getenv("LOG_FILE_PATH")  # unset logs to stderr
+    LOG_FILE_MAX_SIZE: int = int(os.getenv("LOG_FILE_MAX_SIZE", 10 * 1024 * 1024))
+    LOG_FILE_BACKUP_COUNT: int = int(os.getenv("LOG_FILE_BACKUP_COUNT", 5))
+    LOG_QUEUE_ENABLED: bool = os.getenv("LOG_QUEUE_ENABLED", "true").lower() == "true"
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    LOG_DEBUG_SAMPLE_RATE: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1.0))
+    ALLOWED_HOSTS: List[str] = os.getenv("ALLOWED_HOSTS", "*").split(",")
+    OPENAI_API_BASE: str = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", 60))
+    OPENAI_CONNECT_TIMEOUT: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT", 5))
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", 200))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 50))
+    OPENAI_KEEPALIVE_EXPIRY: float = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 30))
+    RESILIENCE_ENABLED: bool = os.getenv("RESILIENCE_ENABLED", "true").lower() == "true"
+    OPENAI_MODEL_DEADLINES: Dict[str, float] = json.loads(os.getenv("OPENAI_MODEL_DEADLINES", "{}"))  # e.g. {"text-davinci-003": 30}
+    OPENAI_MAX_RETRIES: int = int(os.getenv("OPENAI_MAX_RETRIES", 2))
+    OPENAI_RETRY_BASE_DELAY: float = float(os.getenv("OPENAI_RETRY_BASE_DELAY", 0.2))
+    OPENAI_RETRY_MAX_DELAY: float = float(os.getenv("OPENAI_RETRY_MAX_DELAY", 5))
+    OPENAI_HEDGE_DELAY: float = float(os.getenv("OPENAI_HEDGE_DELAY", 0))  # seconds; 0 disables hedging
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5))
+    CIRCUIT_BREAKER_RECOVERY_TIMEOUT: float = float(os.getenv("CIRCUIT_BREAKER_RECOVERY_TIMEOUT", 30))
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
+    RATE_LIMIT_REDIS_ENABLED: bool = os.getenv("RATE_LIMIT_REDIS_ENABLED", "false").lower() == "true"
+    RATE_LIMIT_MODEL_LIMITS: Dict[str, Dict[str, float]] = json.loads(os.getenv("RATE_LIMIT_MODEL_LIMITS", "{}"))  # e.g. {"text-davinci-003": {"rpm": 3000, "tpm": 250000}}
+    RATE_LIMIT_DEFAULT_RPM: float = float(os.getenv("RATE_LIMIT_DEFAULT_RPM", 0))  # 0 = unlimited
+    RATE_LIMIT_DEFAULT_TPM: float = float(os.getenv("RATE_LIMIT_DEFAULT_TPM", 0))
+    RATE_LIMIT_MAX_WAIT: float = float(os.getenv("RATE_LIMIT_MAX_WAIT", 10))
+    USER_QUOTA_RPM: float = float(os.getenv("USER_QUOTA_RPM", 0))  # 0 = unlimited
+    USER_QUOTA_TPM: float = float(os.getenv("USER_QUOTA_TPM", 0))
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+    RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+    QUERY_CACHE_ENABLED: bool = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_CACHE_MAX_ENTRIES: int = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 10000))
+    QUERY_CACHE_MAX_BYTES: int = int(os.getenv("QUERY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    QUERY_CACHE_TTL: int = int(os.getenv("QUERY_CACHE_TTL", 3600))
+    QUERY_CACHE_NEGATIVE_TTL: int = int(os.getenv("QUERY_CACHE_NEGATIVE_TTL", 5))  # 0 = do not cache "not found"
+    QUERY_CACHE_COMPRESS_MIN_BYTES: int = int(os.getenv("QUERY_CACHE_COMPRESS_MIN_BYTES", 1024))
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_EMBEDDER: str = os.getenv("SEMANTIC_CACHE_EMBEDDER", "hashing")  # "hashing" or "module:function"
+    SEMANTIC_CACHE_DIM: int = int(os.getenv("SEMANTIC_CACHE_DIM", 256))  # dimensions of the hashing embedder
+    SEMANTIC_CACHE_THRESHOLDS: Dict[str, float] = json.loads(os.getenv("SEMANTIC_CACHE_THRESHOLDS", "{}"))  # e.g. {"text-davinci-003": 0.9}
+    SEMANTIC_CACHE_DEFAULT_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_DEFAULT_THRESHOLD", 0.99))  # the hashing embedder needs >= 0.99
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 100000))  # per model and parameter set
+    SEMANTIC_CACHE_MAX_INDEXES: int = int(os.getenv("SEMANTIC_CACHE_MAX_INDEXES", 16))  # model and parameter sets kept, least recently used dropped
+    SEMANTIC_CACHE_IVF_LISTS: int = int(os.getenv("SEMANTIC_CACHE_IVF_LISTS", 0))  # 0 = brute-force search
+    SEMANTIC_CACHE_IVF_NPROBE: int = int(os.getenv("SEMANTIC_CACHE_IVF_NPROBE", 8))
+    SINGLEFLIGHT_ENABLED: bool = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+    SINGLEFLIGHT_REDIS_ENABLED: bool = os.getenv("SINGLEFLIGHT_REDIS_ENABLED", "false").lower() == "true"
+    SINGLEFLIGHT_WAIT_TIMEOUT: float = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", 60))
+    BATCHING_ENABLED: bool = os.getenv("BATCHING_ENABLED", "false").lower() == "true"
+    BATCH_MAX_SIZE: int = int(os.getenv("BATCH_MAX_SIZE", 16))
+    BATCH_MAX_WAIT_MS: float = float(os.getenv("BATCH_MAX_WAIT_MS", 10))
+    BATCH_MAX_INFLIGHT: int = int(os.getenv("BATCH_MAX_INFLIGHT", 8))
+    QUERY_BATCH_CONCURRENCY: int = int(os.getenv("QUERY_BATCH_CONCURRENCY", 8))
+    QUERY_BATCH_MAX_ITEMS: int = int(os.getenv("QUERY_BATCH_MAX_ITEMS", 100))
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+    CONTEXT_BUDGET_ENABLED: bool = os.getenv("CONTEXT_BUDGET_ENABLED", "true").lower() == "true"
+    CONTEXT_OVERFLOW_POLICY: str = os.getenv("CONTEXT_OVERFLOW_POLICY", "reject")  # "reject" or "truncate"
+    CONTEXT_MIN_COMPLETION_TOKENS: int = int(os.getenv("CONTEXT_MIN_COMPLETION_TOKENS", 16))
+    MODEL_CONTEXT_WINDOWS: Dict[str, int] = json.loads(os.getenv("MODEL_CONTEXT_WINDOWS", "{}"))  # e.g. {"my-fine-tune": 4097}
+    DEFAULT_CONTEXT_WINDOW: int = int(os.getenv("DEFAULT_CONTEXT_WINDOW", 4097))
+    TOKENIZER_DEFAULT_ENCODING: str = os.getenv("TOKENIZER_DEFAULT_ENCODING", "cl100k_base")
+    TOKEN_COUNT_CACHE_SIZE: int = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 4096))  # prompt token counts memoised by digest
+    JOBS_ENABLED: bool = os.getenv("JOBS_ENABLED", "false").lower() == "true"
+    JOB_BROKER: str = os.getenv("JOB_BROKER", "sqlite")  # "sqlite" (one host) or "redis"
+    JOB_SQLITE_PATH: str = os.getenv("JOB_SQLITE_PATH", "jobs.db")
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", 4))  # per server process; 0 = submit only
+    JOB_VISIBILITY_TIMEOUT: float = float(os.getenv("JOB_VISIBILITY_TIMEOUT", 300))  # keep above OPENAI_TIMEOUT and model deadlines
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    JOB_RETRY_DELAY: float = float(os.getenv("JOB_RETRY_DELAY", 5))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", 0.5))
+    JOB_RESULT_TTL: int = int(os.getenv("JOB_RESULT_TTL", 86400))
+    WEBHOOK_TIMEOUT: float = float(os.getenv("WEBHOOK_TIMEOUT", 5))
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_ALLOWED_HOSTS: List[str] = os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",")  # empty = any host
+    WEBHOOK_ALLOW_PRIVATE_ADDRESSES: bool = os.getenv("WEBHOOK_ALLOW_PRIVATE_ADDRESSES", "false").lower() == "true"  # allow loopback/private targets
 
     @validator("DATABASE_URL", pre=True)
     def validate_database_url(cls, v: str) -> str:
@@ -41,12 +160,52 @@ class Settings(BaseSettings):
     def db_url(self) -> str:
         return self.DATABASE_URL
 
+    @property
+    def async_db_url(self) -> str:
+        """
+        Async driver URL: ASYNC_DATABASE_URL, or DATABASE_URL mapped onto asyncpg/aiosqlite.
+        """
+        if self.ASYNC_DATABASE_URL:
+            return self.ASYNC_DATABASE_URL
+        scheme, _, rest = self.DATABASE_URL.partition("://")
+        driver = {"postgres": "postgresql+asyncpg", "postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+        return f"{driver.get(scheme.split('+')[0], scheme)}://{rest}"
+
+    @property
+    def db_pool_options(self) -> Dict[str, Any]:
+        return {
+            "pool_size": self.DB_POOL_SIZE,
+            "max_overflow": self.DB_MAX_OVERFLOW,
+            "pool_recycle": self.DB_POOL_RECYCLE,
+            "pool_pre_ping": self.DB_POOL_PRE_PING,
+        }
+
     @property
     def redis_connection_params(self) -> Dict[str, Any]:
-        return {"host": self.REDIS_HOST, "port": self.REDIS_PORT}
+        return {"host": self.REDIS_HOST, "port": self.REDIS_PORT, "db": self.REDIS_DB, "password": self.REDIS_PASSWORD}
+
+    @property
+    def redis_pool_params(self) -> Dict[str, Any]:
+        return {
+            **self.redis_connection_params,
+            "max_connections": self.REDIS_MAX_CONNECTIONS,
+            "socket_timeout": self.REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": self.REDIS_SOCKET_CONNECT_TIMEOUT,
+            "health_check_interval": self.REDIS_HEALTH_CHECK_INTERVAL,
+        }
 
     @property
     def openai_config(self) -> Dict[str, str]:
-        return {"api_key": self.OPENAI_API_KEY}
+        return {"api_key": self.OPENAI_API_KEY, "api_base": self.OPENAI_API_BASE}
+
+    @property
+    def openai_http_config(self) -> Dict[str, Any]:
+        return {
+            "timeout": self.OPENAI_TIMEOUT,
+            "connect_timeout": self.OPENAI_CONNECT_TIMEOUT,
+            "max_connections": self.OPENAI_MAX_CONNECTIONS,
+            "max_keepalive_connections": self.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": self.OPENAI_KEEPALIVE_EXPIRY,
+        }
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+Compressed storage for large text and JSON columns.
+
+`CompressedText` and `CompressedJSON` store their values as bytes. With
+STORAGE_COMPRESSION set to "zlib" or "zstd", values of at least
+STORAGE_COMPRESSION_MIN_BYTES are compressed on write; shorter values, and
+every value while compression is off, are stored as plain UTF-8. A stored
+value starts with a NUL byte and a codec tag only when it is compressed,
+and text never starts with NUL, so reads accept both forms, as well as
+rows written before the columns were converted. Values are decompressed in
+the result processor, so only the columns a statement selects are ever
+decompressed; summary listings and lookups of other columns skip it.
+
+zstd needs the optional `zstandard` package. A dictionary trained on
+existing responses (see `train-dict` below) compresses short values much
+better; point STORAGE_ZSTD_DICT_PATH at it before writing with it, and
+keep it available for as long as rows compressed with it exist.
+
+Usage:
+    python -m core.database.compression stats
+    python -m core.database.compression train-dict responses.dict --samples 10000
+    python -m core.database.compression backfill --batch-size 1000
+"""
+import argparse
+import json
+import logging
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import LargeBinary, and_, bindparam, cast, func, select, type_coerce, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeDecorator
+
+from config.settings import settings
+
+try:
+    import zstandard  # 0.23.0: zstd compression with trained dictionaries (optional)
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MARKER = b"\x00"
+ZLIB = b"z"
+ZSTD = b"s"
+RAW = b"r"  # plain UTF-8 that itself starts with a NUL byte
+
+COMPRESSED_COLUMNS = ("response", "parameters")
+
+@lru_cache(maxsize=4)
+def _zstd_dictionary(path: str) -> Any:
+    with open(path, "rb") as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+def _zstd_compressor(level: int) -> Any:
+    if zstandard is None:
+        raise RuntimeError("STORAGE_COMPRESSION=zstd requires the zstandard package.")
+    path = settings.STORAGE_ZSTD_DICT_PATH
+    # Compressors are not thread-safe, so one is built per call; with a
+    # dictionary most of the cost is preparing it, which the dictionary caches.
+    if path:
+        return zstandard.ZstdCompressor(level=level, dict_data=_zstd_dictionary(path))
+    return zstandard.ZstdCompressor(level=level)
+
+def _zstd_decompress(data: bytes) -> bytes:
+    if zstandard is None:
+        raise RuntimeError("Reading zstd-compressed rows requires the zstandard package.")
+    path = settings.STORAGE_ZSTD_DICT_PATH
+    if path:
+        return zstandard.ZstdDecompressor(dict_data=_zstd_dictionary(path)).decompress(data)
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def compress(data: bytes, codec: Optional[str] = None, level: Optional[int] = None) -> bytes:
+    """
+    Encodes `data` for storage with `codec` ("none", "zlib" or "zstd"),
+    defaulting to STORAGE_COMPRESSION. Values shorter than
+    STORAGE_COMPRESSION_MIN_BYTES, or that would not shrink, stay plain.
+    """
+    codec = codec or settings.STORAGE_COMPRESSION
+    level = settings.STORAGE_COMPRESSION_LEVEL if level is None else level
+    if codec != "none" and len(data) >= settings.STORAGE_COMPRESSION_MIN_BYTES:
+        if codec == "zlib":
+            encoded = MARKER + ZLIB + zlib.compress(data, level if level >= 0 else -1)
+        elif codec == "zstd":
+            encoded = MARKER + ZSTD + _zstd_compressor(level if level >= 0 else 3).compress(data)
+        else:
+            raise ValueError(f"Unknown STORAGE_COMPRESSION codec {codec!r}")
+        if len(encoded) < len(data):
+            return encoded
+    return MARKER + RAW + data if data[:1] == MARKER else data
+
+def decompress(data: bytes) -> bytes:
+    """Decodes a value written by `compress`, or returns plain data unchanged."""
+    if data[:1] != MARKER:
+        return data
+    tag, body = data[1:2], data[2:]
+    if tag == ZLIB:
+        return zlib.decompress(body)
+    if tag == ZSTD:
+        return _zstd_decompress(body)
+    if tag == RAW:
+        return body
+    raise ValueError(f"Unknown compression tag {tag!r}")
+
+def is_compressed(data: Optional[bytes]) -> bool:
+    """Whether a stored value is compressed."""
+    return data is not None and data[:1] == MARKER and data[1:2] in (ZLIB, ZSTD)
+
+def _stored_bytes(value: Any) -> bytes:
+    # Drivers return bytes, memoryview (psycopg2) or, for rows written as
+    # text before the column was converted, str (SQLite).
+    return value.encode("utf-8") if isinstance(value, str) else bytes(value)
+
+class CompressedText(TypeDecorator):
+    """Text stored as bytes, compressed according to STORAGE_COMPRESSION."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect: Any) -> Optional[bytes]:
+        return None if value is None else compress(value.encode("utf-8"))
+
+    def process_result_value(self, value: Any, dialect: Any) -> Optional[str]:
+        return None if value is None else decompress(_stored_bytes(value)).decode("utf-8")
+
+class CompressedJSON(TypeDecorator):
+    """JSON stored as compact bytes, compressed according to STORAGE_COMPRESSION."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect: Any) -> Optional[bytes]:
+        if value is None:
+            return None
+        return compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+    def process_result_value(self, value: Any, dialect: Any) -> Any:
+        return None if value is None else json.loads(decompress(_stored_bytes(value)))
+
+def _raw_rows(conn: Any, after_id: int, limit: int) -> Iterator[Tuple[int, Optional[bytes], Optional[bytes]]]:
+    from core.database import models
+
+    queries = models.Query.__table__
+    rows = conn.execute(
+        select(
+            queries.c.id,
+            type_coerce(queries.c.response, LargeBinary),
+            type_coerce(queries.c.parameters, LargeBinary),
+        )
+        .where(queries.c.id > after_id)
+        .order_by(queries.c.id)
+        .limit(limit)
+    ).all()
+    for query_id, response, parameters in rows:
+        yield (
+            query_id,
+            None if response is None else _stored_bytes(response),
+            None if parameters is None else _stored_bytes(parameters),
+        )
+
+def backfill(engine: Engine, batch_size: int = 1000, codec: Optional[str] = None) -> Dict[str, int]:
+    """
+    Rewrites stored responses and parameters with `codec` (default
+    STORAGE_COMPRESSION), one batch of rows per transaction, so it can run
+    against a live database and be resumed. Values already compressed are
+    left alone; with codec "none" compressed values are expanded instead.
+
+    Each column is rewritten on its own and only while it still holds the
+    value that was read, so a response stored by `complete_query` between
+    the read and the write is kept rather than overwritten and counted in
+    `skipped`.
+
+    Returns row and byte counts before and after.
+    """
+    from core.database import models
+
+    codec = codec or settings.STORAGE_COMPRESSION
+    queries = models.Query.__table__
+    rewrites = [
+        update(queries)
+        .where(
+            and_(
+                queries.c.id == bindparam("query_id"),
+                cast(column, LargeBinary).is_not_distinct_from(bindparam("old", type_=LargeBinary)),
+            )
+        )
+        .values({column.name: type_coerce(bindparam("new"), LargeBinary)})
+        for column in (queries.c.response, queries.c.parameters)
+    ]
+    stats = {"rows": 0, "rewritten": 0, "skipped": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = list(_raw_rows(conn, last_id, batch_size))
+            if not rows:
+                break
+            changes = [[], []]
+            for query_id, *columns in rows:
+                for stored, column_changes in zip(columns, changes):
+                    if stored is None:
+                        continue
+                    stats["bytes_before"] += len(stored)
+                    if is_compressed(stored) == (codec != "none"):
+                        new = stored
+                    else:
+                        new = compress(decompress(stored), codec)
+                    stats["bytes_after"] += len(new)
+                    if new != stored:
+                        column_changes.append({"query_id": query_id, "old": stored, "new": new})
+            rewritten = set()
+            for rewrite, column_changes in zip(rewrites, changes):
+                for change in column_changes:
+                    if conn.execute(rewrite, change).rowcount:
+                        rewritten.add(change["query_id"])
+                    else:
+                        stats["skipped"] += 1
+            stats["rows"] += len(rows)
+            stats["rewritten"] += len(rewritten)
+            last_id = rows[-1][0]
+        logger.info("Backfilled %d rows up to id %d", stats["rows"], last_id)
+    return stats
+
+def storage_stats(engine: Engine) -> Dict[str, float]:
+    """Returns the row count and average stored bytes per row of the compressed columns."""
+    from core.database import models
+
+    queries = models.Query.__table__
+    with engine.connect() as conn:
+        rows, response_bytes, parameters_bytes = conn.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(func.length(type_coerce(queries.c.response, LargeBinary))), 0),
+                func.coalesce(func.sum(func.length(type_coerce(queries.c.parameters, LargeBinary))), 0),
+            )
+        ).one()
+    return {
+        "rows": rows,
+        "response_bytes_per_row": response_bytes / rows if rows else 0.0,
+        "parameters_bytes_per_row": parameters_bytes / rows if rows else 0.0,
+    }
+
+def train_dictionary(engine: Engine, path: str, samples: int = 10000, size: int = 112640) -> int:
+    """
+    Trains a zstd dictionary of up to `size` bytes on the newest `samples`
+    responses and writes it to `path`. Returns the dictionary's ID.
+    """
+    if zstandard is None:
+        raise RuntimeError("Training a dictionary requires the zstandard package.")
+    from core.database import models
+
+    with engine.connect() as conn:
+        responses = conn.execute(
+            select(models.Query.response)
+            .where(models.Query.response.is_not(None))
+            .order_by(models.Query.id.desc())
+            .limit(samples)
+        ).scalars().all()
+    dictionary = zstandard.train_dictionary(size, [response.encode("utf-8") for response in responses])
+    with open(path, "wb") as f:
+        f.write(dictionary.as_bytes())
+    return dictionary.dict_id()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show bytes per row of the compressed columns")
+    train = commands.add_parser("train-dict", help="Train a zstd dictionary on stored responses")
+    train.add_argument("path")
+    train.add_argument("--samples", type=int, default=10000)
+    train.add_argument("--size", type=int, default=112640)
+    run = commands.add_parser("backfill", help="Rewrite existing rows with the configured codec")
+    run.add_argument("--batch-size", type=int, default=1000)
+    run.add_argument("--codec", choices=("none", "zlib", "zstd"), default=None)
+    args = parser.parse_args()
+
+    from core.database.database import get_engine
+
+    engine = get_engine()
+    if args.command == "stats":
+        print(json.dumps(storage_stats(engine)))
+    elif args.command == "train-dict":
+        dict_id = train_dictionary(engine, args.path, args.samples, args.size)
+        print(f"wrote dictionary {dict_id} to {args.path}; set STORAGE_ZSTD_DICT_PATH to use it")
+    else:
+        print(json.dumps(backfill(engine, args.batch_size, args.codec)))
+
+if __name__ == "__main__":
+    main()
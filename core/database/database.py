@@ -1,15 +1,110 @@
-from typing import Optional, List, Dict, Any
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import atexit
+import base64
+from datetime import datetime
+from typing import Optional, List, Dict, Any, AsyncIterator, Iterable, Iterator, Tuple
+from sqlalchemy import and_, create_engine, insert, or_, select
+from sqlalchemy.sql import Select
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import load_only, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session
 
 from config.settings import settings
 from core.database import models
+from core.database.write_behind import WriteBehindQueue
+from core.services.cache import content_hash as make_content_hash, get_query_cache
+from core.services.tokens import count_tokens
+from core.utils import metrics
+from core.utils.utils import acheck_password, check_password
 
-# Database Connection and Session:
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)  # Initialize database engine
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)  # Define session maker
+def engine_options(url: str) -> Dict[str, Any]:
+    """Returns the pool settings applicable to the given database URL."""
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING, "pool_recycle": settings.DB_POOL_RECYCLE}
+    if make_url(url).get_backend_name() != "sqlite":
+        # SQLite uses a per-thread/static pool that does not accept sizing options.
+        options.update(pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW)
+    return options
+
+# Database Connection and Session (created on first use, normally from the app's startup hook):
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+
+def get_engine() -> Engine:
+    """Returns the shared engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+    return _engine
+
+def SessionLocal() -> Session:
+    """Creates a new session bound to the shared engine."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+    return _session_factory()
+
+def dispose_engine() -> None:
+    """Closes every pooled connection held by the engine."""
+    global _engine, _session_factory
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+        _session_factory = None
+
+def __getattr__(name: str) -> Any:
+    # `database.engine` predates get_engine(); keep it working without
+    # creating the engine at import time.
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Async Database Connection and Session (created on first use so the async driver stays optional):
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+def get_async_engine() -> AsyncEngine:
+    """Returns the shared async engine, creating it on first use."""
+    global _async_engine
+    if _async_engine is None:
+        url = settings.async_db_url
+        _async_engine = create_async_engine(url, **engine_options(url))
+    return _async_engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Creates a new async session bound to the shared async engine."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_session_factory()
+
+# Write-Behind Persistence (created on first use when WRITE_BEHIND_ENABLED is set):
+_write_behind_queue: Optional[WriteBehindQueue] = None
+
+def get_write_behind_queue() -> Optional[WriteBehindQueue]:
+    """Returns the shared write-behind queue, or None when write-behind is disabled."""
+    global _write_behind_queue
+    if _write_behind_queue is None and settings.WRITE_BEHIND_ENABLED:
+        _write_behind_queue = WriteBehindQueue(
+            SessionLocal,
+            batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+            flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+            max_queue_size=settings.WRITE_BEHIND_MAX_QUEUE_SIZE,
+            put_timeout=settings.WRITE_BEHIND_PUT_TIMEOUT,
+            max_retry_delay=settings.WRITE_BEHIND_MAX_RETRY_DELAY,
+        )
+        atexit.register(_write_behind_queue.close, settings.WRITE_BEHIND_CLOSE_TIMEOUT)
+    return _write_behind_queue
+
+def close_write_behind_queue(timeout: Optional[float] = None) -> None:
+    """
+    Flushes pending write-behind rows and stops the writer thread, waiting
+    at most `timeout` seconds (default WRITE_BEHIND_CLOSE_TIMEOUT).
+    """
+    global _write_behind_queue
+    if _write_behind_queue is not None:
+        _write_behind_queue.close(settings.WRITE_BEHIND_CLOSE_TIMEOUT if timeout is None else timeout)
+        _write_behind_queue = None
 
 # Base Model for SQLAlchemy:
 Base = declarative_base()
@@ -35,45 +130,368 @@ def create_user(db: Session, username: str, password: str):
 def authenticate_user(db: Session, username: str, password: str):
     """Authenticates a user against the database."""
     user = db.query(models.User).filter(models.User.username == username).first()
-    if user and bcrypt.checkpw(password.encode(), user.password.encode()):
+    if user and check_password(password, user.password):
         return user
     return None
 
-def store_query_and_response(db: Session, user_id: int, query_text: str, model: str, parameters: Dict, response: str):
-    """Stores a new query and its response in the database."""
-    new_query = models.Query(
+def response_cache_key(query_id: int, user_id: Optional[int] = None) -> str:
+    """Query response cache key of a lookup, scoped to the owner when `user_id` is given."""
+    return str(query_id) if user_id is None else f"{user_id}:{query_id}"
+
+def _response_cache_keys(user_id: int, query_ids: Iterable[int]) -> List[str]:
+    return [key for query_id in query_ids for key in (response_cache_key(query_id), response_cache_key(query_id, user_id))]
+
+def invalidate_responses(user_id: int, *query_ids: int) -> None:
+    """
+    Drops cached lookups of `user_id`'s `query_ids`, including cached misses,
+    after their rows were written, so `get_response_by_id` sees the new state at once.
+    """
+    if settings.QUERY_CACHE_ENABLED and query_ids:
+        get_query_cache().invalidate(*_response_cache_keys(user_id, query_ids))
+
+def query_row(
+    user_id: int,
+    query_text: str,
+    model: str,
+    parameters: Dict,
+    response: Optional[str],
+    content_hash: Optional[str] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Builds the column values of a new `queries` row.
+
+    Token counts default to `count_tokens` of the query text and response;
+    a pending query (`response` None) has no completion count yet.
+    """
+    return dict(
         user_id=user_id,
         query_text=query_text,
         model=model,
         parameters=parameters,
         response=response,
-        timestamp=datetime.utcnow()
+        timestamp=datetime.utcnow(),
+        content_hash=content_hash or make_content_hash(model, query_text, parameters),
+        prompt_tokens=prompt_tokens if prompt_tokens is not None else count_tokens(query_text, model),
+        completion_tokens=(
+            completion_tokens if completion_tokens is not None or response is None else count_tokens(response, model, memoise=False)
+        ),
     )
+
+def store_query_and_response(
+    db: Session,
+    user_id: int,
+    query_text: str,
+    model: str,
+    parameters: Dict,
+    response: str,
+    content_hash: Optional[str] = None,
+    prompt_tokens: Optional[int] = None,
+):
+    """
+    Stores a new query and its response in the database.
+
+    `content_hash` defaults to `core.services.cache.content_hash`, the service cache key.
+    Pass the `prompt_tokens` the service budgeted when it truncated the prompt.
+    With WRITE_BEHIND_ENABLED the row is queued for a batched insert instead
+    and the returned, not yet persisted `Query` has no ID.
+    """
+    row = query_row(user_id, query_text, model, parameters, response, content_hash, prompt_tokens)
+    write_behind_queue = get_write_behind_queue()
+    if write_behind_queue is not None:
+        write_behind_queue.enqueue(row)
+        return models.Query(**row)
+    new_query = models.Query(**row)
     db.add(new_query)
-    db.commit()
+    with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="store_query"):
+        db.commit()
     db.refresh(new_query)
+    invalidate_responses(user_id, new_query.id)
     return new_query
 
-def get_response_by_id(db: Session, query_id: int):
-    """Retrieves the response for a given query ID from the database."""
-    query = db.query(models.Query).filter(models.Query.id == query_id).first()
-    if query:
-        return query.response
-    return None
+def reserve_query(db: Session, user_id: int, query_text: str, model: str, parameters: Dict):
+    """
+    Inserts a query whose response is still pending, so its ID can be handed
+    out before the completion exists. `complete_query` fills in the response.
+    Bypasses write-behind, as the ID is needed immediately.
+    """
+    new_query = models.Query(**query_row(user_id, query_text, model, parameters, None))
+    db.add(new_query)
+    with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="reserve_query"):
+        db.commit()
+    db.refresh(new_query)
+    invalidate_responses(user_id, new_query.id)
+    return new_query
+
+def complete_query(db: Session, query_id: int, response: str, prompt_tokens: Optional[int] = None) -> bool:
+    """
+    Stores the response of a query created by `reserve_query`, and the
+    budgeted `prompt_tokens` if the service truncated the prompt.
+
+    Returns whether the query exists.
+    """
+    query = db.get(models.Query, query_id)
+    if query is None:
+        return False
+    query.response = response
+    if prompt_tokens is not None:
+        query.prompt_tokens = prompt_tokens
+    query.completion_tokens = count_tokens(response, query.model or "", memoise=False)
+    with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="complete_query"):
+        db.commit()
+    invalidate_responses(query.user_id, query_id)
+    return True
+
+def store_queries_and_responses(db: Session, user_id: int, items: List[Dict[str, Any]]) -> List[int]:
+    """
+    Stores several queries and their responses in a single transaction.
+
+    Each item carries `query_text`, `model`, `parameters`, `response` and
+    optionally `content_hash` and `prompt_tokens`. Rows are inserted with one multi-row statement
+    and committed together, bypassing the write-behind queue, so either all
+    of them are stored or none is. Returns the new IDs in item order.
+    """
+    if not items:
+        return []
+    rows = [query_row(user_id, **item) for item in items]
+    try:
+        with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="store_queries"):
+            ids = db.execute(insert(models.Query).returning(models.Query.id, sort_by_parameter_order=True), rows).scalars().all()
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_responses(user_id, *ids)
+    return list(ids)
+
+def _response_statement(query_id: int, user_id: Optional[int]) -> Select:
+    statement = select(models.Query.response).filter(models.Query.id == query_id)
+    if user_id is not None:
+        statement = statement.filter(models.Query.user_id == user_id)
+    return statement
+
+def get_response_by_id(db: Session, query_id: int, user_id: Optional[int] = None):
+    """
+    Retrieves the response for a given query ID, or None if the query does not
+    exist, is still pending, or belongs to another user than `user_id`. With
+    QUERY_CACHE_ENABLED the lookup reads through the query response cache,
+    keyed by owner and ID, which also remembers misses briefly.
+    """
+    def load() -> Optional[str]:
+        return db.execute(_response_statement(query_id, user_id)).scalar_one_or_none()
+
+    if not settings.QUERY_CACHE_ENABLED:
+        return load()
+    return get_query_cache().get(response_cache_key(query_id, user_id), load)
+
+def get_query_by_content_hash(db: Session, content_hash: str):
+    """Retrieves the most recent query with the given content hash, using its index."""
+    return db.execute(
+        select(models.Query)
+        .filter(models.Query.content_hash == content_hash)
+        .order_by(models.Query.id.desc())
+        .limit(1)
+    ).scalars().first()
 
 def get_user_queries(db: Session, user_id: int):
     """Retrieves a list of queries for a specific user from the database."""
     queries = db.query(models.Query).filter(models.Query.user_id == user_id).all()
     return queries
 
-# Optional: Caching Mechanism using Redis:
-if settings.REDIS_HOST:
-    redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
-    
-    def cache_response(query_id: str, response: str):
-        """Caches the response for a given query ID in Redis."""
-        redis_client.set(query_id, response)
-
-    def get_cached_response(query_id: str):
-        """Retrieves the cached response for a given query ID from Redis."""
-        return redis_client.get(query_id).decode("utf-8")
\ No newline at end of file
+# Paginated and Streaming Query History:
+def encode_cursor(query: models.Query) -> str:
+    """Encodes the keyset position just after `query` as an opaque cursor."""
+    position = f"{query.timestamp.isoformat()}|{query.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodes a cursor from `encode_cursor`; raises ValueError if it is malformed."""
+    try:
+        timestamp, query_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(query_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def user_queries_statement(user_id: int, cursor: Optional[str] = None, summary: bool = False) -> Select:
+    """
+    Builds the newest-first query history statement for a user.
+
+    With a cursor only rows strictly after that keyset position are selected.
+    With `summary` only id, model and timestamp are loaded; other columns
+    such as the response text load lazily when first accessed.
+    """
+    statement = (
+        select(models.Query)
+        .filter(models.Query.user_id == user_id)
+        .order_by(models.Query.timestamp.desc(), models.Query.id.desc())
+    )
+    if cursor is not None:
+        timestamp, query_id = decode_cursor(cursor)
+        statement = statement.filter(
+            or_(
+                models.Query.timestamp < timestamp,
+                and_(models.Query.timestamp == timestamp, models.Query.id < query_id),
+            )
+        )
+    if summary:
+        statement = statement.options(load_only(models.Query.id, models.Query.model, models.Query.timestamp))
+    return statement
+
+def get_user_queries_page(db: Session, user_id: int, limit: int = 50, cursor: Optional[str] = None, summary: bool = False):
+    """
+    Retrieves one page of a user's queries, newest first, using keyset pagination.
+
+    Returns the page and the cursor for the next one (None on the last page).
+    """
+    queries = db.execute(user_queries_statement(user_id, cursor, summary).limit(limit + 1)).scalars().all()
+    next_cursor = encode_cursor(queries[limit - 1]) if len(queries) > limit else None
+    return queries[:limit], next_cursor
+
+def iter_user_queries(db: Session, user_id: int, batch_size: int = 1000, summary: bool = False) -> Iterator[models.Query]:
+    """
+    Streams every query of a user, newest first, holding at most `batch_size` rows in memory.
+
+    Uses `yield_per`, which fetches through a server-side cursor where the driver supports it.
+    """
+    statement = user_queries_statement(user_id, summary=summary).execution_options(yield_per=batch_size)
+    yield from db.execute(statement).scalars()
+
+# Async Database Session Management:
+async def get_async_db():
+    """Provides an async database session for the application."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Async Database Operations:
+async def acreate_user(db: AsyncSession, username: str, password: str):
+    """Creates a new user in the database without blocking the event loop."""
+    new_user = models.User(username=username, password=password)
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return new_user
+
+async def aauthenticate_user(db: AsyncSession, username: str, password: str):
+    """
+    Authenticates a user against the database without blocking the event loop.
+
+    Raises PasswordHashingBusy when the bcrypt worker pool is saturated.
+    """
+    result = await db.execute(select(models.User).filter(models.User.username == username))
+    user = result.scalars().first()
+    if user and await acheck_password(password, user.password):
+        return user
+    return None
+
+async def ainvalidate_responses(user_id: int, *query_ids: int) -> None:
+    """Async variant of `invalidate_responses`."""
+    if settings.QUERY_CACHE_ENABLED and query_ids:
+        await get_query_cache().ainvalidate(*_response_cache_keys(user_id, query_ids))
+
+async def astore_query_and_response(
+    db: AsyncSession,
+    user_id: int,
+    query_text: str,
+    model: str,
+    parameters: Dict,
+    response: str,
+    content_hash: Optional[str] = None,
+    prompt_tokens: Optional[int] = None,
+):
+    """
+    Stores a new query and its response in the database without blocking the event loop.
+
+    `content_hash` defaults to `core.services.cache.content_hash`, the service cache key.
+    Pass the `prompt_tokens` the service budgeted when it truncated the prompt.
+    With WRITE_BEHIND_ENABLED the row is queued for a batched insert instead
+    and the returned, not yet persisted `Query` has no ID.
+    """
+    row = query_row(user_id, query_text, model, parameters, response, content_hash, prompt_tokens)
+    write_behind_queue = get_write_behind_queue()
+    if write_behind_queue is not None:
+        await write_behind_queue.aenqueue(row)
+        return models.Query(**row)
+    new_query = models.Query(**row)
+    db.add(new_query)
+    with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="store_query"):
+        await db.commit()
+    await db.refresh(new_query)
+    await ainvalidate_responses(user_id, new_query.id)
+    return new_query
+
+async def areserve_query(db: AsyncSession, user_id: int, query_text: str, model: str, parameters: Dict):
+    """Async variant of `reserve_query`."""
+    new_query = models.Query(**query_row(user_id, query_text, model, parameters, None))
+    db.add(new_query)
+    with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="reserve_query"):
+        await db.commit()
+    await db.refresh(new_query)
+    await ainvalidate_responses(user_id, new_query.id)
+    return new_query
+
+async def astore_queries_and_responses(db: AsyncSession, user_id: int, items: List[Dict[str, Any]]) -> List[int]:
+    """Async variant of `store_queries_and_responses`."""
+    if not items:
+        return []
+    rows = [query_row(user_id, **item) for item in items]
+    try:
+        with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="store_queries"):
+            result = await db.execute(insert(models.Query).returning(models.Query.id, sort_by_parameter_order=True), rows)
+            ids = result.scalars().all()
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    await ainvalidate_responses(user_id, *ids)
+    return list(ids)
+
+async def aget_response_by_id(db: AsyncSession, query_id: int, user_id: Optional[int] = None):
+    """Retrieves the response for a given query ID without blocking the event loop."""
+    async def load() -> Optional[str]:
+        result = await db.execute(_response_statement(query_id, user_id))
+        return result.scalar_one_or_none()
+
+    if not settings.QUERY_CACHE_ENABLED:
+        return await load()
+    return await get_query_cache().aget(response_cache_key(query_id, user_id), load)
+
+async def aget_query_by_content_hash(db: AsyncSession, content_hash: str):
+    """Async variant of `get_query_by_content_hash`."""
+    result = await db.execute(
+        select(models.Query)
+        .filter(models.Query.content_hash == content_hash)
+        .order_by(models.Query.id.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+async def aget_user_queries(db: AsyncSession, user_id: int):
+    """Retrieves a list of queries for a specific user without blocking the event loop."""
+    result = await db.execute(select(models.Query).filter(models.Query.user_id == user_id))
+    return result.scalars().all()
+
+async def aget_user_queries_page(db: AsyncSession, user_id: int, limit: int = 50, cursor: Optional[str] = None, summary: bool = False):
+    """
+    Async variant of `get_user_queries_page`.
+
+    In summary mode, load a deferred column with `await db.refresh(query, ["response"])`.
+    """
+    result = await db.execute(user_queries_statement(user_id, cursor, summary).limit(limit + 1))
+    queries = result.scalars().all()
+    next_cursor = encode_cursor(queries[limit - 1]) if len(queries) > limit else None
+    return queries[:limit], next_cursor
+
+async def aiter_user_queries(db: AsyncSession, user_id: int, batch_size: int = 1000, summary: bool = False) -> AsyncIterator[models.Query]:
+    """Async variant of `iter_user_queries`, streamed without blocking the event loop."""
+    statement = user_queries_statement(user_id, summary=summary).execution_options(yield_per=batch_size)
+    async for query in await db.stream_scalars(statement):
+        yield query
+
+async def dispose_async_engine() -> None:
+    """Closes every pooled connection held by the async engine."""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
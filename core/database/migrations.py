@@ -0,0 +1,224 @@
+"""
+Schema migrations for the application database.
+
+Each migration is an idempotent function applied at most once, in order,
+and recorded in the `schema_migrations` table. Migrations inspect the live
+schema before changing it, so they are safe to run against databases that
+were created from the current models with `create_all`.
+
+Usage:
+    python -m core.database.migrations            # apply pending migrations
+    python -m core.database.migrations --status   # list applied/pending migrations
+"""
+import argparse
+import json
+import logging
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, LargeBinary, MetaData, String, Table, bindparam, inspect, select, text, type_coerce, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.types import NullType
+
+from core.database import models
+from core.database.compression import decompress
+from core.services.cache import content_hash
+from core.services.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String(128), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def _index_names(conn: Connection, table: str) -> List[str]:
+    return [index["name"] for index in inspect(conn).get_indexes(table)]
+
+def _column_names(conn: Connection, table: str) -> List[str]:
+    return [column["name"] for column in inspect(conn).get_columns(table)]
+
+def _create_index(conn: Connection, name: str) -> None:
+    index = next(index for index in models.Query.__table__.indexes if index.name == name)
+    if name not in _index_names(conn, models.Query.__tablename__):
+        index.create(conn)
+
+def create_base_tables(conn: Connection) -> None:
+    """Creates any missing tables from the current models."""
+    models.Base.metadata.create_all(conn, checkfirst=True)
+
+def add_queries_user_timestamp_index(conn: Connection) -> None:
+    """Indexes per-user history lookups on (user_id, timestamp DESC, id DESC)."""
+    _create_index(conn, "ix_queries_user_id_timestamp")
+
+def _raw(column: Column) -> Any:
+    # Selects the driver's value untouched: before 0005 converts them, the
+    # response and parameters columns are still text and JSON (parsed by
+    # psycopg2), not the compressed bytes the current model expects.
+    return type_coerce(column, NullType()).label(column.name)
+
+def _stored_text(value: Any) -> Optional[str]:
+    """Decodes a response or parameters value as stored by any schema version."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return decompress(bytes(value)).decode("utf-8")
+
+def _stored_json(value: Any) -> Any:
+    if value is None or isinstance(value, (dict, list)):
+        return value
+    return json.loads(_stored_text(value))
+
+def add_queries_content_hash(conn: Connection) -> None:
+    """Adds the indexed content_hash column and backfills it for existing rows."""
+    if "content_hash" not in _column_names(conn, models.Query.__tablename__):
+        conn.execute(text("ALTER TABLE queries ADD COLUMN content_hash VARCHAR(64)"))
+    _create_index(conn, "ix_queries_content_hash")
+    _backfill_content_hashes(conn, missing_only=True)
+
+def rehash_queries_content_hash(conn: Connection) -> None:
+    """
+    Recomputes content hashes from the request parameters the service sends,
+    defaults included, so they match its cache keys; earlier rows hashed the
+    parameters as the client supplied them.
+    """
+    _backfill_content_hashes(conn, missing_only=False)
+
+def _backfill_content_hashes(conn: Connection, missing_only: bool) -> None:
+    queries = models.Query.__table__
+    backfill = (
+        update(queries)
+        .where(queries.c.id == bindparam("query_id"))
+        .values(content_hash=bindparam("hash"))
+    )
+    last_id = 0
+    while True:
+        statement = select(
+            queries.c.id, queries.c.model, queries.c.query_text, _raw(queries.c.parameters), queries.c.content_hash
+        )
+        if missing_only:
+            statement = statement.where(queries.c.content_hash.is_(None))
+        rows = conn.execute(
+            statement.where(queries.c.id > last_id).order_by(queries.c.id).limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        changes = []
+        for row in rows:
+            new = content_hash(row.model or "", row.query_text or "", _stored_json(row.parameters))
+            if new != row.content_hash:
+                changes.append({"query_id": row.id, "hash": new})
+        if changes:
+            conn.execute(backfill, changes)
+        last_id = rows[-1].id
+
+def add_queries_token_counts(conn: Connection) -> None:
+    """Adds the prompt_tokens and completion_tokens columns and backfills them for existing rows."""
+    columns = _column_names(conn, models.Query.__tablename__)
+    for column in ("prompt_tokens", "completion_tokens"):
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE queries ADD COLUMN {column} INTEGER"))
+
+    queries = models.Query.__table__
+    backfill = (
+        update(queries)
+        .where(queries.c.id == bindparam("query_id"))
+        .values(prompt_tokens=bindparam("prompt"), completion_tokens=bindparam("completion"))
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(queries.c.id, queries.c.model, queries.c.query_text, _raw(queries.c.response))
+            .where(queries.c.prompt_tokens.is_(None), queries.c.id > last_id)
+            .order_by(queries.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            backfill,
+            [
+                {
+                    "query_id": row.id,
+                    "prompt": count_tokens(row.query_text or "", row.model or "", memoise=False),
+                    "completion": count_tokens(_stored_text(row.response) or "", row.model or "", memoise=False),
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+def convert_queries_to_compressed_columns(conn: Connection) -> None:
+    """
+    Converts the response and parameters columns to binary, so they can hold
+    compressed values. Existing values are kept as plain UTF-8; compress them
+    with `python -m core.database.compression backfill`. SQLite columns accept
+    bytes as they are.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    types = {column["name"]: column["type"] for column in inspect(conn).get_columns(models.Query.__tablename__)}
+    if not isinstance(types["response"], LargeBinary):
+        conn.execute(text("ALTER TABLE queries ALTER COLUMN response TYPE BYTEA USING convert_to(response, 'UTF8')"))
+    if not isinstance(types["parameters"], LargeBinary):
+        conn.execute(
+            text("ALTER TABLE queries ALTER COLUMN parameters TYPE BYTEA USING convert_to(parameters::text, 'UTF8')")
+        )
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_create_base_tables", create_base_tables),
+    ("0002_queries_user_timestamp_index", add_queries_user_timestamp_index),
+    ("0003_queries_content_hash", add_queries_content_hash),
+    ("0004_queries_token_counts", add_queries_token_counts),
+    ("0005_queries_compressed_columns", convert_queries_to_compressed_columns),
+    ("0006_queries_content_hash_request_parameters", rehash_queries_content_hash),
+]
+
+def applied_versions(engine: Engine) -> List[str]:
+    """Returns the versions already recorded in `schema_migrations`."""
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return list(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def upgrade(engine: Engine) -> List[str]:
+    """
+    Applies every pending migration, each in its own transaction.
+
+    Returns the versions that were applied.
+    """
+    done = set(applied_versions(engine))
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version in done:
+            continue
+        logger.info("Applying migration %s", version)
+        with engine.begin() as conn:
+            migration(conn)
+            conn.execute(schema_migrations.insert().values(version=version, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="List migrations without applying them")
+    args = parser.parse_args()
+
+    from core.database.database import get_engine
+
+    engine = get_engine()
+
+    if args.status:
+        done = set(applied_versions(engine))
+        for version, _ in MIGRATIONS:
+            print(f"{'applied' if version in done else 'pending'}  {version}")
+        return
+    for version in upgrade(engine):
+        print(f"applied  {version}")
+
+if __name__ == "__main__":
+    main()
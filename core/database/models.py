@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql.sqltypes import DateTime
 from datetime import datetime
 
+from core.database.compression import CompressedJSON, CompressedText
+
 Base = declarative_base()
 
 class User(Base):
@@ -18,8 +20,14 @@ class Query(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     query_text = Column(String)
     model = Column(String)
-    parameters = Column(JSON)
-    response = Column(String)
+    parameters = Column(CompressedJSON)  # compressed per STORAGE_COMPRESSION
+    response = Column(CompressedText)  # compressed per STORAGE_COMPRESSION
     timestamp = Column(DateTime, default=datetime.utcnow)
+    content_hash = Column(String(64), index=True)  # core.services.cache.content_hash of (model, query_text, parameters)
+    prompt_tokens = Column(Integer)  # count_tokens of query_text for the model
+    completion_tokens = Column(Integer)  # count_tokens of response for the model
+
+    user = relationship("User", backref="queries")
 
-    user = relationship("User", backref="queries")
\ No newline at end of file
+# Serves per-user history newest first, including keyset pagination on (timestamp, id):
+Index("ix_queries_user_id_timestamp", Query.user_id, Query.timestamp.desc(), Query.id.desc())
\ No newline at end of file
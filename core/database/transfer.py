@@ -0,0 +1,328 @@
+"""
+Bulk export and import of query history as NDJSON or Parquet.
+
+Exports select plain columns rather than ORM objects and fetch them with
+`yield_per`, through a server-side cursor where the driver supports one, so
+memory use is bounded by one batch however many rows are exported. Each
+batch becomes one NDJSON chunk or one Parquet row group.
+
+Imports insert in batches with one executemany per batch, or with COPY on
+PostgreSQL (psycopg2), one transaction per batch. Rows keep their token
+counts and content hash when the input has them.
+
+Parquet needs the optional `pyarrow` package.
+
+Usage:
+    python -m core.database.transfer export history.ndjson [--user-id 42]
+    python -m core.database.transfer export history.parquet --format parquet
+    python -m core.database.transfer import history.ndjson [--user-id 42] [--keep-ids]
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, IO, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from core.database import models
+from core.database.database import query_row
+
+try:
+    import pyarrow  # 17.0.0: Columnar Parquet export/import of query history (optional)
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = (
+    "id",
+    "user_id",
+    "query_text",
+    "model",
+    "parameters",
+    "response",
+    "timestamp",
+    "content_hash",
+    "prompt_tokens",
+    "completion_tokens",
+)
+FORMATS = ("ndjson", "parquet")
+
+def export_statement(user_id: Optional[int] = None, batch_size: int = 1000) -> Select:
+    """
+    Selects the exported columns, oldest first, streamed `batch_size` rows at a time.
+    """
+    queries = models.Query.__table__
+    statement = select(*(queries.c[name] for name in EXPORT_COLUMNS)).order_by(queries.c.id)
+    if user_id is not None:
+        statement = statement.where(queries.c.user_id == user_id)
+    return statement.execution_options(yield_per=batch_size)
+
+def _record(row: Any) -> Dict[str, Any]:
+    record = row._asdict()
+    if record["timestamp"] is not None:
+        record["timestamp"] = record["timestamp"].isoformat()
+    return record
+
+def iter_export_batches(db: Session, user_id: Optional[int] = None, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """Yields the exported rows as lists of at most `batch_size` JSON-ready dicts."""
+    for partition in db.execute(export_statement(user_id, batch_size)).partitions():
+        yield [_record(row) for row in partition]
+
+async def aiter_export_batches(
+    db: AsyncSession, user_id: Optional[int] = None, batch_size: int = 1000
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Async variant of `iter_export_batches`."""
+    result = await db.stream(export_statement(user_id, batch_size))
+    async for partition in result.partitions():
+        yield [_record(row) for row in partition]
+
+_encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
+def ndjson_chunk(batch: List[Dict[str, Any]]) -> bytes:
+    """Encodes a batch as newline-delimited JSON."""
+    return "".join([_encode_json(record) + "\n" for record in batch]).encode("utf-8")
+
+def _require_pyarrow() -> None:
+    if pyarrow is None:
+        raise RuntimeError("Parquet export and import require the pyarrow package.")
+
+def parquet_schema() -> Any:
+    """Arrow schema of exported rows; parameters are kept as JSON text."""
+    _require_pyarrow()
+    return pyarrow.schema(
+        [
+            ("id", pyarrow.int64()),
+            ("user_id", pyarrow.int64()),
+            ("query_text", pyarrow.string()),
+            ("model", pyarrow.string()),
+            ("parameters", pyarrow.string()),
+            ("response", pyarrow.string()),
+            ("timestamp", pyarrow.timestamp("us")),
+            ("content_hash", pyarrow.string()),
+            ("prompt_tokens", pyarrow.int64()),
+            ("completion_tokens", pyarrow.int64()),
+        ]
+    )
+
+def _parquet_table(batch: List[Dict[str, Any]]) -> Any:
+    columns = {name: [record[name] for record in batch] for name in EXPORT_COLUMNS}
+    columns["parameters"] = [None if value is None else json.dumps(value) for value in columns["parameters"]]
+    columns["timestamp"] = [None if value is None else datetime.fromisoformat(value) for value in columns["timestamp"]]
+    return pyarrow.Table.from_pydict(columns, schema=parquet_schema())
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back out chunk by chunk."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+class ParquetEncoder:
+    """
+    Encodes batches as a Parquet file, one row group per batch, returning
+    the bytes produced so far after each batch so they can be streamed.
+    """
+
+    def __init__(self, compression: str = "zstd"):
+        _require_pyarrow()
+        self._sink = _ChunkSink()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, parquet_schema(), compression=compression)
+
+    def encode(self, batch: List[Dict[str, Any]]) -> bytes:
+        self._writer.write_table(_parquet_table(batch))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Writes the file footer and returns the remaining bytes."""
+        self._writer.close()
+        return self._sink.drain()
+
+def iter_encoded(batches: Iterable[List[Dict[str, Any]]], format: str = "ndjson") -> Iterator[bytes]:
+    """Encodes exported batches as a stream of NDJSON or Parquet bytes."""
+    if format == "ndjson":
+        for batch in batches:
+            yield ndjson_chunk(batch)
+        return
+    encoder = ParquetEncoder()
+    for batch in batches:
+        yield encoder.encode(batch)
+    yield encoder.close()
+
+def export(db: Session, output: IO[bytes], format: str = "ndjson", user_id: Optional[int] = None, batch_size: int = 1000) -> int:
+    """Writes the selected history to `output`; returns the number of rows."""
+    rows = 0
+
+    def counted() -> Iterator[List[Dict[str, Any]]]:
+        nonlocal rows
+        for batch in iter_export_batches(db, user_id, batch_size):
+            rows += len(batch)
+            yield batch
+
+    for chunk in iter_encoded(counted(), format):
+        output.write(chunk)
+    return rows
+
+def read_ndjson(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Parses NDJSON records, skipping blank lines."""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+def read_parquet(path: str, batch_size: int = 5000) -> Iterator[Dict[str, Any]]:
+    """Reads exported Parquet records one batch at a time."""
+    _require_pyarrow()
+    for record_batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+        for record in record_batch.to_pylist():
+            if record.get("parameters") is not None:
+                record["parameters"] = json.loads(record["parameters"])
+            yield record
+
+def import_row(record: Dict[str, Any], user_id: Optional[int] = None, keep_ids: bool = False) -> Dict[str, Any]:
+    """
+    Builds the column values of an imported row, filling in what the record
+    lacks the way new rows are built.
+    """
+    row = query_row(
+        user_id if user_id is not None else record["user_id"],
+        record.get("query_text") or "",
+        record.get("model") or "",
+        record.get("parameters"),
+        record.get("response"),
+        record.get("content_hash"),
+        record.get("prompt_tokens"),
+        record.get("completion_tokens"),
+    )
+    timestamp = record.get("timestamp")
+    if timestamp is not None:
+        row["timestamp"] = datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp
+    if keep_ids and record.get("id") is not None:
+        row["id"] = record["id"]
+    return row
+
+def _copy_batch(connection: Any, rows: List[Dict[str, Any]]) -> None:
+    """Loads a batch with PostgreSQL COPY, encoding values as the column types do."""
+    table = models.Query.__table__
+    names = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        values = []
+        for name in names:
+            value = row[name]
+            if value is None:
+                value = ""
+            elif name in ("response", "parameters"):
+                value = "\\x" + table.c[name].type.process_bind_param(value, connection.dialect).hex()
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        writer.writerow(values)
+    buffer.seek(0)
+    raw = connection.connection.dbapi_connection
+    with raw.cursor() as cursor:
+        cursor.copy_expert(f"COPY queries ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def import_rows(
+    engine: Engine,
+    records: Iterable[Dict[str, Any]],
+    user_id: Optional[int] = None,
+    keep_ids: bool = False,
+    batch_size: int = 5000,
+) -> int:
+    """
+    Inserts `records` in batches of `batch_size`, one transaction per batch.
+    Returns the number of rows imported.
+    """
+    use_copy = engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+    imported = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        nonlocal imported
+        with engine.begin() as conn:
+            if use_copy:
+                _copy_batch(conn, batch)
+            else:
+                conn.execute(insert(models.Query), batch)
+        imported += len(batch)
+        batch.clear()
+
+    for record in records:
+        batch.append(import_row(record, user_id, keep_ids))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if keep_ids and engine.dialect.name == "postgresql":
+        # Explicit IDs do not advance the sequence; move it past them.
+        with engine.begin() as conn:
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('queries', 'id'), (SELECT MAX(id) FROM queries))"))
+    return imported
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Stream query history to a file ('-' for stdout)")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    export_parser.add_argument("--user-id", type=int, default=None)
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+    import_parser = commands.add_parser("import", help="Bulk load an exported file ('-' for stdin, NDJSON only)")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    import_parser.add_argument("--user-id", type=int, default=None, help="assign every row to this user")
+    import_parser.add_argument("--keep-ids", action="store_true", help="keep the exported row IDs")
+    import_parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    from core.database.database import SessionLocal, get_engine
+
+    started = time.perf_counter()
+    if args.command == "export":
+        db = SessionLocal()
+        try:
+            if args.path == "-":
+                rows = export(db, sys.stdout.buffer, args.format, args.user_id, args.batch_size)
+            else:
+                with open(args.path, "wb") as output:
+                    rows = export(db, output, args.format, args.user_id, args.batch_size)
+        finally:
+            db.close()
+    elif args.format == "parquet":
+        rows = import_rows(get_engine(), read_parquet(args.path), args.user_id, args.keep_ids, args.batch_size)
+    elif args.path == "-":
+        rows = import_rows(get_engine(), read_ndjson(sys.stdin.buffer), args.user_id, args.keep_ids, args.batch_size)
+    else:
+        with open(args.path, "rb") as lines:
+            rows = import_rows(get_engine(), read_ndjson(lines), args.user_id, args.keep_ids, args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"{args.command}ed {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import exc, insert
+from sqlalchemy.orm import Session
+
+from core.database import models
+from core.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindQueue:
+    """
+    Buffers `Query` rows in memory and writes them with bulk inserts.
+
+    A background thread flushes the buffer once `batch_size` rows are waiting
+    or `flush_interval` seconds have passed since the last flush, inserting
+    each batch with a single executemany in one transaction. Rows leave the
+    buffer only after their batch commits. A batch that fails because the
+    database is unavailable is retried with backoff, capped at
+    `max_retry_delay`, until it commits. One the database rejects (an
+    integrity or data error) is written row by row instead, and only the
+    rows it rejects are logged and kept in `dead_letters`.
+
+    The queue is bounded: when it is full, producers block for up to
+    `put_timeout` seconds and then write their row synchronously, so a slow
+    or unavailable database slows callers down or fails their writes instead
+    of growing memory without limit.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        max_queue_size: int = 10000,
+        put_timeout: float = 1.0,
+        max_retry_delay: float = 5.0,
+        max_dead_letters: int = 1000,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retry_delay = max_retry_delay
+        self.dead_letters: "deque[Dict[str, Any]]" = deque(maxlen=max_dead_letters)
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue_size)
+        self._flush_requested = threading.Event()
+        self._stopping = threading.Event()
+        self._idle = threading.Condition()
+        self._unflushed = 0
+        self.rows_written = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+        self.dead_lettered = 0
+        self.sync_fallbacks = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        return self._unflushed
+
+    def enqueue(self, row: Dict[str, Any]) -> None:
+        """
+        Queues a row for insertion, blocking briefly if the queue is full.
+        """
+        if self._stopping.is_set():
+            self._write_now(row)
+            return
+        with self._idle:
+            self._unflushed += 1
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            with self._idle:
+                self._unflushed -= 1
+            self._write_now(row)
+
+    async def aenqueue(self, row: Dict[str, Any]) -> None:
+        """
+        Async variant of `enqueue`; only waits off the event loop when the queue is full.
+        """
+        if not self._stopping.is_set():
+            with self._idle:
+                self._unflushed += 1
+            try:
+                self._queue.put_nowait(row)
+                return
+            except queue.Full:
+                with self._idle:
+                    self._unflushed -= 1
+        await asyncio.to_thread(self.enqueue, row)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Writes every queued row now and waits until they are committed.
+
+        Returns False if rows were still pending when `timeout` expired.
+        """
+        self._flush_requested.set()
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unflushed == 0, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops accepting rows, flushes everything queued and stops the writer thread.
+        """
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._flush_requested.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Write-behind queue closed with %s rows still pending.", self.depth)
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.05)))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            due = len(batch) >= self.batch_size or time.monotonic() >= deadline or self._flush_requested.is_set()
+            if batch and due:
+                self._write_batch(batch)
+                batch = []
+            if due:
+                deadline = time.monotonic() + self.flush_interval
+                if self._queue.empty():
+                    self._flush_requested.clear()
+                    if self._stopping.is_set():
+                        return
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        error = self._insert_until_written(batch)
+        if error is None:
+            self.rows_written += len(batch)
+            self.batches_written += 1
+        else:
+            logger.error("Write-behind flush of %s rows was rejected, writing rows one by one: %s", len(batch), error)
+            self._write_rows(batch)
+        with self._idle:
+            self._unflushed -= len(batch)
+            self._idle.notify_all()
+
+    def _write_rows(self, batch: List[Dict[str, Any]]) -> None:
+        for row in batch:
+            error = self._insert_until_written([row])
+            if error is None:
+                self.rows_written += 1
+                continue
+            self.dead_lettered += 1
+            self.dead_letters.append(row)
+            logger.error(
+                "Write-behind dropped query row of user %s (model %s): %s", row.get("user_id"), row.get("model"), error
+            )
+
+    def _insert_until_written(self, rows: List[Dict[str, Any]]) -> Optional[Exception]:
+        """
+        Inserts `rows`, retrying other failures with capped backoff until they
+        commit; returns the error if the database rejected the rows themselves.
+        """
+        delay = 0.05
+        while True:
+            error = self._insert(rows)
+            if error is None or isinstance(error, (exc.IntegrityError, exc.DataError)):
+                return error
+            self.failed_batches += 1
+            logger.error("Write-behind flush of %s rows failed, retrying in %.2fs: %s", len(rows), delay, error)
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> Optional[Exception]:
+        """Inserts `rows` in one transaction; returns the error if it failed."""
+        db = self.session_factory()
+        try:
+            with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="write_behind_flush"):
+                db.execute(insert(models.Query), rows)
+                db.commit()
+            return None
+        except Exception as e:
+            db.rollback()
+            return e
+        finally:
+            db.close()
+
+    def _write_now(self, row: Dict[str, Any]) -> None:
+        self.sync_fallbacks += 1
+        db = self.session_factory()
+        try:
+            db.execute(insert(models.Query), [row])
+            db.commit()
+        finally:
+            db.close()
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+if TYPE_CHECKING:
+    from core.services.openai_service import OpenAIService
+
+logger = logging.getLogger(__name__)
+
+BatchKey = Tuple[str, str]
+
+class BatchDispatcher:
+    """
+    Micro-batching scheduler for completion requests.
+
+    Prompts submitted with the same model and parameters are queued together
+    and sent as one multi-prompt completion request once `max_batch_size`
+    prompts are waiting or `max_wait_ms` has passed since the first one
+    arrived, whichever comes first. Each caller receives the completion for
+    its own prompt. At most `max_inflight_batches` requests run upstream at
+    a time; further full batches wait for a free slot.
+    """
+
+    def __init__(
+        self,
+        service: "OpenAIService",
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10,
+        max_inflight_batches: int = 8,
+    ):
+        self.service = service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_inflight_batches = max_inflight_batches
+        # Created on first use, inside the loop that sends the batches.
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._inflight_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[BatchKey, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[BatchKey, asyncio.TimerHandle] = {}
+        self._tasks: "set[asyncio.Task]" = set()
+        self.batches_sent = 0
+        self.prompts_sent = 0
+
+    @classmethod
+    def from_settings(cls, service: "OpenAIService") -> "BatchDispatcher":
+        """
+        Builds a dispatcher sized by the BATCH_* settings.
+        """
+        return cls(
+            service,
+            max_batch_size=settings.BATCH_MAX_SIZE,
+            max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+            max_inflight_batches=settings.BATCH_MAX_INFLIGHT,
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    async def submit(self, query: str, model: str, params: Dict[str, Any]) -> str:
+        """
+        Queues a prompt and waits for its completion from a batched request.
+        """
+        key = (model, json.dumps(params, sort_keys=True))
+        future = asyncio.get_running_loop().create_future()
+        items = self._pending.setdefault(key, [])
+        items.append((query, future))
+        if len(items) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.max_wait, self._flush, key)
+        return await future
+
+    async def drain(self) -> None:
+        """
+        Sends every queued prompt immediately and waits for all batches to finish.
+        """
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self, key: BatchKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, None)
+        if not items:
+            return
+        task = asyncio.get_running_loop().create_task(self._send(key, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _inflight_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._inflight is None or self._inflight_loop is not loop:
+            self._inflight = asyncio.Semaphore(self.max_inflight_batches)
+            self._inflight_loop = loop
+        return self._inflight
+
+    async def _send(self, key: BatchKey, items: List[Tuple[str, asyncio.Future]]) -> None:
+        model, params = key[0], json.loads(key[1])
+        prompts = [query for query, _ in items]
+        async with self._inflight_slots():
+            try:
+                texts = await self.service.aprocess_batch(prompts, model=model, parameters=params)
+            except Exception as e:
+                logger.warning("Batched completion of %s prompts failed: %s", len(prompts), e)
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        self.batches_sent += 1
+        self.prompts_sent += len(prompts)
+        for (_, future), text in zip(items, texts):
+            if not future.done():
+                future.set_result(text)
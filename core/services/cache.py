@@ -0,0 +1,565 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis  # 5.1.1: Redis library for caching frequently accessed data
+import redis.asyncio as aioredis  # 5.1.1: asyncio Redis client
+
+from config.settings import settings
+from core.utils import metrics
+from core.utils.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(model: str, prompt: str, parameters: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Builds the canonical cache key for a completion request.
+
+    The prompt is whitespace-normalized and parameters are sorted with unset
+    (None) values dropped, so requests that would produce the same completion
+    map onto the same key.
+    """
+    canonical = json.dumps(
+        {
+            "model": model,
+            "prompt": " ".join(prompt.split()),
+            "parameters": {k: v for k, v in sorted((parameters or {}).items()) if v is not None},
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def completion_params(parameters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Maps user supplied parameters onto the completion request fields,
+    filling in the defaults the service sends upstream.
+    """
+    parameters = parameters or {}
+    return {
+        "temperature": parameters.get("temperature", 0.7),
+        "max_tokens": parameters.get("max_tokens", 256),
+        "top_p": parameters.get("top_p"),
+        "frequency_penalty": parameters.get("frequency_penalty"),
+        "presence_penalty": parameters.get("presence_penalty"),
+    }
+
+def content_hash(model: str, prompt: str, parameters: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Returns the cache key the service uses for a request with these user
+    supplied parameters, which is what `queries.content_hash` stores.
+    """
+    return make_cache_key(model, prompt, completion_params(parameters))
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with per-entry TTL and a byte budget.
+
+    Entries are evicted least-recently-used first whenever either the entry
+    count or the total size of the stored strings exceeds its limit.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, ttl: Optional[float] = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, Optional[float], int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached value for `key`, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """
+        Stores `value` under `key`, evicting older entries to stay within limits.
+        """
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+class ResponseCache:
+    """
+    Two-tier completion cache: an in-process LRU in front of Redis.
+
+    Lookups check the local tier first and fall back to Redis, promoting Redis
+    hits into the local tier. Redis failures are logged and treated as misses
+    so an unavailable cache never fails a query. The async methods use
+    `async_redis_client` when given, and otherwise run the sync client's
+    round-trips off the event loop.
+    """
+
+    def __init__(
+        self,
+        local: Optional[LRUCache] = None,
+        redis_client: Optional[redis.Redis] = None,
+        ttl: Optional[int] = 3600,
+        prefix: str = "completion:",
+        async_redis_client: Optional[aioredis.Redis] = None,
+    ):
+        self.local = local if local is not None else LRUCache(ttl=ttl)
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.redis_hits = 0
+        self.redis_errors = 0
+
+    @classmethod
+    def from_settings(cls) -> "ResponseCache":
+        """
+        Builds a cache sized by the RESPONSE_CACHE_* settings.
+        """
+        local = LRUCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+            ttl=settings.RESPONSE_CACHE_TTL,
+        )
+        if not settings.REDIS_HOST:
+            return cls(local=local, ttl=settings.RESPONSE_CACHE_TTL)
+        return cls(
+            local=local,
+            redis_client=get_redis(),
+            ttl=settings.RESPONSE_CACHE_TTL,
+            async_redis_client=get_async_redis(),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached completion for `key` from the fastest tier holding it.
+        """
+        value = self.local.get(key)
+        if value is None and self.redis_client is not None:
+            value = self._redis_get(key)
+            if value is not None:
+                self.local.set(key, value)
+        metrics.count_cache_lookup("response", value is not None)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Stores a completion in both tiers.
+        """
+        self.local.set(key, value)
+        if self.redis_client is not None:
+            self._redis_set(key, value)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """
+        Async variant of `get`; the Redis round-trip runs off the event loop.
+        """
+        value = self.local.get(key)
+        if value is None:
+            if self.async_redis_client is not None:
+                value = await self._aredis_get(key)
+            elif self.redis_client is not None:
+                value = await asyncio.to_thread(self._redis_get, key)
+            if value is not None:
+                self.local.set(key, value)
+        metrics.count_cache_lookup("response", value is not None)
+        return value
+
+    async def aset(self, key: str, value: str) -> None:
+        """
+        Async variant of `set`; the Redis round-trip runs off the event loop.
+        """
+        self.local.set(key, value)
+        if self.async_redis_client is not None:
+            await self._aredis_set(key, value)
+        elif self.redis_client is not None:
+            await asyncio.to_thread(self._redis_set, key, value)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns hit, miss and eviction counters across both tiers.
+        """
+        return {
+            "local_hits": self.local.hits,
+            "redis_hits": self.redis_hits,
+            "hits": self.local.hits + self.redis_hits,
+            "misses": self.local.misses - self.redis_hits,
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "redis_errors": self.redis_errors,
+            "entries": len(self.local),
+            "bytes": self.local.size_bytes,
+        }
+
+    def _redis_get(self, key: str) -> Optional[str]:
+        try:
+            cached = self.redis_client.get(self.prefix + key)
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Response cache read failed: %s", e)
+            return None
+        return self._record_redis_hit(cached)
+
+    async def _aredis_get(self, key: str) -> Optional[str]:
+        try:
+            cached = await self.async_redis_client.get(self.prefix + key)
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Response cache read failed: %s", e)
+            return None
+        return self._record_redis_hit(cached)
+
+    def _record_redis_hit(self, cached: Optional[bytes]) -> Optional[str]:
+        if cached is None:
+            return None
+        self.redis_hits += 1
+        return cached.decode("utf-8") if isinstance(cached, bytes) else cached
+
+    def _redis_set(self, key: str, value: str) -> None:
+        try:
+            self.redis_client.set(self.prefix + key, value, ex=self.ttl or None)
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Response cache write failed: %s", e)
+
+    async def _aredis_set(self, key: str, value: str) -> None:
+        try:
+            await self.async_redis_client.set(self.prefix + key, value, ex=self.ttl or None)
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Response cache write failed: %s", e)
+
+# Value encoding in the Redis tier of `ReadThroughCache`: a one-byte tag,
+# then the UTF-8 response, its zlib compression, or nothing for "not found".
+RAW = b"r"
+ZLIB = b"z"
+NOT_FOUND = b"-"
+
+def encode_cached(value: Optional[str], compress_min_bytes: int = 1024) -> bytes:
+    """
+    Encodes a cached response for Redis, zlib-compressing it when it is at
+    least `compress_min_bytes` long and compression actually shrinks it.
+    None encodes a cached "not found".
+    """
+    if value is None:
+        return NOT_FOUND
+    data = value.encode("utf-8")
+    if len(data) >= compress_min_bytes:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return ZLIB + compressed
+    return RAW + data
+
+def decode_cached(data: bytes) -> Tuple[bool, Optional[str]]:
+    """
+    Decodes a value written by `encode_cached` into (found, response);
+    found is False for a cached "not found".
+
+    Raises:
+        ValueError: If `data` was not written by `encode_cached`.
+    """
+    tag, body = data[:1], data[1:]
+    if tag == RAW:
+        return True, body.decode("utf-8")
+    if tag == ZLIB:
+        return True, zlib.decompress(body).decode("utf-8")
+    if tag == NOT_FOUND:
+        return False, None
+    raise ValueError(f"Unknown cached value tag {tag!r}")
+
+class ReadThroughCache:
+    """
+    Read-through cache of stored responses by query ID: an in-process LRU,
+    then Redis, then the loader, normally a database read.
+
+    Loads populate both tiers. Loads that find nothing are cached as well,
+    for `negative_ttl` seconds only, so repeated lookups of unknown or still
+    pending IDs do not reach the database either; writers call `invalidate`
+    so a new or completed row is visible at once. Stored responses do not
+    change once written, so positive entries are never stale. Responses of
+    `compress_min_bytes` or more are zlib-compressed in Redis. Redis failures
+    are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        local: Optional[LRUCache] = None,
+        redis_client: Optional[redis.Redis] = None,
+        ttl: Optional[int] = 3600,
+        negative_ttl: int = 5,
+        prefix: str = "response:",
+        compress_min_bytes: int = 1024,
+        async_redis_client: Optional[aioredis.Redis] = None,
+    ):
+        self.local = local if local is not None else LRUCache(ttl=ttl)
+        self.negative = LRUCache(max_entries=self.local.max_entries, ttl=negative_ttl)
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+        self.compress_min_bytes = compress_min_bytes
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.loads = 0
+
+    @classmethod
+    def from_settings(cls) -> "ReadThroughCache":
+        """
+        Builds a cache sized by the QUERY_CACHE_* settings.
+        """
+        local = LRUCache(
+            max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+            max_bytes=settings.QUERY_CACHE_MAX_BYTES,
+            ttl=settings.QUERY_CACHE_TTL,
+        )
+        options = dict(
+            local=local,
+            ttl=settings.QUERY_CACHE_TTL,
+            negative_ttl=settings.QUERY_CACHE_NEGATIVE_TTL,
+            compress_min_bytes=settings.QUERY_CACHE_COMPRESS_MIN_BYTES,
+        )
+        if not settings.REDIS_HOST:
+            return cls(**options)
+        return cls(redis_client=get_redis(), async_redis_client=get_async_redis(), **options)
+
+    def peek(self, key: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (cached, response) from the cache tiers alone, without loading.
+        """
+        value = self.local.get(key)
+        if value is not None:
+            return True, value
+        if self.negative.get(key) is not None:
+            return True, None
+        if self.redis_client is None:
+            return False, None
+        return self._from_redis(key, self._redis_get(key))
+
+    def get(self, key: str, loader: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        Returns the response for `key`, calling `loader` and caching its result on a miss.
+        """
+        cached, value = self.peek(key)
+        metrics.count_cache_lookup("query_response", cached)
+        if cached:
+            return value
+        self.loads += 1
+        value = loader()
+        self._store_local(key, value)
+        if self.redis_client is not None:
+            self._redis_set(key, value)
+        return value
+
+    async def aget(self, key: str, loader: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Async variant of `get`; the Redis round-trips run off the event loop.
+        """
+        cached, value = await self._apeek(key)
+        metrics.count_cache_lookup("query_response", cached)
+        if cached:
+            return value
+        self.loads += 1
+        value = await loader()
+        self._store_local(key, value)
+        if self.async_redis_client is not None:
+            await self._aredis_set(key, value)
+        elif self.redis_client is not None:
+            await asyncio.to_thread(self._redis_set, key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Stores a known response in both tiers.
+        """
+        self._store_local(key, value)
+        if self.redis_client is not None:
+            self._redis_set(key, value)
+
+    def invalidate(self, *keys: str) -> None:
+        """
+        Drops `keys` from both tiers, so the next lookups read the database.
+        """
+        self._drop_local(keys)
+        if self.redis_client is not None and keys:
+            try:
+                self.redis_client.delete(*(self.prefix + key for key in keys))
+            except redis.RedisError as e:
+                self.redis_errors += 1
+                logger.warning("Query response cache invalidation failed: %s", e)
+
+    async def ainvalidate(self, *keys: str) -> None:
+        """
+        Async variant of `invalidate`.
+        """
+        if self.async_redis_client is None:
+            await asyncio.to_thread(self.invalidate, *keys)
+            return
+        self._drop_local(keys)
+        if keys:
+            try:
+                await self.async_redis_client.delete(*(self.prefix + key for key in keys))
+            except redis.RedisError as e:
+                self.redis_errors += 1
+                logger.warning("Query response cache invalidation failed: %s", e)
+
+    def clear(self) -> None:
+        """Empties the local tier; Redis entries expire on their own."""
+        self.local.clear()
+        self.negative.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns hit and load counters across both tiers.
+        """
+        return {
+            "local_hits": self.local.hits,
+            "negative_hits": self.negative.hits,
+            "redis_hits": self.redis_hits,
+            "loads": self.loads,
+            "redis_errors": self.redis_errors,
+            "entries": len(self.local),
+            "bytes": self.local.size_bytes,
+        }
+
+    async def _apeek(self, key: str) -> Tuple[bool, Optional[str]]:
+        value = self.local.get(key)
+        if value is not None:
+            return True, value
+        if self.negative.get(key) is not None:
+            return True, None
+        if self.async_redis_client is not None:
+            return self._from_redis(key, await self._aredis_get(key))
+        if self.redis_client is not None:
+            return self._from_redis(key, await asyncio.to_thread(self._redis_get, key))
+        return False, None
+
+    def _from_redis(self, key: str, data: Optional[bytes]) -> Tuple[bool, Optional[str]]:
+        if data is None:
+            return False, None
+        try:
+            found, value = decode_cached(data)
+        except (ValueError, zlib.error) as e:
+            logger.warning("Discarding undecodable cached response for %s: %s", key, e)
+            return False, None
+        self.redis_hits += 1
+        self._store_local(key, value if found else None)
+        return True, value
+
+    def _store_local(self, key: str, value: Optional[str]) -> None:
+        if value is None:
+            self.local.delete(key)
+            if self.negative_ttl > 0:
+                self.negative.set(key, "")
+        else:
+            self.negative.delete(key)
+            self.local.set(key, value)
+
+    def _drop_local(self, keys: Tuple[str, ...]) -> None:
+        for key in keys:
+            self.local.delete(key)
+            self.negative.delete(key)
+
+    def _ttl(self, value: Optional[str]) -> Optional[int]:
+        return self.negative_ttl if value is None else self.ttl or None
+
+    def _redis_get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.redis_client.get(self.prefix + key)
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Query response cache read failed: %s", e)
+            return None
+
+    async def _aredis_get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self.async_redis_client.get(self.prefix + key)
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Query response cache read failed: %s", e)
+            return None
+
+    def _redis_set(self, key: str, value: Optional[str]) -> None:
+        if value is None and self.negative_ttl <= 0:
+            return
+        try:
+            self.redis_client.set(self.prefix + key, encode_cached(value, self.compress_min_bytes), ex=self._ttl(value))
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Query response cache write failed: %s", e)
+
+    async def _aredis_set(self, key: str, value: Optional[str]) -> None:
+        if value is None and self.negative_ttl <= 0:
+            return
+        try:
+            await self.async_redis_client.set(
+                self.prefix + key, encode_cached(value, self.compress_min_bytes), ex=self._ttl(value)
+            )
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Query response cache write failed: %s", e)
+
+# Shared query response cache (created on first use):
+_query_cache: Optional[ReadThroughCache] = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache() -> ReadThroughCache:
+    """Returns the process-wide query response cache, creating it on first use."""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = ReadThroughCache.from_settings()
+    return _query_cache
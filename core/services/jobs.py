@@ -0,0 +1,620 @@
+"""
+Asynchronous query jobs: submit now, poll or receive a webhook later.
+
+Submitting a job reserves its `Query` row straight away, so the client gets
+the row's ID at once, and queues the job on a broker. A pool of background
+worker threads reserves jobs highest priority first, runs
+`OpenAIService.process_query`, writes the response to the row and to the
+Redis response cache, acknowledges the job and calls its webhook, if any.
+
+Reserved jobs are hidden from other workers for a visibility timeout. A
+worker that dies mid-job loses its lease when the timeout expires and the
+job is handed out again, so delivery is at least once. Failed attempts
+that are worth retrying are requeued with exponential backoff, up to
+JOB_MAX_ATTEMPTS. `SQLiteJobBroker` keeps jobs in a SQLite file shared by
+the processes of one host; `RedisJobBroker` shares them across hosts.
+"""
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+from urllib.parse import urlsplit
+
+import redis  # 5.1.1: Redis library for caching frequently accessed data
+import requests  # 2.32.3: Make HTTP requests to external APIs, including OpenAI
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from config.settings import settings
+from core.services.rate_limit import RateLimitExceeded
+from core.services.resilience import CircuitOpenError, is_retryable
+from core.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+MAX_PRIORITY = 9
+
+class Job(NamedTuple):
+    """A job as stored by a broker; `lease` identifies the current reservation."""
+
+    id: int
+    priority: int
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    lease: Optional[str] = None
+    error: Optional[str] = None
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    visible_at REAL NOT NULL,
+    lease TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_ready ON jobs (priority DESC, id) WHERE status IN ('queued', 'running');
+"""
+
+class SQLiteJobBroker:
+    """
+    Job broker backed by a SQLite file.
+
+    Every state change is a single statement, so workers in several threads
+    or processes on one host can share the file without further locking.
+    Finished jobs are kept for `result_ttl` seconds, then purged.
+    """
+
+    def __init__(self, path: str, result_ttl: float = 86400):
+        self.path = path
+        self.result_ttl = result_ttl
+        self._local = threading.local()
+        self._conn().executescript(SQLITE_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _job(row: Optional[sqlite3.Row]) -> Optional[Job]:
+        if row is None:
+            return None
+        return Job(
+            row["id"], row["priority"], json.loads(row["payload"]), row["status"], row["attempts"], row["lease"], row["error"]
+        )
+
+    def enqueue(self, job_id: int, payload: Dict[str, Any], priority: int = 0) -> None:
+        """Queues a job, visible to workers immediately."""
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, priority, payload, status, visible_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, priority, json.dumps(payload), QUEUED, now, now),
+        )
+
+    def reserve(self, visibility_timeout: float) -> Optional[Job]:
+        """
+        Leases the next visible job, highest priority and oldest first, hiding
+        it from other workers for `visibility_timeout` seconds.
+        """
+        now = time.time()
+        row = self._conn().execute(
+            """
+            UPDATE jobs SET status = ?, lease = ?, attempts = attempts + 1, visible_at = ?, updated_at = ?
+            WHERE id = (
+                SELECT id FROM jobs WHERE status IN ('queued', 'running') AND visible_at <= ?
+                ORDER BY priority DESC, id LIMIT 1
+            )
+            RETURNING *
+            """,
+            (RUNNING, uuid.uuid4().hex, now + visibility_timeout, now, now),
+        ).fetchone()
+        return self._job(row)
+
+    def complete(self, job: Job) -> bool:
+        """Marks a leased job as succeeded; False if its lease has expired and passed on."""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, lease = NULL, error = NULL, updated_at = ? WHERE id = ? AND lease = ?",
+            (SUCCEEDED, time.time(), job.id, job.lease),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job: Job, error: str, retry_delay: Optional[float] = None) -> bool:
+        """
+        Records a failed attempt: requeued after `retry_delay` seconds, or
+        failed for good when `retry_delay` is None. False if the lease was lost.
+        """
+        now = time.time()
+        status = FAILED if retry_delay is None else QUEUED
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, lease = NULL, error = ?, visible_at = ?, updated_at = ? WHERE id = ? AND lease = ?",
+            (status, error, now + (retry_delay or 0), now, job.id, job.lease),
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: int) -> Optional[Job]:
+        """Returns a job's current state, or None if unknown or purged."""
+        return self._job(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def purge(self) -> int:
+        """Deletes finished jobs older than `result_ttl`; returns how many."""
+        cursor = self._conn().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (SUCCEEDED, FAILED, time.time() - self.result_ttl),
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of jobs in each status."""
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)} | {row[0]: row[1] for row in rows}
+
+# Job hashes live at <prefix>job:<id>. KEYS[1] is the ready sorted set,
+# ordered by priority then submission, and KEYS[2] the delayed set of jobs
+# leased or waiting to retry, scored by when they become visible again.
+
+# ARGV: prefix, id, priority, payload. Priority 9 sorts first; a per-queue
+# sequence keeps submission order within a priority.
+ENQUEUE_SCRIPT = """
+local seq = redis.call("INCR", ARGV[1] .. "seq")
+local score = (9 - tonumber(ARGV[3])) * 1e12 + seq
+redis.call("HSET", ARGV[1] .. "job:" .. ARGV[2],
+    "priority", ARGV[3], "payload", ARGV[4], "status", "queued", "attempts", 0, "score", score)
+redis.call("ZADD", KEYS[1], score, ARGV[2])
+return 1
+"""
+
+# ARGV: prefix, lease, visibility timeout. Makes due delayed jobs ready,
+# then leases the first ready one. Returns {id, field, value, ...} or false.
+RESERVE_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local due = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", now, "LIMIT", 0, 100)
+for _, id in ipairs(due) do
+    redis.call("ZREM", KEYS[2], id)
+    local score = redis.call("HGET", ARGV[1] .. "job:" .. id, "score")
+    if score then
+        redis.call("ZADD", KEYS[1], score, id)
+    end
+end
+local popped = redis.call("ZPOPMIN", KEYS[1])
+if #popped == 0 then
+    return false
+end
+local id = popped[1]
+local key = ARGV[1] .. "job:" .. id
+redis.call("HSET", key, "status", "running", "lease", ARGV[2])
+redis.call("HINCRBY", key, "attempts", 1)
+redis.call("ZADD", KEYS[2], now + tonumber(ARGV[3]), id)
+local result = redis.call("HGETALL", key)
+table.insert(result, 1, id)
+return result
+"""
+
+# ARGV: prefix, id, lease, status, error, retry delay (-1 to finish), result TTL.
+FINISH_SCRIPT = """
+local key = ARGV[1] .. "job:" .. ARGV[2]
+if redis.call("HGET", key, "lease") ~= ARGV[3] then
+    return 0
+end
+redis.call("HDEL", key, "lease")
+redis.call("HSET", key, "status", ARGV[4], "error", ARGV[5])
+local delay = tonumber(ARGV[6])
+if delay >= 0 then
+    local time = redis.call("TIME")
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    redis.call("ZADD", KEYS[2], now + delay, ARGV[2])
+else
+    redis.call("ZREM", KEYS[2], ARGV[2])
+    redis.call("EXPIRE", key, ARGV[7])
+end
+return 1
+"""
+
+class RedisJobBroker:
+    """
+    Job broker backed by Redis, shared by every worker that uses the same
+    server and `prefix`. Each state change is one atomic script; finished
+    jobs expire after `result_ttl` seconds. Job keys are built inside the
+    scripts, so the queue must live on a single (non-cluster) Redis node.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, prefix: str = "jobs:", result_ttl: float = 86400):
+        self.redis = redis_client or get_redis()
+        self.prefix = prefix
+        self.result_ttl = result_ttl
+        self._keys = [f"{prefix}ready", f"{prefix}delayed"]
+        self._enqueue = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._reserve = self.redis.register_script(RESERVE_SCRIPT)
+        self._finish = self.redis.register_script(FINISH_SCRIPT)
+
+    @staticmethod
+    def _text(value: Union[bytes, str]) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _job(self, job_id: Any, fields: Dict[str, str]) -> Job:
+        return Job(
+            int(job_id),
+            int(fields["priority"]),
+            json.loads(fields["payload"]),
+            fields["status"],
+            int(fields.get("attempts", 0)),
+            fields.get("lease"),
+            fields.get("error") or None,
+        )
+
+    def enqueue(self, job_id: int, payload: Dict[str, Any], priority: int = 0) -> None:
+        """Queues a job, visible to workers immediately."""
+        self._enqueue(keys=self._keys[:1], args=[self.prefix, job_id, priority, json.dumps(payload)])
+
+    def reserve(self, visibility_timeout: float) -> Optional[Job]:
+        """
+        Leases the next visible job, highest priority and oldest first, hiding
+        it from other workers for `visibility_timeout` seconds.
+        """
+        result = self._reserve(keys=self._keys, args=[self.prefix, uuid.uuid4().hex, visibility_timeout])
+        if not result:
+            return None
+        values = [self._text(value) for value in result]
+        return self._job(values[0], dict(zip(values[1::2], values[2::2])))
+
+    def complete(self, job: Job) -> bool:
+        """Marks a leased job as succeeded; False if its lease has expired and passed on."""
+        args = [self.prefix, job.id, job.lease, SUCCEEDED, "", -1, int(self.result_ttl)]
+        return bool(self._finish(keys=self._keys, args=args))
+
+    def fail(self, job: Job, error: str, retry_delay: Optional[float] = None) -> bool:
+        """
+        Records a failed attempt: requeued after `retry_delay` seconds, or
+        failed for good when `retry_delay` is None. False if the lease was lost.
+        """
+        status, delay = (FAILED, -1) if retry_delay is None else (QUEUED, retry_delay)
+        return bool(self._finish(keys=self._keys, args=[self.prefix, job.id, job.lease, status, error, delay, int(self.result_ttl)]))
+
+    def get(self, job_id: int) -> Optional[Job]:
+        """Returns a job's current state, or None if unknown or expired."""
+        fields = self.redis.hgetall(f"{self.prefix}job:{job_id}")
+        if not fields:
+            return None
+        return self._job(job_id, {self._text(key): self._text(value) for key, value in fields.items()})
+
+    def purge(self) -> int:
+        """Finished jobs expire on their own; nothing to do."""
+        return 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of ready and leased-or-delayed jobs."""
+        ready, delayed = self.redis.zcard(self._keys[0]), self.redis.zcard(self._keys[1])
+        return {"ready": ready, "delayed": delayed}
+
+JobBroker = Union[SQLiteJobBroker, RedisJobBroker]
+
+def validate_webhook_url(url: str) -> None:
+    """
+    Checks that a webhook URL is http(s), that its host is on
+    WEBHOOK_ALLOWED_HOSTS when that is set, and, unless
+    WEBHOOK_ALLOW_PRIVATE_ADDRESSES is set, that every address the host
+    resolves to is public: loopback, private, link-local, reserved and
+    multicast addresses are refused, so callbacks cannot reach internal
+    services.
+
+    Raises:
+        ValueError: If the URL is not acceptable.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("Webhook URL must be an absolute http(s) URL.")
+    allowed = [host for host in settings.WEBHOOK_ALLOWED_HOSTS if host]
+    if allowed and parts.hostname not in allowed:
+        raise ValueError(f"Webhook host {parts.hostname} is not allowed.")
+    if not settings.WEBHOOK_ALLOW_PRIVATE_ADDRESSES:
+        public_address(parts.hostname, parts.port)
+
+def public_address(host: str, port: Optional[int] = None) -> str:
+    """
+    Resolves `host` and returns one of its addresses, provided every address
+    it resolves to is public.
+
+    Raises:
+        ValueError: If the host does not resolve or resolves to a non-public address.
+    """
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port or None, proto=socket.IPPROTO_TCP)]
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"Webhook host {host} does not resolve: {e}") from e
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"Webhook host {host} resolves to non-public address {ip}.")
+    return addresses[0]
+
+class _PublicAddressConnection:
+    """
+    Connects to an address checked by `public_address` at connect time, so a
+    host cannot resolve to a public address when validated and to an internal
+    one when connected to. TLS and the Host header still use the hostname.
+    """
+
+    def _new_conn(self) -> socket.socket:
+        if not settings.WEBHOOK_ALLOW_PRIVATE_ADDRESSES:
+            self._dns_host = public_address(self._dns_host, self.port)
+        return super()._new_conn()
+
+class _PublicHTTPConnection(_PublicAddressConnection, HTTPConnection):
+    pass
+
+class _PublicHTTPSConnection(_PublicAddressConnection, HTTPSConnection):
+    pass
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+class _PublicAddressAdapter(requests.adapters.HTTPAdapter):
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _PublicHTTPConnectionPool, "https": _PublicHTTPSConnectionPool}
+
+def webhook_session() -> requests.Session:
+    """
+    Returns a session that only connects to public addresses, unless
+    WEBHOOK_ALLOW_PRIVATE_ADDRESSES is set. Proxies from the environment are
+    ignored, as they would connect on the session's behalf.
+    """
+    session = requests.Session()
+    session.trust_env = False
+    adapter = _PublicAddressAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def send_webhook(url: str, body: Dict[str, Any], attempts: int = 3) -> bool:
+    """
+    POSTs `body` as JSON to `url`, retrying connection errors and 5xx
+    responses with backoff. With WEBHOOK_SECRET set, the body's HMAC-SHA256
+    is sent in the `X-Webhook-Signature` header as `sha256=<hex>`.
+
+    The URL is validated again before every attempt, as its host may resolve
+    elsewhere than at submit time, connections are only made to the addresses
+    checked as they are opened, and redirects are not followed.
+
+    Returns whether the receiver accepted the callback with a 2xx status.
+    """
+    data = json.dumps(body).encode()
+    headers = {"Content-Type": "application/json"}
+    if settings.WEBHOOK_SECRET:
+        signature = hmac.new(settings.WEBHOOK_SECRET.encode(), data, hashlib.sha256).hexdigest()
+        headers["X-Webhook-Signature"] = f"sha256={signature}"
+    with webhook_session() as session:
+        for attempt in range(1, attempts + 1):
+            try:
+                validate_webhook_url(url)
+                response = session.post(
+                    url, data=data, headers=headers, timeout=settings.WEBHOOK_TIMEOUT, allow_redirects=False
+                )
+                if response.status_code < 500:
+                    return 200 <= response.status_code < 300
+                logger.warning("Webhook %s answered %s (attempt %d)", url, response.status_code, attempt)
+            except ValueError as e:
+                logger.error("Webhook %s refused: %s", url, e)
+                return False
+            except requests.exceptions.RequestException as e:
+                logger.warning("Webhook %s failed (attempt %d): %s", url, attempt, e)
+            if attempt < attempts:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+    return False
+
+class JobWorkerPool:
+    """
+    Background threads that run queued jobs through `service.process_query`.
+    """
+
+    def __init__(
+        self,
+        broker: JobBroker,
+        service: Any,
+        workers: int = 4,
+        visibility_timeout: float = 300,
+        max_attempts: int = 3,
+        retry_delay: float = 5,
+        poll_interval: float = 0.5,
+        session_factory: Optional[Callable[[], Any]] = None,
+        cache: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.broker = broker
+        self.service = service
+        self.workers = workers
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.session_factory = session_factory
+        self.cache = cache
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last_purge = 0.0
+        self.counters = {"succeeded": 0, "failed": 0, "retried": 0, "lost_leases": 0}
+
+    @classmethod
+    def from_settings(cls, broker: JobBroker, service: Any) -> "JobWorkerPool":
+        """
+        Builds a pool configured by the JOB_* settings, storing results with
+        the shared database session factory and Redis response cache.
+        """
+        from core.database.database import SessionLocal
+        from core.utils.utils import cache_response
+
+        return cls(
+            broker,
+            service,
+            workers=settings.JOB_WORKERS,
+            visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            retry_delay=settings.JOB_RETRY_DELAY,
+            poll_interval=settings.JOB_POLL_INTERVAL,
+            session_factory=SessionLocal,
+            cache=cache_response,
+        )
+
+    def start(self) -> "JobWorkerPool":
+        """Starts the worker threads."""
+        self._stop.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops taking new jobs and waits up to `timeout` seconds for running
+        ones. Jobs still running afterwards are handed out again once their
+        lease expires.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+    def notify(self) -> None:
+        """Wakes idle workers, e.g. right after a job was submitted."""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception:
+                logger.exception("Job worker error")
+            if self._wakeup.wait(self.poll_interval):
+                self._wakeup.clear()
+
+    def run_once(self) -> bool:
+        """Reserves and runs one job; returns False if none was visible."""
+        if time.monotonic() - self._last_purge > 60:
+            self._last_purge = time.monotonic()
+            self.broker.purge()
+        job = self.broker.reserve(self.visibility_timeout)
+        if job is None:
+            return False
+        if job.attempts > self.max_attempts:
+            # Leased by workers that never finished it, e.g. crashed processes.
+            self._finish_failed(job, job.error or "Job abandoned after its lease expired")
+            return True
+        payload = job.payload
+        usage: Dict[str, int] = {}
+        try:
+            response = self.service.process_query(
+                payload["query"], payload["model"], payload.get("parameters"), user_id=payload.get("user_id"), usage=usage
+            )
+        except Exception as e:
+            self._handle_failure(job, e)
+            return True
+        self._store(job.id, payload.get("user_id"), response, usage.get("prompt_tokens"))
+        if self.broker.complete(job):
+            self.counters["succeeded"] += 1
+            self._callback(job, {"query_id": job.id, "status": SUCCEEDED, "response": response})
+        else:
+            self.counters["lost_leases"] += 1
+            logger.warning("Lease on job %d expired before it finished", job.id)
+        return True
+
+    def _handle_failure(self, job: Job, error: Exception) -> None:
+        message = str(error) or type(error).__name__
+        if job.attempts < self.max_attempts and (
+            is_retryable(error) or isinstance(error, (CircuitOpenError, RateLimitExceeded))
+        ):
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            if isinstance(error, RateLimitExceeded):
+                delay = max(delay, error.retry_after)
+            logger.warning("Job %d attempt %d failed (%r); retrying in %.1fs", job.id, job.attempts, error, delay)
+            if self.broker.fail(job, message, delay):
+                self.counters["retried"] += 1
+            return
+        logger.error("Job %d failed: %r", job.id, error)
+        self._finish_failed(job, message)
+
+    def _finish_failed(self, job: Job, message: str) -> None:
+        if self.broker.fail(job, message):
+            self.counters["failed"] += 1
+            self._callback(job, {"query_id": job.id, "status": FAILED, "error": message})
+
+    def _store(self, query_id: int, user_id: Optional[int], response: str, prompt_tokens: Optional[int] = None) -> None:
+        from core.database.database import complete_query, response_cache_key
+
+        if self.session_factory is not None:
+            db = self.session_factory()
+            try:
+                complete_query(db, query_id, response, prompt_tokens)
+            finally:
+                db.close()
+        if self.cache is not None:
+            try:
+                self.cache(response_cache_key(query_id, user_id), response)
+            except redis.RedisError as e:
+                logger.warning("Caching job %d result failed: %s", query_id, e)
+
+    def _callback(self, job: Job, body: Dict[str, Any]) -> None:
+        url = job.payload.get("webhook_url")
+        if url and not send_webhook(url, body):
+            logger.error("Webhook for job %d was not delivered", job.id)
+
+# Shared broker and worker pool (created on first use when JOBS_ENABLED is set):
+_broker: Optional[JobBroker] = None
+_pool: Optional[JobWorkerPool] = None
+
+def get_broker() -> Optional[JobBroker]:
+    """Returns the shared job broker, or None when jobs are disabled."""
+    global _broker
+    if _broker is None and settings.JOBS_ENABLED:
+        if settings.JOB_BROKER == "redis":
+            _broker = RedisJobBroker(result_ttl=settings.JOB_RESULT_TTL)
+        else:
+            _broker = SQLiteJobBroker(settings.JOB_SQLITE_PATH, result_ttl=settings.JOB_RESULT_TTL)
+    return _broker
+
+def start_workers(service: Any) -> Optional[JobWorkerPool]:
+    """Starts this process's worker pool, unless jobs are disabled."""
+    global _pool
+    broker = get_broker()
+    if broker is not None and _pool is None and settings.JOB_WORKERS > 0:
+        _pool = JobWorkerPool.from_settings(broker, service).start()
+    return _pool
+
+def stop_workers(timeout: Optional[float] = None) -> None:
+    """Stops this process's worker pool, letting running jobs finish for up to `timeout` seconds."""
+    global _pool
+    if _pool is not None:
+        _pool.stop(timeout)
+        _pool = None
+
+def notify_workers() -> None:
+    """Wakes this process's idle workers after a submission."""
+    if _pool is not None:
+        _pool.notify()
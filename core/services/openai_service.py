@@ -1,8 +1,20 @@
-import openai  # 1.52.0: Interact with OpenAI's API for query processing
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import openai  # 0.28.1: Interact with OpenAI's API for query processing
 import requests  # 2.32.3: Make HTTP requests to external APIs, including OpenAI
-from typing import Dict, Optional
+import aiohttp  # 3.10.10: Async HTTP client used by openai for non-blocking requests
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from config.settings import settings
+from core.services.batching import BatchDispatcher
+from core.services.cache import ResponseCache, completion_params, make_cache_key
+from core.services.rate_limit import RateLimiter, estimate_tokens
+from core.services.resilience import ResiliencePolicy
+from core.services.semantic_cache import SemanticCache
+from core.services.singleflight import RedisSingleFlight, SingleFlight
+from core.services.tokens import fit_to_context
+from core.utils import metrics
+from core.utils.redis_client import get_async_redis
 
 class OpenAIService:
     """
@@ -11,13 +23,145 @@ class OpenAIService:
     Handles authentication, query processing, and response retrieval.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        singleflight: Optional[Union[SingleFlight, RedisSingleFlight]] = None,
+        resilience: Optional[ResiliencePolicy] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+    ):
         """
         Initializes the OpenAI service with API credentials from settings.
+
+        Args:
+            cache: Optional response cache consulted before every completion.
+                Defaults to a cache built from settings when RESPONSE_CACHE_ENABLED is set.
+            singleflight: Optional coalescer for identical concurrent async queries.
+                Defaults to an in-process one when SINGLEFLIGHT_ENABLED is set, shared
+                across workers through Redis when SINGLEFLIGHT_REDIS_ENABLED is set.
+            resilience: Optional deadline, retry, circuit-breaker and hedging policy
+                applied to every upstream call. Defaults to one built from settings
+                when RESILIENCE_ENABLED is set.
+            rate_limiter: Optional token-bucket limiter that queues upstream calls
+                within per-model and per-user limits. Defaults to one built from
+                settings when RATE_LIMIT_ENABLED is set.
+            semantic_cache: Optional cache of completions for similarly worded
+                prompts, consulted by `process_query` and `aprocess_query` after
+                the exact response cache. Defaults to one built from settings
+                when SEMANTIC_CACHE_ENABLED is set.
         """
         openai.api_key = settings.OPENAI_API_KEY
+        openai.api_base = settings.OPENAI_API_BASE
+        self.api_key = settings.OPENAI_API_KEY
+        if cache is None and settings.RESPONSE_CACHE_ENABLED:
+            cache = ResponseCache.from_settings()
+        self.cache = cache
+        if singleflight is None and settings.SINGLEFLIGHT_ENABLED:
+            if settings.SINGLEFLIGHT_REDIS_ENABLED:
+                singleflight = RedisSingleFlight(
+                    get_async_redis(),
+                    wait_timeout=settings.SINGLEFLIGHT_WAIT_TIMEOUT,
+                )
+            else:
+                singleflight = SingleFlight()
+        self.singleflight = singleflight
+        if resilience is None and settings.RESILIENCE_ENABLED:
+            resilience = ResiliencePolicy.from_settings()
+        self.resilience = resilience
+        if rate_limiter is None and settings.RATE_LIMIT_ENABLED:
+            rate_limiter = RateLimiter.from_settings()
+        self.rate_limiter = rate_limiter
+        if semantic_cache is None and settings.SEMANTIC_CACHE_ENABLED:
+            semantic_cache = SemanticCache.from_settings()
+        self.semantic_cache = semantic_cache
+        self.batcher = BatchDispatcher.from_settings(self) if settings.BATCHING_ENABLED else None
+        self._async_session: Optional[aiohttp.ClientSession] = None
+
+    @staticmethod
+    def _completion_params(parameters: Optional[Dict]) -> Dict[str, Any]:
+        """
+        Maps user supplied parameters onto the completion request fields.
+        """
+        return completion_params(parameters)
 
-    def process_query(self, query: str, model: str = "text-davinci-003", parameters: Optional[Dict] = None) -> str:
+    @staticmethod
+    def _extract_text(response: Any) -> str:
+        """
+        Returns the text of the first choice of a completion response.
+        """
+        return response["choices"][0]["text"]
+
+    def _call(self, model: str, fn: Callable[[float], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Calls `fn(request_timeout)` under the resilience policy, if any.
+        """
+        with metrics.timer(metrics.UPSTREAM_LATENCY, outcome=True, model=model):
+            if self.resilience is None:
+                return fn(timeout or settings.OPENAI_TIMEOUT)
+            return self.resilience.call(model, fn, timeout)
+
+    async def _acall(
+        self,
+        model: str,
+        fn: Callable[[float], Awaitable[Any]],
+        timeout: Optional[float] = None,
+        hedge: bool = True,
+    ) -> Any:
+        """
+        Async variant of `_call`; `hedge` allows hedged attempts for this call.
+        """
+        with metrics.timer(metrics.UPSTREAM_LATENCY, outcome=True, model=model):
+            if self.resilience is None:
+                return await fn(timeout or settings.OPENAI_TIMEOUT)
+            return await self.resilience.acall(model, fn, timeout, hedge=hedge)
+
+    @staticmethod
+    def _fit(query: str, model: str, params: Dict[str, Any], usage: Optional[Dict[str, int]] = None) -> str:
+        """
+        Checks the prompt plus `max_tokens` against the model's context window
+        before anything is sent, per CONTEXT_OVERFLOW_POLICY.
+
+        Returns the prompt to send; `params["max_tokens"]` may be lowered to fit.
+        The token count of that prompt is recorded in `usage`, if given, so a
+        truncated prompt is stored with the count that was actually sent.
+        """
+        if not settings.CONTEXT_BUDGET_ENABLED:
+            return query
+        budget = fit_to_context(
+            query,
+            model,
+            params["max_tokens"],
+            settings.CONTEXT_OVERFLOW_POLICY,
+            settings.CONTEXT_MIN_COMPLETION_TOKENS,
+        )
+        params["max_tokens"] = budget.max_tokens
+        if usage is not None:
+            usage["prompt_tokens"] = budget.prompt_tokens
+        return budget.prompt
+
+    def _throttle(self, query: str, model: str, params: Dict[str, Any], user_id: Optional[int]) -> None:
+        """
+        Waits for the rate limiter, if any, to admit a request for `query`.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(model, estimate_tokens(query, params["max_tokens"], model), user_id)
+
+    async def _athrottle(self, query: str, model: str, params: Dict[str, Any], user_id: Optional[int]) -> None:
+        """
+        Async variant of `_throttle`.
+        """
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(model, estimate_tokens(query, params["max_tokens"], model), user_id)
+
+    def process_query(
+        self,
+        query: str,
+        model: str = "text-davinci-003",
+        parameters: Optional[Dict] = None,
+        user_id: Optional[int] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> str:
         """
         Processes a user query using OpenAI's API.
 
@@ -25,6 +169,8 @@ class OpenAIService:
             query: The user query to process.
             model: The OpenAI language model to use. Defaults to "text-davinci-003".
             parameters: Additional parameters for the OpenAI model, such as temperature, max_length, etc.
+            user_id: Optional ID of the requesting user, charged against their quota.
+            usage: Optional dict that receives `prompt_tokens`, the prompt's budgeted token count.
 
         Returns:
             The response generated by the OpenAI model.
@@ -32,21 +178,406 @@ class OpenAIService:
         Raises:
             requests.exceptions.RequestException: If there is an error during the API call.
             openai.error.APIError: If there is an OpenAI API error.
+            openai.error.Timeout: If the model's deadline passes before a response arrives.
+            core.services.resilience.CircuitOpenError: If upstream calls for the model are paused.
+            core.services.rate_limit.RateLimitExceeded: If the request would queue longer than allowed.
+            core.services.tokens.ContextWindowExceeded: If the prompt cannot fit the model's context window.
         """
+        params = self._completion_params(parameters)
+        query = self._fit(query, model, params, usage)
+        cache_key = make_cache_key(model, query, params) if self.cache is not None else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(model, query, params)
+            if cached is not None:
+                return cached
+        self._throttle(query, model, params, user_id)
         try:
-            response = openai.Completion.create(
-                engine=model,
-                prompt=query,
-                temperature=parameters.get("temperature", 0.7),
-                max_tokens=parameters.get("max_tokens", 256),
-                top_p=parameters.get("top_p"),
-                frequency_penalty=parameters.get("frequency_penalty"),
-                presence_penalty=parameters.get("presence_penalty"),
+            response = self._call(
+                model,
+                lambda timeout: openai.Completion.create(
+                    engine=model,
+                    prompt=query,
+                    request_timeout=timeout,
+                    **params,
+                ),
             )
-            return response.choices[0].text
+            text = self._extract_text(response)
         except requests.exceptions.RequestException as e:
             # Handle network errors
             raise e
         except openai.error.APIError as e:
             # Handle OpenAI API errors
-            raise e
\ No newline at end of file
+            raise e
+        if cache_key is not None:
+            self.cache.set(cache_key, text)
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(model, query, params, text)
+        return text
+
+    @staticmethod
+    def _batch_item(
+        item: Union[str, Dict], model: str, parameters: Optional[Dict]
+    ) -> Tuple[str, str, Optional[Dict], Optional[Dict[str, int]]]:
+        """
+        Resolves one entry of a query batch to its (query, model, parameters, usage).
+
+        Entries are either a bare query string or a dict with a `query` key and
+        optional `model` and `parameters` overriding the batch-wide defaults,
+        and an optional `usage` dict passed on to `process_query`.
+        """
+        if isinstance(item, str):
+            return item, model, parameters, None
+        return item["query"], item.get("model") or model, item.get("parameters", parameters), item.get("usage")
+
+    def process_queries(
+        self,
+        queries: List[Union[str, Dict]],
+        model: str = "text-davinci-003",
+        parameters: Optional[Dict] = None,
+        concurrency: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> List[Union[str, Exception]]:
+        """
+        Processes several queries concurrently, at most `concurrency` at a time.
+
+        Args:
+            queries: Query strings, or dicts with `query` and optional `model`, `parameters` and `usage`.
+            model: The OpenAI language model for entries that do not name one.
+            parameters: Parameters for entries that do not carry their own.
+            concurrency: Maximum number of in-flight requests. Defaults to `QUERY_BATCH_CONCURRENCY`.
+            user_id: Optional ID of the requesting user, charged against their quota.
+
+        Returns:
+            One result per query, in input order: the response text, or the
+            exception raised for that query. A failing entry does not affect the others.
+        """
+        if not queries:
+            return []
+        workers = min(concurrency or settings.QUERY_BATCH_CONCURRENCY, len(queries))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for item in queries:
+                query, item_model, item_parameters, usage = self._batch_item(item, model, parameters)
+                futures.append(executor.submit(self.process_query, query, item_model, item_parameters, user_id, usage))
+            return [future.exception() or future.result() for future in futures]
+
+    def stream_query(
+        self,
+        query: str,
+        model: str = "text-davinci-003",
+        parameters: Optional[Dict] = None,
+        user_id: Optional[int] = None,
+        usage: Optional[Dict[str, int]] = None,
+        fragments: Optional[List[str]] = None,
+    ) -> Iterator[str]:
+        """
+        Processes a user query using OpenAI's API, yielding the completion as it is generated.
+
+        Args:
+            query: The user query to process.
+            model: The OpenAI language model to use. Defaults to "text-davinci-003".
+            parameters: Additional parameters for the OpenAI model, such as temperature, max_length, etc.
+            user_id: Optional ID of the requesting user, charged against their quota.
+            usage: Optional dict that receives `prompt_tokens`, the prompt's budgeted token count.
+            fragments: Optional list the fragments are collected into, for callers that need the full text.
+
+        Yields:
+            Successive text fragments of the response; joined, they form the full completion.
+
+        Raises:
+            requests.exceptions.RequestException: If there is an error during the API call.
+            openai.error.APIError: If there is an OpenAI API error.
+        """
+        params = self._completion_params(parameters)
+        query = self._fit(query, model, params, usage)
+        cache_key = make_cache_key(model, query, params) if self.cache is not None else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if fragments is not None:
+                    fragments.append(cached)
+                yield cached
+                return
+        self._throttle(query, model, params, user_id)
+        chunks = self._call(
+            model,
+            lambda timeout: openai.Completion.create(
+                engine=model, prompt=query, stream=True, request_timeout=timeout, **params
+            ),
+        )
+        # One buffer serves both the caller and the cache; neither, no buffer.
+        if fragments is None and cache_key is not None:
+            fragments = []
+        for chunk in chunks:
+            text = self._extract_text(chunk)
+            if fragments is not None:
+                fragments.append(text)
+            yield text
+        if cache_key is not None:
+            self.cache.set(cache_key, "".join(fragments))
+
+    @property
+    def async_session(self) -> aiohttp.ClientSession:
+        """
+        Lazily creates the long-lived, pooled HTTP session used by the async path.
+
+        The session is shared by every `aprocess_query` call on this instance so
+        connections are kept alive and reused instead of being re-established
+        for each completion.
+        """
+        if self._async_session is None or self._async_session.closed:
+            config = settings.openai_http_config
+            connector = aiohttp.TCPConnector(
+                limit=config["max_connections"],
+                limit_per_host=config["max_connections"],
+                keepalive_timeout=config["keepalive_expiry"],
+            )
+            self._async_session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=config["timeout"], connect=config["connect_timeout"]),
+            )
+        return self._async_session
+
+    async def aprocess_query(
+        self,
+        query: str,
+        model: str = "text-davinci-003",
+        parameters: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        user_id: Optional[int] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> str:
+        """
+        Processes a user query using OpenAI's API without blocking the event loop.
+
+        Args:
+            query: The user query to process.
+            model: The OpenAI language model to use. Defaults to "text-davinci-003".
+            parameters: Additional parameters for the OpenAI model, such as temperature, max_length, etc.
+            timeout: Optional per-request timeout in seconds. Defaults to `OPENAI_TIMEOUT`.
+            user_id: Optional ID of the requesting user, charged against their quota.
+            usage: Optional dict that receives `prompt_tokens`, the prompt's budgeted token count.
+
+        Returns:
+            The response generated by the OpenAI model.
+
+        Raises:
+            openai.error.Timeout: If the request exceeds its timeout.
+            openai.error.APIError: If there is an OpenAI API error.
+        """
+        params = self._completion_params(parameters)
+        query = self._fit(query, model, params, usage)
+        if self.cache is None and self.singleflight is None and self.semantic_cache is None:
+            return await self._acomplete(query, model, params, timeout, user_id)
+
+        cache_key = make_cache_key(model, query, params)
+        if self.cache is not None:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                return cached
+        if self.semantic_cache is not None:
+            cached = await asyncio.to_thread(self.semantic_cache.lookup, model, query, params)
+            if cached is not None:
+                return cached
+
+        async def fetch() -> str:
+            text = await self._acomplete(query, model, params, timeout, user_id)
+            if self.cache is not None:
+                await self.cache.aset(cache_key, text)
+            if self.semantic_cache is not None:
+                await asyncio.to_thread(self.semantic_cache.store, model, query, params, text)
+            return text
+
+        if self.singleflight is not None:
+            return await self.singleflight.do(cache_key, fetch)
+        return await fetch()
+
+    async def aprocess_queries(
+        self,
+        queries: List[Union[str, Dict]],
+        model: str = "text-davinci-003",
+        parameters: Optional[Dict] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        user_id: Optional[int] = None,
+    ) -> List[Union[str, Exception]]:
+        """
+        Async variant of `process_queries`, fanned out over the pooled async session.
+
+        Every entry goes through `aprocess_query`, so the response cache,
+        request coalescing and micro-batching apply to batch entries too.
+
+        Args:
+            queries: Query strings, or dicts with `query` and optional `model`, `parameters` and `usage`.
+            model: The OpenAI language model for entries that do not name one.
+            parameters: Parameters for entries that do not carry their own.
+            concurrency: Maximum number of in-flight requests. Defaults to `QUERY_BATCH_CONCURRENCY`.
+            timeout: Optional per-request timeout in seconds. Defaults to `OPENAI_TIMEOUT`.
+            user_id: Optional ID of the requesting user, charged against their quota.
+
+        Returns:
+            One result per query, in input order: the response text, or the
+            exception raised for that query.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.QUERY_BATCH_CONCURRENCY)
+
+        async def run(item: Union[str, Dict]) -> str:
+            query, item_model, item_parameters, usage = self._batch_item(item, model, parameters)
+            async with semaphore:
+                return await self.aprocess_query(query, item_model, item_parameters, timeout, user_id, usage=usage)
+
+        results = await asyncio.gather(*(run(item) for item in queries), return_exceptions=True)
+        for result in results:
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+        return results
+
+    async def _acomplete(
+        self,
+        query: str,
+        model: str,
+        params: Dict[str, Any],
+        timeout: Optional[float],
+        user_id: Optional[int] = None,
+    ) -> str:
+        """
+        Issues a completion request on the pooled async session, through the
+        micro-batching dispatcher when batching is enabled.
+
+        Rate limits are charged per prompt, before batching, so a batch of
+        prompts counts as that many requests against requests-per-minute limits.
+        """
+        await self._athrottle(query, model, params, user_id)
+        if self.batcher is not None:
+            if timeout is None:
+                return await self.batcher.submit(query, model, params)
+            return await asyncio.wait_for(self.batcher.submit(query, model, params), timeout)
+
+        async def request(request_timeout: float) -> str:
+            openai.aiosession.set(self.async_session)
+            response = await openai.Completion.acreate(
+                engine=model,
+                prompt=query,
+                request_timeout=request_timeout,
+                **params,
+            )
+            return self._extract_text(response)
+
+        return await self._acall(model, request, timeout)
+
+    async def astream_query(
+        self,
+        query: str,
+        model: str = "text-davinci-003",
+        parameters: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        user_id: Optional[int] = None,
+        usage: Optional[Dict[str, int]] = None,
+        fragments: Optional[List[str]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of `stream_query`, streamed over the pooled async session.
+
+        Args:
+            query: The user query to process.
+            model: The OpenAI language model to use. Defaults to "text-davinci-003".
+            parameters: Additional parameters for the OpenAI model, such as temperature, max_length, etc.
+            timeout: Optional timeout in seconds for the whole stream. Defaults to `OPENAI_TIMEOUT`.
+            user_id: Optional ID of the requesting user, charged against their quota.
+            usage: Optional dict that receives `prompt_tokens`, the prompt's budgeted token count.
+            fragments: Optional list the fragments are collected into, for callers that need the full text.
+
+        Yields:
+            Successive text fragments of the response; joined, they form the full completion.
+
+        Raises:
+            openai.error.Timeout: If the request exceeds its timeout.
+            openai.error.APIError: If there is an OpenAI API error.
+        """
+        params = self._completion_params(parameters)
+        query = self._fit(query, model, params, usage)
+        cache_key = make_cache_key(model, query, params) if self.cache is not None else None
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                if fragments is not None:
+                    fragments.append(cached)
+                yield cached
+                return
+        await self._athrottle(query, model, params, user_id)
+
+        async def request(request_timeout: float) -> AsyncIterator[Any]:
+            openai.aiosession.set(self.async_session)
+            return await openai.Completion.acreate(
+                engine=model,
+                prompt=query,
+                stream=True,
+                request_timeout=request_timeout,
+                **params,
+            )
+
+        # Retries cover opening the stream; fragments already yielded cannot be replayed.
+        chunks = await self._acall(model, request, timeout, hedge=False)
+        if fragments is None and cache_key is not None:
+            fragments = []
+        async for chunk in chunks:
+            text = self._extract_text(chunk)
+            if fragments is not None:
+                fragments.append(text)
+            yield text
+        if cache_key is not None:
+            await self.cache.aset(cache_key, "".join(fragments))
+
+    async def aprocess_batch(
+        self,
+        queries: List[str],
+        model: str = "text-davinci-003",
+        parameters: Optional[Dict] = None,
+    ) -> List[str]:
+        """
+        Processes several prompts with one multi-prompt completion request.
+
+        Args:
+            queries: The prompts to complete; all share `model` and `parameters`.
+            model: The OpenAI language model to use. Defaults to "text-davinci-003".
+            parameters: Additional parameters for the OpenAI model, such as temperature, max_length, etc.
+
+        Returns:
+            The completions, in the same order as `queries`.
+
+        Raises:
+            openai.error.Timeout: If the model's deadline passes before a response arrives.
+            openai.error.APIError: If there is an OpenAI API error.
+        """
+        params = self._completion_params(parameters)
+
+        async def request(request_timeout: float) -> Any:
+            openai.aiosession.set(self.async_session)
+            return await openai.Completion.acreate(
+                engine=model,
+                prompt=queries,
+                request_timeout=request_timeout,
+                **params,
+            )
+
+        # Hedging a batch would duplicate every prompt in it, so batches are only retried.
+        response = await self._acall(model, request, hedge=False)
+        texts = [""] * len(queries)
+        for choice in response["choices"]:
+            texts[choice["index"]] = choice["text"]
+        return texts
+
+    async def aclose(self) -> None:
+        """
+        Closes the pooled HTTP session used by the async path, sending any
+        prompts still queued for batching first.
+        """
+        if self.batcher is not None:
+            await self.batcher.drain()
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
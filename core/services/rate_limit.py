@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import openai  # 0.28.1: Interact with OpenAI's API for query processing
+import redis  # 5.1.1: Redis library for caching frequently accessed data
+import redis.asyncio as aioredis  # 5.1.1: asyncio Redis client for cross-worker coordination
+
+from config.settings import settings
+from core.services.tokens import approximate_tokens, count_tokens
+from core.utils.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# A bucket to draw from: (key, capacity, refill rate per second, cost).
+Draw = Tuple[str, float, float, float]
+
+# Reserves `cost` from every bucket in KEYS, or from none of them.
+# ARGV: max_wait, then capacity, rate and cost for each key in order.
+# Returns {1, wait} when reserved (the caller sleeps `wait` seconds first)
+# or {0, wait} when the wait would exceed max_wait. Waits are returned as
+# strings because Lua numbers are truncated to integers on the way out.
+RESERVE_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local max_wait = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local rate = tonumber(ARGV[i * 3])
+    local cost = tonumber(ARGV[i * 3 + 1])
+    local state = redis.call("HMGET", key, "tokens", "ts")
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - cost
+    levels[i] = tokens
+    if tokens < 0 then
+        wait = math.max(wait, -tokens / rate)
+    end
+end
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local rate = tonumber(ARGV[i * 3])
+    redis.call("HSET", key, "tokens", tostring(levels[i]), "ts", tostring(now))
+    redis.call("PEXPIRE", key, math.ceil((capacity - levels[i]) / rate * 1000) + 1000)
+end
+return {1, tostring(wait)}
+"""
+
+class RateLimitExceeded(openai.error.OpenAIError):
+    """Raised when a request would have to queue longer than the limiter's `max_wait`."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def estimate_tokens(prompt: Union[str, List[str]], max_tokens: Optional[int] = None, model: Optional[str] = None) -> int:
+    """
+    Estimates the tokens a completion request consumes against a
+    tokens-per-minute limit: the prompt's tokens plus the requested
+    completion length. Prompt tokens are counted with the model's tokenizer
+    when `model` is given, and otherwise at about four characters per token.
+    """
+    prompts = prompt if isinstance(prompt, list) else [prompt]
+    if model is None:
+        prompt_tokens = sum(approximate_tokens(text) for text in prompts)
+    else:
+        prompt_tokens = sum(count_tokens(text, model) for text in prompts)
+    return prompt_tokens + (max_tokens or 0) * len(prompts)
+
+class RateLimiter:
+    """
+    In-process token-bucket limiter for upstream completion requests.
+
+    Every request draws one unit from its model's requests-per-minute bucket
+    and its estimated token count from the model's tokens-per-minute bucket,
+    and the same from the calling user's quota buckets when a `user_id` is
+    given. Buckets may go into debt: a request that finds them short reserves
+    its share anyway and waits until the debt is repaid, so bursts are spread
+    out in arrival order instead of failing. Only a request whose wait would
+    exceed `max_wait` is rejected, without consuming anything.
+
+    Limits are `(requests_per_minute, tokens_per_minute)` pairs; 0 means unlimited.
+    """
+
+    def __init__(
+        self,
+        model_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        default_limits: Tuple[float, float] = (0, 0),
+        user_limits: Tuple[float, float] = (0, 0),
+        max_wait: float = 10.0,
+        prefix: str = "ratelimit:",
+    ):
+        self.model_limits = dict(model_limits or {})
+        self.default_limits = default_limits
+        self.user_limits = user_limits
+        self.max_wait = max_wait
+        self.prefix = prefix
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "RateLimiter":
+        """
+        Builds a limiter configured by the RATE_LIMIT_* and USER_QUOTA_* settings,
+        shared across workers through Redis when RATE_LIMIT_REDIS_ENABLED is set.
+        """
+        options = dict(
+            model_limits={
+                model: (limits.get("rpm", 0), limits.get("tpm", 0))
+                for model, limits in settings.RATE_LIMIT_MODEL_LIMITS.items()
+            },
+            default_limits=(settings.RATE_LIMIT_DEFAULT_RPM, settings.RATE_LIMIT_DEFAULT_TPM),
+            user_limits=(settings.USER_QUOTA_RPM, settings.USER_QUOTA_TPM),
+            max_wait=settings.RATE_LIMIT_MAX_WAIT,
+        )
+        if settings.RATE_LIMIT_REDIS_ENABLED:
+            return RedisRateLimiter(get_redis(), get_async_redis(), **options)
+        return cls(**options)
+
+    def draws(self, model: str, tokens: int, user_id: Optional[int] = None) -> List[Draw]:
+        """
+        Returns the buckets a request for `model` costing `tokens` draws from.
+        """
+        scopes = [(f"model:{model}", self.model_limits.get(model, self.default_limits))]
+        if user_id is not None:
+            scopes.append((f"user:{user_id}", self.user_limits))
+        draws = []
+        for scope, (rpm, tpm) in scopes:
+            if rpm:
+                draws.append((f"{self.prefix}{scope}:rpm", rpm, rpm / 60, 1))
+            if tpm:
+                draws.append((f"{self.prefix}{scope}:tpm", tpm, tpm / 60, tokens))
+        return draws
+
+    def acquire(self, model: str, tokens: int = 0, user_id: Optional[int] = None) -> float:
+        """
+        Blocks until the request may be sent and returns how long it waited.
+
+        Raises:
+            RateLimitExceeded: If the request would wait longer than `max_wait`.
+        """
+        draws = self.draws(model, tokens, user_id)
+        if not draws:
+            return 0.0
+        wait = self._admit(self._reserve(draws), model, user_id)
+        if wait > 0:
+            self._enter_wait()
+            try:
+                time.sleep(wait)
+            finally:
+                self._leave_wait(wait)
+        return wait
+
+    async def aacquire(self, model: str, tokens: int = 0, user_id: Optional[int] = None) -> float:
+        """
+        Async variant of `acquire`; waiting requests yield the event loop.
+        """
+        draws = self.draws(model, tokens, user_id)
+        if not draws:
+            return 0.0
+        wait = self._admit(await self._areserve(draws), model, user_id)
+        if wait > 0:
+            self._enter_wait()
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._leave_wait(wait)
+        return wait
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the current queue depth and wait-time counters.
+        """
+        return {
+            "queue_depth": self.waiting,
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+            "total_wait_seconds": self.total_wait,
+            "mean_wait_seconds": self.total_wait / self.delayed if self.delayed else 0.0,
+            "max_wait_seconds": self.max_observed_wait,
+        }
+
+    def _reserve(self, draws: List[Draw]) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait = 0.0
+            for key, capacity, rate, cost in draws:
+                tokens, ts = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - ts) * rate) - cost
+                levels.append(tokens)
+                if tokens < 0:
+                    wait = max(wait, -tokens / rate)
+            if wait > self.max_wait:
+                return False, wait
+            for (key, _, _, _), tokens in zip(draws, levels):
+                self._buckets[key] = (tokens, now)
+            return True, wait
+
+    async def _areserve(self, draws: List[Draw]) -> Tuple[bool, float]:
+        return self._reserve(draws)
+
+    def _admit(self, reservation: Tuple[bool, float], model: str, user_id: Optional[int]) -> float:
+        reserved, wait = reservation
+        with self._lock:
+            if not reserved:
+                self.rejected += 1
+            else:
+                self.acquired += 1
+        if not reserved:
+            scope = f"user {user_id} on {model}" if user_id is not None else model
+            raise RateLimitExceeded(f"Rate limit for {scope} exceeded; retry in {wait:.1f}s", retry_after=wait)
+        return wait
+
+    def _enter_wait(self) -> None:
+        with self._lock:
+            self.waiting += 1
+
+    def _leave_wait(self, wait: float) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.delayed += 1
+            self.total_wait += wait
+            self.max_observed_wait = max(self.max_observed_wait, wait)
+
+class RedisRateLimiter(RateLimiter):
+    """
+    `RateLimiter` whose buckets live in Redis, so limits hold across workers.
+
+    Each reservation runs `RESERVE_SCRIPT` atomically on the server (by SHA
+    after the first call), using the Redis clock, so concurrent workers never
+    overdraw a bucket. If Redis is unreachable the limiter fails open and
+    lets the request through.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        async_redis_client: Optional[aioredis.Redis] = None,
+        **options,
+    ):
+        super().__init__(**options)
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self._script = redis_client.register_script(RESERVE_SCRIPT) if redis_client is not None else None
+        self._async_script = (
+            async_redis_client.register_script(RESERVE_SCRIPT) if async_redis_client is not None else None
+        )
+        self.redis_errors = 0
+
+    @staticmethod
+    def _script_args(draws: List[Draw], max_wait: float) -> Tuple[List[str], List[float]]:
+        keys = [key for key, _, _, _ in draws]
+        args: List[float] = [max_wait]
+        for _, capacity, rate, cost in draws:
+            args.extend((capacity, rate, cost))
+        return keys, args
+
+    @staticmethod
+    def _parse(result: List) -> Tuple[bool, float]:
+        reserved, wait = result
+        return bool(int(reserved)), float(wait.decode() if isinstance(wait, bytes) else wait)
+
+    def _reserve(self, draws: List[Draw]) -> Tuple[bool, float]:
+        keys, args = self._script_args(draws, self.max_wait)
+        try:
+            return self._parse(self._script(keys=keys, args=args))
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Rate limiter unavailable, letting request through: %s", e)
+            return True, 0.0
+
+    async def _areserve(self, draws: List[Draw]) -> Tuple[bool, float]:
+        if self._async_script is None:
+            return await asyncio.to_thread(self._reserve, draws)
+        keys, args = self._script_args(draws, self.max_wait)
+        try:
+            return self._parse(await self._async_script(keys=keys, args=args))
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Rate limiter unavailable, letting request through: %s", e)
+            return True, 0.0
@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiohttp  # 3.10.10: Async HTTP client used by openai for non-blocking requests
+import openai  # 0.28.1: Interact with OpenAI's API for query processing
+import requests  # 2.32.3: Make HTTP requests to external APIs, including OpenAI
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(openai.error.OpenAIError):
+    """Raised without calling upstream while a model's circuit breaker is open."""
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Returns whether a failed upstream call is worth retrying.
+
+    Timeouts, connection failures, rate limiting and 5xx responses are
+    transient; client errors such as invalid requests or bad credentials are not.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(
+        error,
+        (
+            openai.error.Timeout,
+            openai.error.APIConnectionError,
+            openai.error.RateLimitError,
+            openai.error.ServiceUnavailableError,
+            openai.error.TryAgain,
+            asyncio.TimeoutError,
+            aiohttp.ClientError,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ),
+    ):
+        return True
+    if isinstance(error, openai.error.APIError):
+        return error.http_status is not None and error.http_status >= 500
+    return False
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    Attempt `n` (counting from 1) sleeps a uniformly random time between 0
+    and `min(max_delay, base_delay * 2 ** (n - 1))` before the next attempt,
+    which spreads retries from many clients instead of synchronising them.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 5.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker guarding one upstream dependency.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected with `CircuitOpenError` for `recovery_timeout` seconds. It
+    then half-opens and lets `half_open_max_calls` trial calls through: a
+    success closes the circuit, a failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow(self) -> bool:
+        """Returns whether a call may proceed, reserving a trial slot when half-open."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_calls = 0
+
+    def release(self) -> None:
+        """
+        Frees a trial slot reserved by `allow` for a call that ended without
+        an outcome, such as a cancelled one, so the next call can try instead.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._trial_calls > 0:
+                self._trial_calls -= 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("Circuit opened after %s consecutive failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_calls = 0
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_calls = 0
+
+class ResiliencePolicy:
+    """
+    Deadline, retry, circuit-breaker and hedging policy for upstream calls.
+
+    Calls are made per model: each model has its own deadline (the total
+    time budget across all attempts) and its own circuit breaker, so one
+    degraded model does not reject traffic for the others. The wrapped
+    function receives the time remaining before the deadline and should use
+    it as its request timeout.
+
+    With `hedge_delay` set, async calls start a second, identical attempt if
+    the first has not finished within that delay and take whichever succeeds
+    first, trimming tail latency at the cost of some duplicate requests.
+    """
+
+    def __init__(
+        self,
+        retry: Optional[RetryPolicy] = None,
+        default_deadline: float = 60.0,
+        deadlines: Optional[Dict[str, float]] = None,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        hedge_delay: Optional[float] = None,
+    ):
+        self.retry = retry or RetryPolicy()
+        self.default_deadline = default_deadline
+        self.deadlines = dict(deadlines or {})
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.hedge_delay = hedge_delay or None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = dict.fromkeys(
+            ("calls", "attempts", "retries", "successes", "failures", "timeouts", "short_circuits", "hedges", "hedge_wins"),
+            0,
+        )
+
+    @classmethod
+    def from_settings(cls) -> "ResiliencePolicy":
+        """
+        Builds a policy configured by the OPENAI_* retry, deadline and hedging settings.
+        """
+        return cls(
+            retry=RetryPolicy(
+                max_attempts=settings.OPENAI_MAX_RETRIES + 1,
+                base_delay=settings.OPENAI_RETRY_BASE_DELAY,
+                max_delay=settings.OPENAI_RETRY_MAX_DELAY,
+            ),
+            default_deadline=settings.OPENAI_TIMEOUT,
+            deadlines=settings.OPENAI_MODEL_DEADLINES,
+            failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=settings.CIRCUIT_BREAKER_RECOVERY_TIMEOUT,
+            hedge_delay=settings.OPENAI_HEDGE_DELAY,
+        )
+
+    def deadline(self, model: str) -> float:
+        return self.deadlines.get(model, self.default_deadline)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """Returns the circuit breaker for `model`, creating it on first use."""
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    model, CircuitBreaker(self.failure_threshold, self.recovery_timeout)
+                )
+        return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns call counters and the state of every model's circuit breaker."""
+        return {**self.counters, "breakers": {model: breaker.state for model, breaker in self._breakers.items()}}
+
+    def call(self, model: str, fn: Callable[[float], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Calls `fn(remaining_seconds)` under the policy for `model` and returns its result.
+
+        `timeout` overrides the model's deadline for this call.
+        """
+        deadline = time.monotonic() + (timeout or self.deadline(model))
+        self._count("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = self._remaining(deadline)
+            breaker = self._admit(model)
+            self._count("attempts")
+            try:
+                result = fn(remaining)
+            except Exception as e:
+                delay = self._on_failure(breaker, e, attempt, deadline)
+                time.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            self._count("successes")
+            return result
+
+    async def acall(
+        self,
+        model: str,
+        fn: Callable[[float], Awaitable[Any]],
+        timeout: Optional[float] = None,
+        hedge: bool = True,
+    ) -> Any:
+        """
+        Async variant of `call`; each attempt is also cut off at the deadline.
+
+        Attempts are hedged when `hedge_delay` is configured and `hedge` is true.
+        """
+        deadline = time.monotonic() + (timeout or self.deadline(model))
+        self._count("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = self._remaining(deadline)
+            breaker = self._admit(model)
+            self._count("attempts")
+            try:
+                if hedge and self.hedge_delay is not None and self.hedge_delay < remaining:
+                    result = await self._ahedged(fn, deadline)
+                else:
+                    result = await asyncio.wait_for(fn(remaining), remaining)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = openai.error.Timeout(f"Request to {model} exceeded its {remaining:.1f}s deadline")
+                delay = self._on_failure(breaker, e, attempt, deadline)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled: no outcome to record, but the trial slot must not leak.
+                breaker.release()
+                raise
+            breaker.record_success()
+            self._count("successes")
+            return result
+
+    async def _ahedged(self, fn: Callable[[float], Awaitable[Any]], deadline: float) -> Any:
+        """
+        Runs `fn`, adding a second identical attempt if the first is still
+        running after `hedge_delay`, and returns the first successful result.
+        """
+        primary = asyncio.ensure_future(fn(self._remaining(deadline)))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if done:
+                return primary.result()
+            self._count("hedges")
+            hedge = asyncio.ensure_future(fn(self._remaining(deadline)))
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=self._remaining(deadline), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _admit(self, model: str) -> CircuitBreaker:
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            self._count("short_circuits")
+            raise CircuitOpenError(f"Circuit breaker for {model} is open; upstream calls are paused")
+        return breaker
+
+    def _on_failure(self, breaker: CircuitBreaker, error: Exception, attempt: int, deadline: float) -> float:
+        """
+        Records a failed attempt and returns the delay before retrying,
+        re-raising `error` when it should not be retried.
+        """
+        retryable = is_retryable(error)
+        if retryable:
+            breaker.record_failure()
+        else:
+            # The upstream answered; a client error says nothing about its health.
+            breaker.record_success()
+        if isinstance(error, (openai.error.Timeout, requests.exceptions.Timeout)):
+            self._count("timeouts")
+        delay = self.retry.backoff(attempt)
+        if not retryable or attempt >= self.retry.max_attempts or time.monotonic() + delay >= deadline:
+            self._count("failures")
+            raise error
+        self._count("retries")
+        logger.warning("Upstream attempt %s failed (%r); retrying in %.2fs", attempt, error, delay)
+        return delay
+
+    def _remaining(self, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._count("timeouts")
+            self._count("failures")
+            raise openai.error.Timeout("Deadline exceeded before the request could be sent")
+        return remaining
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
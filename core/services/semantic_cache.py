@@ -0,0 +1,346 @@
+"""
+Semantic completion cache: answers prompts that are worded differently but
+mean the same as one already completed.
+
+Prompts are embedded by a pluggable embedding function, any callable
+mapping text to a vector, and kept in one in-memory NumPy index per model
+and parameter set, so a cached completion is only reused for the same
+model and sampling parameters. A lookup returns the completion of the
+nearest stored prompt when their cosine similarity reaches the model's
+threshold.
+
+Indexes are searched by brute force, one matrix-vector product over every
+stored prompt, until IVF is enabled: once an index holds enough prompts it
+clusters them with spherical k-means and searches only the `nprobe`
+clusters nearest to each prompt. Each index keeps at most `max_entries`
+prompts, overwriting the oldest first, and at most `max_indexes` indexes
+are kept, dropping the least recently used, since clients choose the
+parameters.
+
+The default embedding function hashes word unigrams and bigrams and needs
+no model or network access. It is meant for tests and development, not
+production: it cannot tell "I will be able to pay" from "I will not be
+able to pay", which score above 0.97 in a long enough prompt, so the
+default threshold is 0.99. Set SEMANTIC_CACHE_EMBEDDER to "module:function"
+to use another, for example a local sentence-embedding model, and tune
+SEMANTIC_CACHE_THRESHOLDS for it.
+
+Requires the optional `numpy` package.
+"""
+import importlib
+import json
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+from core.utils import metrics
+
+try:
+    import numpy  # 2.1.2: Vector index of the semantic response cache (optional)
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Sequence[float]]
+
+_WORDS = re.compile(r"\w+")
+
+def _require_numpy() -> None:
+    if numpy is None:
+        raise RuntimeError("The semantic cache requires the numpy package.")
+
+class HashingEmbedder:
+    """
+    Embeds text by hashing its lowercased word unigrams and bigrams into
+    `dim` signed buckets. Prompts sharing most of their words score close
+    to 1; it captures rewording and reordering, not synonyms or meaning,
+    so a negated prompt can score nearly as high as the original. Do not
+    use it in production.
+    """
+
+    def __init__(self, dim: int = 256):
+        _require_numpy()
+        self.dim = dim
+
+    def __call__(self, text: str) -> Any:
+        vector = numpy.zeros(self.dim, dtype=numpy.float32)
+        words = _WORDS.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return vector
+
+def load_embedder(target: str, dim: int = 256) -> Embedder:
+    """
+    Resolves SEMANTIC_CACHE_EMBEDDER: empty or "hashing" for `HashingEmbedder`,
+    otherwise a "module:function" string naming the embedding function.
+    """
+    if not target or target == "hashing":
+        return HashingEmbedder(dim)
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+class VectorIndex:
+    """
+    Fixed-capacity ring of unit vectors searched by inner product.
+
+    Storage grows by doubling up to `max_entries` rows; after that each
+    `add` overwrites the oldest row. With `ivf_lists` set, the index trains
+    that many centroids once it holds `ivf_train_size` vectors and from then
+    on searches only the rows of the `ivf_nprobe` nearest centroids.
+    Centroids are not retrained. Not thread-safe; callers hold a lock.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        max_entries: int = 100000,
+        ivf_lists: int = 0,
+        ivf_nprobe: int = 8,
+        ivf_train_size: Optional[int] = None,
+    ):
+        _require_numpy()
+        self.dim = dim
+        self.max_entries = max_entries
+        self.ivf_lists = ivf_lists
+        self.ivf_nprobe = ivf_nprobe
+        self.ivf_train_size = ivf_train_size or ivf_lists * 40
+        self._vectors = numpy.empty((min(max_entries, 64), dim), dtype=numpy.float32)
+        self._size = 0
+        self._next = 0
+        self.centroids: Optional[Any] = None
+        self._assignments: Optional[Any] = None
+        self._lists: List[Any] = []
+        self._list_sizes: List[int] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def add(self, vector: Any) -> int:
+        """
+        Stores a unit vector and returns its slot, reusing the oldest slot when full.
+        """
+        slot = self._next
+        if slot >= len(self._vectors):
+            grown = numpy.empty((min(self.max_entries, 2 * len(self._vectors)), self.dim), dtype=numpy.float32)
+            grown[: self._size] = self._vectors[: self._size]
+            self._vectors = grown
+        self._vectors[slot] = vector
+        self._size = max(self._size, slot + 1)
+        self._next = (slot + 1) % self.max_entries
+        if self.trained:
+            self._assign(slot)
+        elif self.ivf_lists and self._size >= self.ivf_train_size:
+            self.train()
+        return slot
+
+    def search(self, vector: Any, k: int = 1) -> Tuple[Any, Any]:
+        """
+        Returns the slots and scores of the `k` stored vectors with the
+        highest inner product with `vector`, best first.
+        """
+        if self.trained:
+            slots = self._candidates(vector)
+            scores = self._vectors[slots] @ vector
+        else:
+            slots = None
+            scores = self._vectors[: self._size] @ vector
+        if scores.size > k:
+            top = numpy.argpartition(-scores, k - 1)[:k]
+        else:
+            top = numpy.arange(scores.size)
+        top = top[numpy.argsort(-scores[top])]
+        return (top if slots is None else slots[top]), scores[top]
+
+    def train(self, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Clusters the stored vectors into `ivf_lists` centroids with spherical
+        k-means and builds the inverted lists.
+        """
+        sample = self._vectors[: self._size]
+        rng = numpy.random.default_rng(seed)
+        centroids = sample[rng.choice(self._size, size=min(self.ivf_lists, self._size), replace=False)].copy()
+        for _ in range(iterations):
+            assignments = numpy.argmax(sample @ centroids.T, axis=1)
+            sums = numpy.zeros_like(centroids)
+            numpy.add.at(sums, assignments, sample)
+            norms = numpy.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid.
+            centroids = numpy.where(norms > 0, sums / numpy.maximum(norms, 1e-12), centroids)
+        self.centroids = centroids.astype(numpy.float32)
+        self._assignments = numpy.full(self.max_entries, -1, dtype=numpy.int32)
+        for start in range(0, self._size, 65536):
+            block = self._vectors[start : min(start + 65536, self._size)]
+            self._assignments[start : start + len(block)] = numpy.argmax(block @ self.centroids.T, axis=1)
+        order = numpy.argsort(self._assignments[: self._size], kind="stable").astype(numpy.int32)
+        counts = numpy.bincount(self._assignments[: self._size], minlength=len(self.centroids))
+        self._lists = numpy.split(order, numpy.cumsum(counts)[:-1])
+        self._list_sizes = [len(members) for members in self._lists]
+
+    def _assign(self, slot: int) -> None:
+        cluster = int(numpy.argmax(self.centroids @ self._vectors[slot]))
+        self._assignments[slot] = cluster
+        members, size = self._lists[cluster], self._list_sizes[cluster]
+        if size == len(members):
+            # Drop entries of overwritten slots that moved to another list before growing.
+            members = numpy.unique(members[self._assignments[members] == cluster])
+            size = len(members)
+            grown = numpy.empty(max(16, 2 * size), dtype=numpy.int32)
+            grown[:size] = members
+            members = grown
+        members[size] = slot
+        self._lists[cluster], self._list_sizes[cluster] = members, size + 1
+
+    def _candidates(self, vector: Any) -> Any:
+        nprobe = min(self.ivf_nprobe, len(self.centroids))
+        probed = numpy.argpartition(-(self.centroids @ vector), nprobe - 1)[:nprobe]
+        parts = []
+        for cluster in probed:
+            members = self._lists[cluster][: self._list_sizes[cluster]]
+            parts.append(members[self._assignments[members] == cluster])
+        return numpy.unique(numpy.concatenate(parts))
+
+class SemanticCache:
+    """
+    Completion cache keyed by prompt meaning rather than exact text.
+
+    `lookup` returns the completion of the most similar stored prompt for
+    the same model and parameters when the cosine similarity reaches the
+    model's threshold, and `store` records a new completion. Embedding runs
+    outside the lock; searches and inserts on the indexes are serialised.
+    """
+
+    def __init__(
+        self,
+        embed: Embedder,
+        thresholds: Optional[Dict[str, float]] = None,
+        default_threshold: float = 0.99,
+        max_entries: int = 100000,
+        ivf_lists: int = 0,
+        ivf_nprobe: int = 8,
+        max_indexes: int = 16,
+    ):
+        _require_numpy()
+        self.embed = embed
+        self.thresholds = thresholds or {}
+        self.default_threshold = default_threshold
+        self.max_entries = max_entries
+        self.ivf_lists = ivf_lists
+        self.ivf_nprobe = ivf_nprobe
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[Tuple[str, str], Tuple[VectorIndex, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "SemanticCache":
+        """
+        Builds a cache configured by the SEMANTIC_CACHE_* settings.
+        """
+        return cls(
+            load_embedder(settings.SEMANTIC_CACHE_EMBEDDER, settings.SEMANTIC_CACHE_DIM),
+            thresholds=settings.SEMANTIC_CACHE_THRESHOLDS,
+            default_threshold=settings.SEMANTIC_CACHE_DEFAULT_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ivf_lists=settings.SEMANTIC_CACHE_IVF_LISTS,
+            ivf_nprobe=settings.SEMANTIC_CACHE_IVF_NPROBE,
+            max_indexes=settings.SEMANTIC_CACHE_MAX_INDEXES,
+        )
+
+    def threshold(self, model: str) -> float:
+        """Minimum cosine similarity for a hit on `model`."""
+        return self.thresholds.get(model, self.default_threshold)
+
+    @staticmethod
+    def namespace(model: str, parameters: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+        """Index key: the model and its set (non-None) parameters as canonical JSON."""
+        canonical = {k: v for k, v in (parameters or {}).items() if v is not None}
+        return model, json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+
+    def _unit(self, prompt: str) -> Optional[Any]:
+        vector = numpy.asarray(self.embed(prompt), dtype=numpy.float32)
+        norm = float(numpy.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def lookup(self, model: str, prompt: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Returns a cached completion of a prompt similar enough to `prompt`, or None.
+        """
+        started = time.perf_counter()
+        key = self.namespace(model, parameters)
+        response = None
+        if key in self._indexes:
+            vector = self._unit(prompt)
+            if vector is not None:
+                with self._lock:
+                    entry = self._indexes.get(key)
+                    if entry is not None:
+                        self._indexes.move_to_end(key)
+                        slots, scores = entry[0].search(vector)
+                        if scores.size and scores[0] >= self.threshold(model):
+                            response = entry[1][slots[0]]
+        self.lookup_seconds += time.perf_counter() - started
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        metrics.count_cache_lookup("semantic", response is not None)
+        return response
+
+    def store(self, model: str, prompt: str, parameters: Optional[Dict[str, Any]], response: str) -> None:
+        """
+        Records the completion of `prompt` for later lookups.
+        """
+        vector = self._unit(prompt)
+        if vector is None:
+            return
+        key = self.namespace(model, parameters)
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry is None:
+                entry = self._indexes[key] = (
+                    VectorIndex(len(vector), self.max_entries, self.ivf_lists, self.ivf_nprobe),
+                    [],
+                )
+                while len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(key)
+            index, responses = entry
+            slot = index.add(vector)
+            if slot == len(responses):
+                responses.append(response)
+            else:
+                responses[slot] = response
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns hit and miss counts, the hit rate, mean lookup latency
+        (embedding plus search) and the number of stored prompts.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "mean_lookup_ms": 1000 * self.lookup_seconds / lookups if lookups else 0.0,
+            "entries": sum(len(index) for index, _ in self._indexes.values()),
+            "indexes": len(self._indexes),
+        }
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+import redis.asyncio as aioredis  # 5.1.1: asyncio Redis client for cross-worker coordination
+
+logger = logging.getLogger(__name__)
+
+# Deletes the lock only if it is still held by the caller's token.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+class _LeaderCancelled(Exception):
+    """Set on a flight whose leader was cancelled, so its followers retry."""
+
+class SingleFlight:
+    """
+    Coalesces concurrent asyncio calls that share a key into one execution.
+
+    The first caller for a key runs the supplied coroutine function; callers
+    arriving while it is in flight await the same result (or exception)
+    instead of issuing their own call. If the leader is cancelled (a client
+    disconnect or timeout), its followers are not: the first of them starts
+    the call again as the new leader.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """
+        Runs `fn` once for all concurrent callers of `key` and returns its result.
+        """
+        future = self._inflight.get(key)
+        while future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                future = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved so a leader without followers does not warn.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+class RedisSingleFlight:
+    """
+    Extends `SingleFlight` across workers using a Redis lock and pub/sub.
+
+    Within a worker, duplicates are coalesced in-process first. The local
+    leader then races for a Redis lock: the winner calls upstream and
+    publishes the result, while other workers subscribe and wait for it. If
+    the remote leader fails or does not publish within `wait_timeout`, the
+    waiting worker falls back to calling upstream itself.
+    """
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        lock_ttl: float = 60,
+        wait_timeout: float = 60,
+        result_ttl: int = 5,
+        prefix: str = "singleflight:",
+    ):
+        self.redis_client = redis_client
+        self.local = SingleFlight()
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.prefix = prefix
+        self.remote_hits = 0
+        self.fallbacks = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """
+        Runs `fn` once across all workers for concurrent callers of `key`.
+        """
+        return await self.local.do(key, lambda: self._do_distributed(key, fn))
+
+    async def _do_distributed(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        lock_key = f"{self.prefix}lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis_client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except aioredis.RedisError as e:
+            logger.warning("Single-flight lock unavailable, calling upstream directly: %s", e)
+            return await fn()
+
+        if acquired:
+            return await self._lead(key, lock_key, token, fn)
+
+        result = await self._wait_for_leader(key)
+        if result is not None:
+            self.remote_hits += 1
+            return result
+        self.fallbacks += 1
+        return await fn()
+
+    async def _lead(self, key: str, lock_key: str, token: str, fn: Callable[[], Awaitable[str]]) -> str:
+        channel = f"{self.prefix}channel:{key}"
+        try:
+            result = await fn()
+        except BaseException:
+            await self._publish(channel, key, {"error": True})
+            await self._release(lock_key, token)
+            raise
+        await self._publish(channel, key, {"result": result})
+        await self._release(lock_key, token)
+        return result
+
+    async def _wait_for_leader(self, key: str) -> Optional[str]:
+        channel = f"{self.prefix}channel:{key}"
+        pubsub = self.redis_client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            # The leader may have finished before we subscribed.
+            stored = await self.redis_client.get(f"{self.prefix}result:{key}")
+            if stored is not None:
+                return json.loads(stored).get("result")
+            deadline = time.monotonic() + self.wait_timeout
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=min(1.0, max(0.0, deadline - time.monotonic())),
+                )
+                if message is not None:
+                    return json.loads(message["data"]).get("result")
+            return None
+        except aioredis.RedisError as e:
+            logger.warning("Single-flight wait failed, calling upstream directly: %s", e)
+            return None
+        finally:
+            await pubsub.aclose()
+
+    async def _publish(self, channel: str, key: str, message: Dict) -> None:
+        payload = json.dumps(message)
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(f"{self.prefix}result:{key}", payload, ex=self.result_ttl)
+                pipe.publish(channel, payload)
+                await pipe.execute()
+        except aioredis.RedisError as e:
+            logger.warning("Single-flight publish failed: %s", e)
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        try:
+            await self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except aioredis.RedisError as e:
+            logger.warning("Single-flight lock release failed: %s", e)
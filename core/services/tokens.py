@@ -0,0 +1,185 @@
+"""
+Local prompt token counting and context-window budgeting.
+
+Token counts come from the model's tiktoken encoding when `tiktoken` is
+installed and the encoding is available, and otherwise from an estimate of
+about four characters per token. Encodings are loaded once per model and
+prompt counts are memoised per model and digest of the text, so checking a
+prompt before dispatch and again when its row is stored costs one
+tokenization without the cache holding on to the prompts themselves.
+Completions are counted once and not memoised.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, NamedTuple, Optional, Tuple
+
+import openai  # 0.28.1: Interact with OpenAI's API for query processing
+
+from config.settings import settings
+
+try:
+    import tiktoken  # 0.8.0: OpenAI's BPE tokenizer for local token counts
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Context windows (prompt plus completion tokens) of known models. Dated and
+# fine-tuned variants match the longest known prefix; MODEL_CONTEXT_WINDOWS
+# adds or overrides entries.
+CONTEXT_WINDOWS = {
+    "text-davinci-003": 4097,
+    "text-davinci-002": 4097,
+    "text-davinci-001": 2049,
+    "text-curie-001": 2049,
+    "text-babbage-001": 2049,
+    "text-ada-001": 2049,
+    "davinci-002": 16384,
+    "babbage-002": 16384,
+    "davinci": 2049,
+    "curie": 2049,
+    "babbage": 2049,
+    "ada": 2049,
+    "gpt-3.5-turbo-instruct": 4096,
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+}
+
+# Completion length OpenAI assumes when a request sets no max_tokens.
+DEFAULT_COMPLETION_TOKENS = 16
+
+class ContextWindowExceeded(openai.error.InvalidRequestError):
+    """Raised before dispatch when a prompt plus its completion cannot fit the model's context window."""
+
+    def __init__(self, message: str, prompt_tokens: int, max_tokens: int, context_window: int):
+        super().__init__(message, param="prompt")
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.context_window = context_window
+
+class Budget(NamedTuple):
+    """The prompt and completion length to send, after fitting them to the context window."""
+
+    prompt: str
+    prompt_tokens: int
+    max_tokens: int
+    truncated: bool
+
+def approximate_tokens(text: str) -> int:
+    """Estimates a token count at about four characters per token."""
+    return len(text) // 4 + 1
+
+@lru_cache(maxsize=64)
+def get_encoding(model: str) -> Optional[Any]:
+    """
+    Returns the tiktoken encoding for `model`, or None to fall back to estimates.
+
+    Models tiktoken does not know use TOKENIZER_DEFAULT_ENCODING.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(settings.TOKENIZER_DEFAULT_ENCODING)
+    except Exception as e:  # e.g. the encoding's BPE file cannot be downloaded
+        logger.warning("No tokenizer for model %s, estimating token counts: %s", model, e)
+        return None
+
+_token_counts: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+def _encoded_length(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return approximate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_tokens(text: str, model: str, memoise: bool = True) -> int:
+    """
+    Returns the number of tokens `text` encodes to for `model`.
+
+    The last TOKEN_COUNT_CACHE_SIZE counts are kept under a digest of the
+    text; pass `memoise=False` for text that is only counted once, such as
+    a completion.
+    """
+    if not memoise:
+        return _encoded_length(text, model)
+    key = (model, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+    count = _encoded_length(text, model)
+    with _token_counts_lock:
+        _token_counts[key] = count
+        while len(_token_counts) > settings.TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+def clear_token_counts() -> None:
+    """Drops the memoised token counts."""
+    with _token_counts_lock:
+        _token_counts.clear()
+
+def context_window(model: str) -> int:
+    """Returns the context window of `model`, or DEFAULT_CONTEXT_WINDOW when unknown."""
+    windows = {**CONTEXT_WINDOWS, **settings.MODEL_CONTEXT_WINDOWS}
+    if model in windows:
+        return windows[model]
+    prefixes = [name for name in windows if model.startswith(name)]
+    return windows[max(prefixes, key=len)] if prefixes else settings.DEFAULT_CONTEXT_WINDOW
+
+def truncate_tokens(text: str, model: str, limit: int) -> str:
+    """Returns the last `limit` tokens of `text`."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[-(limit - 1) * 4:] if limit > 1 else ""
+    return encoding.decode(encoding.encode(text, disallowed_special=())[-limit:])
+
+def fit_to_context(
+    prompt: str,
+    model: str,
+    max_tokens: Optional[int],
+    policy: str = "reject",
+    min_completion_tokens: int = DEFAULT_COMPLETION_TOKENS,
+) -> Budget:
+    """
+    Checks `prompt` plus `max_tokens` against the model's context window.
+
+    With the "reject" policy an overflowing request raises. With "truncate"
+    the completion is shortened to the room left, as long as that leaves at
+    least `min_completion_tokens`; failing that, the start of the prompt is
+    dropped, keeping its end, to make room for that many.
+
+    Raises:
+        ContextWindowExceeded: If the request does not fit and cannot be truncated.
+    """
+    window = context_window(model)
+    max_tokens = max_tokens or DEFAULT_COMPLETION_TOKENS
+    prompt_tokens = count_tokens(prompt, model)
+    if prompt_tokens + max_tokens <= window:
+        return Budget(prompt, prompt_tokens, max_tokens, False)
+    if policy == "truncate":
+        room = window - prompt_tokens
+        if room >= min_completion_tokens:
+            return Budget(prompt, prompt_tokens, room, False)
+        completion = min(max_tokens, min_completion_tokens)
+        if window - completion > 0:
+            prompt = truncate_tokens(prompt, model, window - completion)
+            return Budget(prompt, count_tokens(prompt, model), completion, True)
+    raise ContextWindowExceeded(
+        f"Prompt of {prompt_tokens} tokens plus max_tokens={max_tokens} exceeds "
+        f"the {window}-token context window of {model}",
+        prompt_tokens=prompt_tokens,
+        max_tokens=max_tokens,
+        context_window=window,
+    )
@@ -1,8 +1,130 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
 from config.settings import settings
 
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(filename)s - %(funcName)s - %(lineno)d - %(message)s"
+
+# Attributes every LogRecord has; anything else was passed through `extra=`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample_rate"}
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+
+    Fields passed with `extra=` are included alongside the standard ones.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of DEBUG records.
+
+    `rate` applies to every DEBUG record; a single call can override it with
+    `extra={"sample_rate": 0.01}`, which also works at higher levels. Dropped
+    records are discarded before they are formatted or queued.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", self.rate if record.levelno <= logging.DEBUG else 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller.
+
+    When the bounded queue is full the record is dropped and counted, so a
+    slow disk can delay log output but never the request that logged it.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock implementation formats the message here, on the caller's
+        # thread. Records never leave the process, so pass them through and
+        # let the listener's handlers format them.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room rather than failing when stopped with a full queue.
+        self.queue.put(self._sentinel)
+
+def create_handlers() -> List[logging.Handler]:
+    """
+    Builds the output handlers: a rotating file at LOG_FILE_PATH, or stderr
+    when no path is set, formatted as text or JSON per LOG_FORMAT.
+    """
+    if settings.LOG_FILE_PATH:
+        handler: logging.Handler = RotatingFileHandler(
+            settings.LOG_FILE_PATH,
+            maxBytes=settings.LOG_FILE_MAX_SIZE,
+            backupCount=settings.LOG_FILE_BACKUP_COUNT,
+        )
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return [handler]
+
+def attach_queue(
+    target: logging.Logger,
+    handlers: List[logging.Handler],
+    queue_size: int = 10000,
+    sample_rate: float = 1.0,
+) -> QueueListener:
+    """
+    Routes `target`'s records through a bounded queue to `handlers`.
+
+    Callers only run the level check, the sampling filter and a
+    non-blocking enqueue; formatting and I/O happen on the listener's
+    background thread. Returns the started listener; stop it to flush.
+    """
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    target.addHandler(queue_handler)
+    listener = _Listener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
 class Logger:
     """
     Singleton class for managing the application's logging system.
@@ -15,33 +137,66 @@ class Logger:
             raise Exception("Logger class is a singleton!")
         else:
             Logger.__instance = self
+            self.logger = logging.getLogger()
+            self.listener: Optional[QueueListener] = None
             self._init_logger()
 
     @staticmethod
-    def get_logger():
+    def get_logger() -> logging.Logger:
         """
         Static method to retrieve the singleton logger instance.
         """
         if Logger.__instance is None:
             Logger()
-        return Logger.__instance
+        return Logger.__instance.logger
 
     def _init_logger(self):
         """
         Private method to configure the logger and handlers.
+
+        Handlers are attached to the root logger, so every module's
+        `logging.getLogger(__name__)` output goes through them. With
+        LOG_QUEUE_ENABLED the handlers run on a background listener thread.
         """
-        logger = logging.getLogger(__name__)
-        logger.setLevel(logging.INFO if settings.DEBUG else logging.INFO)
+        level = settings.LOG_LEVEL or ("DEBUG" if settings.DEBUG else "INFO")
+        self.logger.setLevel(level)
+        handlers = create_handlers()
+        if settings.LOG_QUEUE_ENABLED:
+            self.listener = attach_queue(
+                self.logger,
+                handlers,
+                queue_size=settings.LOG_QUEUE_SIZE,
+                sample_rate=settings.LOG_DEBUG_SAMPLE_RATE,
+            )
+            atexit.register(self.shutdown)
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=self._restart_after_fork)
+        else:
+            for handler in handlers:
+                handler.addFilter(SamplingFilter(settings.LOG_DEBUG_SAMPLE_RATE))
+                self.logger.addHandler(handler)
 
-        file_handler = RotatingFileHandler(
-            settings.LOG_FILE_PATH,
-            maxBytes=settings.LOG_FILE_MAX_SIZE,
-            backupCount=settings.LOG_FILE_BACKUP_COUNT,
-        )
-        formatter = logging.Formatter(
-            "%(asctime)s - %(levelname)s - %(filename)s - %(funcName)s - %(lineno)d - %(message)s"
-        )
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+    def _restart_after_fork(self) -> None:
+        """
+        Gives a forked worker its own queue and listener thread; the parent's
+        thread does not exist in the child, so records would never be written.
+        """
+        if self.listener is None:
+            return
+        log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        for handler in self.logger.handlers:
+            if isinstance(handler, DroppingQueueHandler):
+                handler.queue = log_queue
+        self.listener.queue = log_queue
+        self.listener._thread = None
+        self.listener.start()
+
+    def shutdown(self) -> None:
+        """
+        Stops the listener thread after it has written every queued record.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
 
-logger = Logger.get_logger()
\ No newline at end of file
+logger = Logger.get_logger()
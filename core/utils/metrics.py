@@ -0,0 +1,224 @@
+"""
+Prometheus instrumentation for the application's hot paths.
+
+Metrics are collected only when METRICS_ENABLED is set and `prometheus_client`
+is installed. Otherwise every metric is a no-op and `timer()` hands back a
+shared do-nothing context manager, so instrumented code pays for little more
+than a function call.
+
+Call sites look metrics up on this module at call time (`metrics.timer(...)`),
+so `configure()` can switch collection on or off at runtime.
+`prometheus_client` is only imported once collection is first enabled.
+
+Under the pre-forking server (`api.server`) each worker records into files
+in PROMETHEUS_MULTIPROC_DIR, which the supervisor sets before the app is
+loaded, and `render()` aggregates every worker's files, so a scrape reports
+the whole server whichever worker answers it.
+"""
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config.settings import settings
+
+prometheus_client: Any = None
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+BCRYPT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class _NoopMetric:
+    """Stands in for every metric while collection is disabled."""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+class _NoopTimer:
+    def __enter__(self) -> "_NoopTimer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+class Timer:
+    """
+    Context manager observing the duration of its block on a histogram.
+
+    With `outcome=True` an `outcome` label of "ok" or "error" is added
+    depending on whether the block raised.
+    """
+
+    __slots__ = ("metric", "labels", "outcome", "started")
+
+    def __init__(self, metric: Any, labels: Dict[str, str], outcome: bool = False):
+        self.metric = metric
+        self.labels = labels
+        self.outcome = outcome
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if self.outcome:
+            self.labels["outcome"] = "ok" if exc_type is None else "error"
+        self.metric.labels(**self.labels).observe(time.perf_counter() - self.started)
+
+_NOOP_METRIC = _NoopMetric()
+_NOOP_TIMER = _NoopTimer()
+
+enabled = False
+registry = None
+UPSTREAM_LATENCY: Any = _NOOP_METRIC
+DB_COMMIT_LATENCY: Any = _NOOP_METRIC
+CACHE_LOOKUPS: Any = _NOOP_METRIC
+PASSWORD_HASH_LATENCY: Any = _NOOP_METRIC
+HTTP_REQUEST_LATENCY: Any = _NOOP_METRIC
+
+def configure(enable: bool) -> bool:
+    """
+    Turns collection on (with a fresh registry) or off.
+
+    Returns whether collection is enabled, which requires `prometheus_client`.
+    """
+    global prometheus_client, enabled, registry
+    global UPSTREAM_LATENCY, DB_COMMIT_LATENCY, CACHE_LOOKUPS, PASSWORD_HASH_LATENCY, HTTP_REQUEST_LATENCY
+    if enable and prometheus_client is None:
+        try:
+            import prometheus_client  # 0.21.0: Prometheus metrics client
+        except ImportError:
+            pass
+    if not enable or prometheus_client is None:
+        enabled, registry = False, None
+        UPSTREAM_LATENCY = DB_COMMIT_LATENCY = CACHE_LOOKUPS = PASSWORD_HASH_LATENCY = HTTP_REQUEST_LATENCY = _NOOP_METRIC
+        return False
+    registry = prometheus_client.CollectorRegistry()
+    UPSTREAM_LATENCY = prometheus_client.Histogram(
+        "upstream_completion_seconds",
+        "Latency of upstream completion calls, including retries.",
+        ["model", "outcome"],
+        buckets=LATENCY_BUCKETS,
+        registry=registry,
+    )
+    DB_COMMIT_LATENCY = prometheus_client.Histogram(
+        "db_commit_seconds",
+        "Latency of database commits when storing queries.",
+        ["operation"],
+        buckets=DB_BUCKETS,
+        registry=registry,
+    )
+    CACHE_LOOKUPS = prometheus_client.Counter(
+        "cache_lookups",
+        "Cache lookups by cache and result (hit or miss).",
+        ["cache", "result"],
+        registry=registry,
+    )
+    PASSWORD_HASH_LATENCY = prometheus_client.Histogram(
+        "password_hash_seconds",
+        "Time spent hashing and checking passwords with bcrypt.",
+        ["operation"],
+        buckets=BCRYPT_BUCKETS,
+        registry=registry,
+    )
+    HTTP_REQUEST_LATENCY = prometheus_client.Histogram(
+        "http_request_seconds",
+        "HTTP request latency by route template, method and status.",
+        ["method", "route", "status"],
+        buckets=HTTP_BUCKETS,
+        registry=registry,
+    )
+    enabled = True
+    return True
+
+def timer(metric: Any, outcome: bool = False, **labels: str) -> Any:
+    """
+    Returns a context manager timing its block into `metric` with `labels`,
+    or a shared no-op one while collection is disabled.
+    """
+    if not enabled:
+        return _NOOP_TIMER
+    return Timer(metric, labels, outcome)
+
+def count_cache_lookup(cache: str, hit: bool) -> None:
+    """Counts one lookup on `cache`; the hit ratio is hits / (hits + misses)."""
+    if enabled:
+        CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def multiprocess_dir() -> Optional[str]:
+    """Returns the directory shared by worker processes' metrics, if any."""
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+
+def render() -> Tuple[bytes, str]:
+    """
+    Returns the current metrics in the Prometheus text format, with its
+    content type, summed over every worker process in multiprocess mode.
+    """
+    if not enabled:
+        return b"", "text/plain; charset=utf-8"
+    collected = registry
+    if multiprocess_dir():
+        from prometheus_client import multiprocess
+
+        collected = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+    return prometheus_client.generate_latest(collected), prometheus_client.CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int) -> None:
+    """Drops the per-process state of an exited worker in multiprocess mode."""
+    if enabled and multiprocess_dir():
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording `http_request_seconds` for every HTTP request.
+
+    Requests are labelled with the matched route's path template (for
+    example `/response/{query_id}`) rather than the raw path, keeping label
+    cardinality bounded. Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+        self._routes: Dict[Any, str] = {}
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if not enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_LATENCY.labels(
+                method=scope["method"], route=self._route(scope), status=str(status)
+            ).observe(time.perf_counter() - started)
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            app = scope.get("app")
+            paths = {getattr(r, "endpoint", None): r.path for r in getattr(app, "routes", []) if hasattr(r, "path")}
+            route = self._routes[endpoint] = paths.get(endpoint, "unmatched")
+        return route
+
+configure(settings.METRICS_ENABLED)
@@ -0,0 +1,89 @@
+import threading
+from typing import Dict, List, Optional
+
+import redis  # 5.1.1: Redis library for caching frequently accessed data
+import redis.asyncio as aioredis  # 5.1.1: asyncio Redis client
+
+from config.settings import settings
+
+_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+_lock = threading.Lock()
+
+def get_redis() -> redis.Redis:
+    """
+    Returns the process-wide Redis client, creating its connection pool on first use.
+
+    Every caller shares one blocking connection pool sized by the REDIS_*
+    settings, so connections are reused instead of being opened for each
+    operation, and callers beyond REDIS_MAX_CONNECTIONS wait up to
+    REDIS_POOL_TIMEOUT for a free connection instead of failing.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                pool = redis.BlockingConnectionPool(timeout=settings.REDIS_POOL_TIMEOUT, **settings.redis_pool_params)
+                _client = redis.Redis(connection_pool=pool)
+    return _client
+
+def get_async_redis() -> aioredis.Redis:
+    """
+    Returns the process-wide asyncio Redis client, creating its connection pool on first use.
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                pool = aioredis.BlockingConnectionPool(timeout=settings.REDIS_POOL_TIMEOUT, **settings.redis_pool_params)
+                _async_client = aioredis.Redis(connection_pool=pool)
+    return _async_client
+
+def close_redis() -> None:
+    """Disconnects every pooled connection of the sync client."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.connection_pool.disconnect()
+            _client = None
+
+async def aclose_redis() -> None:
+    """Disconnects every pooled connection of the asyncio client."""
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+        await client.connection_pool.disconnect()
+
+def _decode(value: Optional[bytes]) -> Optional[str]:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+def get_many(keys: List[str], client: Optional[redis.Redis] = None) -> List[Optional[str]]:
+    """Fetches several keys in one round-trip; missing keys come back as None."""
+    if not keys:
+        return []
+    return [_decode(value) for value in (client or get_redis()).mget(keys)]
+
+def set_many(mapping: Dict[str, str], ttl: Optional[int] = None, client: Optional[redis.Redis] = None) -> None:
+    """Stores several keys, with an optional TTL in seconds, in one pipelined round-trip."""
+    if not mapping:
+        return
+    with (client or get_redis()).pipeline(transaction=False) as pipe:
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=ttl)
+        pipe.execute()
+
+async def aget_many(keys: List[str], client: Optional[aioredis.Redis] = None) -> List[Optional[str]]:
+    """Async variant of `get_many`."""
+    if not keys:
+        return []
+    return [_decode(value) for value in await (client or get_async_redis()).mget(keys)]
+
+async def aset_many(mapping: Dict[str, str], ttl: Optional[int] = None, client: Optional[aioredis.Redis] = None) -> None:
+    """Async variant of `set_many`."""
+    if not mapping:
+        return
+    async with (client or get_async_redis()).pipeline(transaction=False) as pipe:
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=ttl)
+        await pipe.execute()
@@ -1,11 +1,18 @@
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
 import bcrypt
-import redis
 import jwt
 from datetime import datetime, timedelta
 
 from config.settings import settings
+from core.utils import metrics
+from core.services.cache import get_query_cache
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +23,84 @@ def generate_token(user_id: int) -> str:
         "exp": datetime.utcnow() + timedelta(minutes=settings.JWT_EXPIRATION_MINUTES),
     }
     token = jwt.encode(payload, settings.JWT_SECRET, algorithm="HS256")
-    return token.decode("utf-8")
+    return token.decode("utf-8") if isinstance(token, bytes) else token
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of verified JWT payloads, keyed by token digest.
+
+    Each entry is kept until the token's `exp`, so a token presented on every
+    request is decoded and signature-checked once. Revoked token digests are
+    remembered until their own expiry and always fail verification.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Dict]" = OrderedDict()
+        self._revoked: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, digest: bytes) -> Optional[Dict]:
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is None or payload.get("exp", 0) <= time.time():
+                if payload is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return dict(payload)
+
+    def set(self, digest: bytes, payload: Dict) -> None:
+        if "exp" not in payload:
+            return
+        with self._lock:
+            self._entries[digest] = payload
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, digest: bytes) -> bool:
+        return bool(self._revoked) and digest in self._revoked
+
+    def revoke(self, digest: bytes, expires_at: float) -> None:
+        with self._lock:
+            now = time.time()
+            for revoked, revoked_until in list(self._revoked.items()):
+                if revoked_until <= now:
+                    del self._revoked[revoked]
+            self._revoked[digest] = expires_at
+            self._entries.pop(digest, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._revoked.clear()
+
+token_cache = VerifiedTokenCache(max_entries=settings.TOKEN_CACHE_MAX_ENTRIES)
 
 def verify_token(token: str) -> Optional[Dict]:
-    """Verifies a JWT token and returns its payload."""
+    """Verifies a JWT token and returns its payload, reusing earlier verifications of the same token."""
+    digest = token_cache.digest(token)
+    if token_cache.is_revoked(digest):
+        logger.warning("Revoked JWT token.")
+        return None
+    if settings.TOKEN_CACHE_ENABLED:
+        payload = token_cache.get(digest)
+        metrics.count_cache_lookup("token", payload is not None)
+        if payload is not None:
+            return payload
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"])
+        if settings.TOKEN_CACHE_ENABLED:
+            token_cache.set(digest, dict(payload))
         return payload
     except jwt.ExpiredSignatureError:
         logger.warning("JWT token has expired.")
@@ -30,32 +109,87 @@ def verify_token(token: str) -> Optional[Dict]:
         logger.warning("Invalid JWT token.")
         return None
 
+def revoke_token(token: str) -> None:
+    """Revokes a token so `verify_token` rejects it for the rest of its lifetime."""
+    try:
+        expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp", time.time())
+    except jwt.InvalidTokenError:
+        expires_at = time.time() + settings.JWT_EXPIRATION_MINUTES * 60
+    token_cache.revoke(token_cache.digest(token), float(expires_at))
+
 def hash_password(password: str) -> str:
-    """Hashes a password using bcrypt."""
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode(), salt).decode()
+    """Hashes a password using bcrypt with BCRYPT_ROUNDS as the cost factor."""
+    with metrics.timer(metrics.PASSWORD_HASH_LATENCY, operation="hash"):
+        salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+        hashed_password = bcrypt.hashpw(password.encode(), salt).decode()
     return hashed_password
 
 def check_password(password: str, hashed_password: str) -> bool:
     """Checks if a given password matches a hashed password."""
     try:
-        return bcrypt.checkpw(password.encode(), hashed_password.encode())
-    except bcrypt.exceptions.InvalidHashError:
+        with metrics.timer(metrics.PASSWORD_HASH_LATENCY, operation="check"):
+            return bcrypt.checkpw(password.encode(), hashed_password.encode())
+    except ValueError:
         logger.error("Invalid hashed password.")
         return False
 
+class PasswordHashingBusy(Exception):
+    """Raised when too many bcrypt operations are already queued."""
+
+_hashing_executor: Optional[Executor] = None
+_hashing_pending = 0
+_hashing_lock = threading.Lock()
+
+def _get_hashing_executor() -> Executor:
+    global _hashing_executor
+    with _hashing_lock:
+        if _hashing_executor is None:
+            if settings.BCRYPT_EXECUTOR == "process":
+                _hashing_executor = ProcessPoolExecutor(max_workers=settings.BCRYPT_WORKERS)
+            else:
+                # bcrypt releases the GIL while hashing, so threads scale across cores.
+                _hashing_executor = ThreadPoolExecutor(max_workers=settings.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+        return _hashing_executor
+
+async def _run_hashing(fn: Callable[..., Any], *args: Any) -> Any:
+    """Runs a bcrypt call on the hashing pool, failing fast once BCRYPT_MAX_PENDING calls are waiting."""
+    global _hashing_pending
+    with _hashing_lock:
+        if _hashing_pending >= settings.BCRYPT_MAX_PENDING:
+            raise PasswordHashingBusy(f"{_hashing_pending} password hashing operations already pending.")
+        _hashing_pending += 1
+    try:
+        if settings.BCRYPT_EXECUTOR != "process":
+            return await asyncio.get_running_loop().run_in_executor(_get_hashing_executor(), fn, *args)
+        # Timings recorded inside worker processes never reach this process's registry.
+        with metrics.timer(metrics.PASSWORD_HASH_LATENCY, operation="hash" if fn is hash_password else "check"):
+            return await asyncio.get_running_loop().run_in_executor(_get_hashing_executor(), fn, *args)
+    finally:
+        with _hashing_lock:
+            _hashing_pending -= 1
+
+async def ahash_password(password: str) -> str:
+    """Hashes a password on the bcrypt worker pool without blocking the event loop."""
+    return await _run_hashing(hash_password, password)
+
+async def acheck_password(password: str, hashed_password: str) -> bool:
+    """Checks a password on the bcrypt worker pool without blocking the event loop."""
+    return await _run_hashing(check_password, password, hashed_password)
+
+def shutdown_hashing_executor() -> None:
+    """Stops the bcrypt worker pool once queued operations have finished."""
+    global _hashing_executor
+    with _hashing_lock:
+        executor, _hashing_executor = _hashing_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
 def cache_response(query_id: str, response: str) -> None:
-    """Caches the response for a given query ID in Redis."""
-    if settings.REDIS_HOST:
-        redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
-        redis_client.set(query_id, response)
-        logger.info(f"Cached response for query ID: {query_id}")
+    """Caches the response for a given query ID in the query response cache."""
+    get_query_cache().set(query_id, response)
+    logger.debug("Cached response for query ID: %s", query_id)
 
 def get_cached_response(query_id: str) -> Optional[str]:
-    """Retrieves the cached response for a given query ID from Redis."""
-    if settings.REDIS_HOST:
-        redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
-        cached_response = redis_client.get(query_id)
-        if cached_response:
-            return cached_response.decode("utf-8")
-    return None
\ No newline at end of file
+    """Retrieves the cached response for a given query ID, or None if it is not cached."""
+    _, cached_response = get_query_cache().peek(query_id)
+    return cached_response
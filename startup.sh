@@ -1,13 +1,16 @@
 #!/bin/bash
+set -euo pipefail
 
 # Load environment variables
-source .env
+if [ -f .env ]; then
+  set -a
+  source .env
+  set +a
+fi
 
-# Install Node.js dependencies
-npm install
+# Apply pending database migrations
+python -m core.database.migrations
 
-# Build the application
-npm run build
-
-# Start the application
-npm run start
\ No newline at end of file
+# Start the production server; SERVER_* settings set workers, port, backlog and timeouts.
+# exec hands the process to the supervisor so SIGTERM triggers a graceful drain.
+exec python -m api.server "$@"
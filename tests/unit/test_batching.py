@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from core.services.batching import BatchDispatcher
+from core.services.openai_service import OpenAIService
+
+# Test data
+test_model = "text-davinci-003"
+test_parameters = {"temperature": 0.7, "max_tokens": 256}
+
+def batch_completion(**kwargs):
+    """
+    Fake multi-prompt completion echoing each prompt, with choices out of order.
+    """
+    prompts = kwargs["prompt"]
+    choices = [{"text": f"answer to {prompt}", "index": index} for index, prompt in enumerate(prompts)]
+    return {"choices": list(reversed(choices))}
+
+@pytest.fixture
+def openai_service():
+    """
+    Fixture creating an OpenAIService that batches up to four prompts.
+    """
+    service = OpenAIService()
+    service.batcher = BatchDispatcher(service, max_batch_size=4, max_wait_ms=20, max_inflight_batches=2)
+    return service
+
+@patch("openai.Completion.acreate", new_callable=AsyncMock)
+def test_batches_by_size(mock_acreate, openai_service: OpenAIService):
+    """
+    Test that queued prompts are sent as multi-prompt requests and fanned back out in order.
+    """
+    mock_acreate.side_effect = batch_completion
+
+    async def run():
+        try:
+            return await asyncio.gather(
+                *(openai_service.aprocess_query(f"q{i}", model=test_model, parameters=test_parameters) for i in range(8))
+            )
+        finally:
+            await openai_service.aclose()
+
+    assert asyncio.run(run()) == [f"answer to q{i}" for i in range(8)]
+    assert mock_acreate.await_count == 2
+    assert [call.kwargs["prompt"] for call in mock_acreate.await_args_list] == [
+        ["q0", "q1", "q2", "q3"],
+        ["q4", "q5", "q6", "q7"],
+    ]
+
+@patch("openai.Completion.acreate", new_callable=AsyncMock)
+def test_flushes_partial_batch_after_wait(mock_acreate, openai_service: OpenAIService):
+    """
+    Test that a partial batch is sent once the maximum wait time has passed.
+    """
+    mock_acreate.side_effect = batch_completion
+
+    async def run():
+        try:
+            return await openai_service.aprocess_query("lonely", model=test_model, parameters=test_parameters)
+        finally:
+            await openai_service.aclose()
+
+    assert asyncio.run(run()) == "answer to lonely"
+    assert mock_acreate.await_count == 1
+
+@patch("openai.Completion.acreate", new_callable=AsyncMock)
+def test_groups_by_model_and_parameters(mock_acreate, openai_service: OpenAIService):
+    """
+    Test that prompts with different parameters are never batched together.
+    """
+    mock_acreate.side_effect = batch_completion
+
+    async def run():
+        try:
+            return await asyncio.gather(
+                openai_service.aprocess_query("a", model=test_model, parameters={"temperature": 0.1}),
+                openai_service.aprocess_query("b", model=test_model, parameters={"temperature": 0.9}),
+            )
+        finally:
+            await openai_service.aclose()
+
+    assert asyncio.run(run()) == ["answer to a", "answer to b"]
+    assert mock_acreate.await_count == 2
+
+@patch("openai.Completion.acreate", new_callable=AsyncMock)
+def test_batch_failure_reaches_every_caller(mock_acreate, openai_service: OpenAIService):
+    """
+    Test that an upstream error fails every prompt in the batch.
+    """
+    mock_acreate.side_effect = RuntimeError("upstream failed")
+
+    async def run():
+        try:
+            return await asyncio.gather(
+                *(openai_service.aprocess_query(f"q{i}", model=test_model) for i in range(3)),
+                return_exceptions=True,
+            )
+        finally:
+            await openai_service.aclose()
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+
+@patch("openai.Completion.acreate", new_callable=AsyncMock)
+def test_dispatcher_works_across_event_loops(mock_acreate, openai_service: OpenAIService):
+    """
+    Test that a dispatcher built outside any loop limits in-flight batches in
+    each loop it is later used from.
+    """
+    mock_acreate.side_effect = batch_completion
+
+    async def run():
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(
+                    *(openai_service.aprocess_query(f"q{i}", model=test_model, parameters=test_parameters) for i in range(12))
+                ),
+                timeout=5,
+            )
+        finally:
+            await openai_service.aclose()
+
+    for _ in range(2):
+        assert asyncio.run(run()) == [f"answer to q{i}" for i in range(12)]
+    assert mock_acreate.await_count == 6
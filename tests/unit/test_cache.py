@@ -0,0 +1,248 @@
+import asyncio
+import time
+
+import fakeredis  # 2.26.1: In-memory Redis stand-in for tests
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.database import database, models
+from core.services import cache
+from core.services.cache import LRUCache, ReadThroughCache, ResponseCache, decode_cached, encode_cached, make_cache_key
+from core.services.openai_service import OpenAIService
+
+# Test data
+test_query = "What is the meaning of life?"
+test_model = "text-davinci-003"
+test_parameters = {"temperature": 0.7, "max_tokens": 256}
+test_response = "The meaning of life is a question that has been pondered..."
+
+@pytest.fixture
+def redis_client():
+    """
+    Fixture providing an in-memory Redis client.
+    """
+    return fakeredis.FakeRedis()
+
+@pytest.fixture
+def response_cache(redis_client):
+    """
+    Fixture providing a two-tier response cache backed by fakeredis.
+    """
+    return ResponseCache(local=LRUCache(max_entries=8), redis_client=redis_client, ttl=60)
+
+def test_make_cache_key_is_canonical():
+    """
+    Test that whitespace and parameter order do not change the cache key.
+    """
+    key = make_cache_key(test_model, test_query, {"temperature": 0.7, "max_tokens": 256, "top_p": None})
+    assert key == make_cache_key(test_model, f"  {test_query}\n", {"max_tokens": 256, "temperature": 0.7})
+    assert key != make_cache_key(test_model, test_query, {"temperature": 0.2, "max_tokens": 256})
+    assert key != make_cache_key("gpt-3.5-turbo-instruct", test_query, test_parameters)
+
+def test_lru_cache_evicts_least_recently_used():
+    """
+    Test that the entry-count limit evicts the least recently used entry.
+    """
+    cache = LRUCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.evictions == 1
+
+def test_lru_cache_evicts_by_size():
+    """
+    Test that the byte budget evicts entries once it is exceeded.
+    """
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.set("c", "12345")
+    assert len(cache) == 2
+    assert cache.size_bytes == 10
+    assert cache.get("a") is None
+
+def test_lru_cache_expires_entries():
+    """
+    Test that entries are dropped once their TTL has passed.
+    """
+    cache = LRUCache(ttl=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+def test_response_cache_promotes_redis_hits(response_cache, redis_client):
+    """
+    Test that a Redis hit is served and copied into the local tier.
+    """
+    key = make_cache_key(test_model, test_query, test_parameters)
+    redis_client.set(response_cache.prefix + key, test_response)
+    assert response_cache.get(key) == test_response
+    assert response_cache.local.get(key) == test_response
+    assert response_cache.stats()["redis_hits"] == 1
+
+@patch("openai.Completion.create")
+def test_process_query_uses_cache(mock_create, response_cache):
+    """
+    Test that an identical prompt is only sent upstream once.
+    """
+    mock_create.return_value = {"choices": [{"text": test_response}]}
+    service = OpenAIService(cache=response_cache)
+    assert service.process_query(test_query, model=test_model, parameters=test_parameters) == test_response
+    assert service.process_query(f" {test_query} ", model=test_model, parameters=test_parameters) == test_response
+    mock_create.assert_called_once()
+    stats = response_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+@patch("openai.Completion.create")
+def test_stored_content_hash_is_the_service_cache_key(mock_create, response_cache):
+    """
+    Test that a stored row's content_hash is the key the service cached its
+    response under, even when the client left parameters at their defaults.
+    """
+    mock_create.return_value = {"choices": [{"text": test_response}]}
+    OpenAIService(cache=response_cache).process_query(test_query, model=test_model, parameters={"temperature": 0.7})
+    row = database.query_row(1, test_query, test_model, {"temperature": 0.7}, test_response)
+    assert response_cache.get(row["content_hash"]) == test_response
+
+@pytest.fixture
+def read_through(redis_client):
+    """
+    Fixture providing a query response cache backed by fakeredis.
+    """
+    return ReadThroughCache(local=LRUCache(max_entries=8), redis_client=redis_client, ttl=60, negative_ttl=60, compress_min_bytes=64)
+
+def test_encode_cached_compresses_large_values():
+    """
+    Test that large responses are compressed, small ones are not, and both round-trip.
+    """
+    small, large = "short", test_response * 20
+    assert encode_cached(small, 64).startswith(cache.RAW)
+    assert encode_cached(large, 64).startswith(cache.ZLIB)
+    assert len(encode_cached(large, 64)) < len(large) / 4
+    assert decode_cached(encode_cached(small, 64)) == (True, small)
+    assert decode_cached(encode_cached(large, 64)) == (True, large)
+    assert decode_cached(encode_cached(None)) == (False, None)
+
+def test_read_through_loads_once(read_through, redis_client):
+    """
+    Test that a miss is loaded and cached in both tiers, and later lookups skip the loader.
+    """
+    loader = MagicMock(return_value=test_response * 20)
+    assert read_through.get("1", loader) == test_response * 20
+    assert read_through.get("1", loader) == test_response * 20
+    loader.assert_called_once()
+    assert redis_client.get("response:1").startswith(cache.ZLIB)
+
+    read_through.clear()
+    assert read_through.get("1", loader) == test_response * 20
+    loader.assert_called_once()
+    assert read_through.stats()["redis_hits"] == 1
+
+def test_read_through_caches_misses_until_invalidated(read_through, redis_client):
+    """
+    Test that "not found" is cached in both tiers, and invalidation makes a new row visible.
+    """
+    loader = MagicMock(return_value=None)
+    assert read_through.get("2", loader) is None
+    assert read_through.get("2", loader) is None
+    loader.assert_called_once()
+    assert redis_client.get("response:2") == cache.NOT_FOUND
+
+    read_through.invalidate("2")
+    assert redis_client.get("response:2") is None
+    loader.return_value = test_response
+    assert read_through.get("2", loader) == test_response
+
+def test_read_through_negative_entries_expire(redis_client):
+    """
+    Test that cached misses only last `negative_ttl` seconds.
+    """
+    read_through = ReadThroughCache(redis_client=redis_client, negative_ttl=1)
+    loader = MagicMock(return_value=None)
+    read_through.get("3", loader)
+    assert 0 < redis_client.ttl("response:3") <= 1
+    time.sleep(1.1)
+    read_through.get("3", loader)
+    assert loader.call_count == 2
+
+def test_read_through_async(redis_client):
+    """
+    Test the async lookup and invalidation against an asyncio Redis client.
+    """
+    async def run():
+        async_client = fakeredis.aioredis.FakeRedis(server=redis_client.connection_pool.connection_kwargs["server"])
+        read_through = ReadThroughCache(redis_client=redis_client, async_redis_client=async_client, negative_ttl=60)
+        calls = []
+
+        async def load():
+            calls.append(1)
+            return None if len(calls) == 1 else test_response
+
+        assert await read_through.aget("4", load) is None
+        assert await read_through.aget("4", load) is None
+        await read_through.ainvalidate("4")
+        assert await read_through.aget("4", load) == test_response
+        assert await read_through.aget("4", load) == test_response
+        return len(calls)
+
+    assert asyncio.run(run()) == 2
+
+def test_read_through_tolerates_redis_failures():
+    """
+    Test that an unavailable Redis tier falls back to the loader.
+    """
+    broken = MagicMock()
+    broken.get.side_effect = broken.set.side_effect = broken.delete.side_effect = cache.redis.ConnectionError("down")
+    read_through = ReadThroughCache(redis_client=broken)
+    assert read_through.get("5", lambda: test_response) == test_response
+    read_through.invalidate("5")
+    assert read_through.stats()["redis_errors"] == 3
+
+def test_get_response_by_id_reads_through(read_through):
+    """
+    Test that stored responses are served from the cache, and new rows replace cached misses.
+    """
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        with patch.object(cache, "_query_cache", read_through):
+            assert database.get_response_by_id(db, 1) is None
+            query = database.reserve_query(db, 1, test_query, test_model, test_parameters)
+            assert query.id == 1
+            assert database.get_response_by_id(db, 1) is None
+
+            database.complete_query(db, 1, test_response)
+            assert database.get_response_by_id(db, 1) == test_response
+            with patch.object(db, "execute") as execute:
+                assert database.get_response_by_id(db, 1) == test_response
+            execute.assert_not_called()
+        assert read_through.loads == 3
+    finally:
+        db.close()
+        engine.dispose()
+
+def test_get_response_by_id_is_scoped_to_owner(read_through):
+    """
+    Test that a lookup for another user misses even after the owner's lookup was cached.
+    """
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        with patch.object(cache, "_query_cache", read_through):
+            query = database.store_query_and_response(db, 1, test_query, test_model, test_parameters, test_response)
+            assert database.get_response_by_id(db, query.id, user_id=1) == test_response
+            assert database.get_response_by_id(db, query.id, user_id=2) is None
+            assert database.get_response_by_id(db, query.id, user_id=1) == test_response
+            assert read_through.loads == 2
+    finally:
+        db.close()
+        engine.dispose()
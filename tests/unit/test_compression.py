@@ -0,0 +1,148 @@
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from config.settings import settings
+from core.database import compression, database, models
+from core.database.compression import backfill, compress, decompress, is_compressed, storage_stats
+
+# Test data
+test_model = "text-davinci-003"
+test_parameters = {"temperature": 0.7, "max_tokens": 256}
+test_response = "The meaning of life is a question that has been pondered by philosophers for centuries. " * 10
+
+@pytest.fixture
+def zlib_storage():
+    """
+    Fixture enabling zlib compression for values of 64 bytes or more.
+    """
+    with patch.object(settings, "STORAGE_COMPRESSION", "zlib"), patch.object(settings, "STORAGE_COMPRESSION_MIN_BYTES", 64):
+        yield
+
+@pytest.fixture
+def engine(tmp_path):
+    """
+    Fixture providing a SQLite database created from the current models.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def raw_response(engine, query_id: int):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT response FROM queries WHERE id = :id"), {"id": query_id}).scalar_one()
+
+def test_compress_round_trips(zlib_storage):
+    """
+    Test that large values are compressed, short ones stay plain, and both decode.
+    """
+    data = test_response.encode()
+    stored = compress(data)
+    assert is_compressed(stored) and len(stored) < len(data) / 4
+    assert decompress(stored) == data
+    assert compress(b"short") == b"short"
+    assert decompress(compress(b"\x00starts with NUL")) == b"\x00starts with NUL"
+    assert not is_compressed(compress(b"\x00starts with NUL"))
+    with pytest.raises(ValueError):
+        compress(data, codec="lz4")
+
+def test_columns_compress_on_write(engine, zlib_storage):
+    """
+    Test that stored responses and parameters are compressed on disk and read back unchanged.
+    """
+    db = sessionmaker(bind=engine)()
+    try:
+        long_parameters = {"stop": ["###"] * 40, **test_parameters}
+        query = database.store_query_and_response(db, 1, "q", test_model, long_parameters, test_response)
+        db.expunge_all()
+        assert is_compressed(raw_response(engine, query.id))
+        stored = db.get(models.Query, query.id)
+        assert (stored.response, stored.parameters) == (test_response, long_parameters)
+        assert database.get_user_queries_page(db, 1, summary=False)[0][0].response == test_response
+    finally:
+        db.close()
+
+def test_reads_legacy_plain_rows(engine):
+    """
+    Test that rows written as plain text before compression was enabled still load.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO queries (id, user_id, model, parameters, response) VALUES (1, 1, :m, :p, :r)"),
+            {"m": test_model, "p": '{"temperature": 0.7}', "r": "plain"},
+        )
+    db = sessionmaker(bind=engine)()
+    try:
+        query = db.get(models.Query, 1)
+        assert (query.response, query.parameters) == ("plain", {"temperature": 0.7})
+    finally:
+        db.close()
+
+def test_backfill_compresses_existing_rows(engine):
+    """
+    Test that the backfill compresses plain rows, is idempotent, and can be reversed.
+    """
+    db = sessionmaker(bind=engine)()
+    try:
+        for i in range(5):
+            database.store_query_and_response(db, 1, f"q{i}", test_model, test_parameters, f"{i} {test_response}")
+    finally:
+        db.close()
+    before = storage_stats(engine)["response_bytes_per_row"]
+
+    with patch.object(settings, "STORAGE_COMPRESSION_MIN_BYTES", 64):
+        stats = backfill(engine, batch_size=2, codec="zlib")
+        assert (stats["rows"], stats["rewritten"]) == (5, 5)
+        assert stats["bytes_after"] < stats["bytes_before"] / 3
+        assert storage_stats(engine)["response_bytes_per_row"] < before / 3
+        assert all(is_compressed(raw_response(engine, i)) for i in range(1, 6))
+        assert backfill(engine, codec="zlib")["rewritten"] == 0
+
+        db = sessionmaker(bind=engine)()
+        try:
+            assert [query.response for query in db.query(models.Query).order_by(models.Query.id)] == [
+                f"{i} {test_response}" for i in range(5)
+            ]
+        finally:
+            db.close()
+
+        assert backfill(engine, codec="none")["rewritten"] == 5
+        assert not is_compressed(raw_response(engine, 1))
+
+def test_backfill_keeps_concurrent_writes(engine):
+    """
+    Test that a response stored after the backfill read its row is not
+    overwritten with the value that was read.
+    """
+    db = sessionmaker(bind=engine)()
+    try:
+        query = database.reserve_query(db, 1, "q", test_model, {**test_parameters, "stop": ["###"] * 20})
+        raw_rows = compression._raw_rows
+
+        def read_then_complete(*args):
+            rows = list(raw_rows(*args))
+            database.complete_query(db, query.id, test_response)
+            return rows
+
+        with patch.object(settings, "STORAGE_COMPRESSION_MIN_BYTES", 64), patch.object(compression, "_raw_rows", read_then_complete):
+            stats = backfill(engine, codec="zlib")
+        assert (stats["rewritten"], stats["skipped"]) == (1, 0)
+        db.expire_all()
+        assert db.get(models.Query, query.id).response == test_response
+        assert db.get(models.Query, query.id).parameters["stop"] == ["###"] * 20
+        with engine.connect() as conn:
+            assert is_compressed(conn.execute(text("SELECT parameters FROM queries")).scalar_one())
+    finally:
+        db.close()
+
+@pytest.mark.skipif(compression.zstandard is None, reason="zstandard is not installed")
+def test_zstd_round_trips():
+    """
+    Test the zstd codec.
+    """
+    data = test_response.encode()
+    with patch.object(settings, "STORAGE_ZSTD_DICT_PATH", None):
+        stored = compress(data, codec="zstd")
+        assert is_compressed(stored) and decompress(stored) == data
@@ -0,0 +1,197 @@
+import asyncio
+
+import pytest
+from unittest.mock import patch
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core.database import database, models
+from core.utils.utils import hash_password
+
+# Test data
+test_user_data = {
+    "username": "testuser",
+    "password": "testpassword",
+}
+test_query_data = {
+    "user_id": 1,
+    "query_text": "What is the meaning of life?",
+    "model": "text-davinci-003",
+    "parameters": {"temperature": 0.7, "max_tokens": 256},
+    "response": "The meaning of life is a profound question...",
+}
+
+@pytest.fixture(scope="function")
+def run_with_db(tmp_path):
+    """
+    Fixture running a coroutine function against a fresh aiosqlite database.
+    """
+    def run(test):
+        async def main():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+            async with engine.begin() as conn:
+                await conn.run_sync(models.Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            try:
+                async with session_factory() as db:
+                    return await test(db)
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
+
+def test_acreate_and_authenticate_user(run_with_db):
+    """
+    Test async user creation and authentication.
+    """
+    async def test(db):
+        new_user = await database.acreate_user(
+            db, username=test_user_data["username"], password=hash_password(test_user_data["password"])
+        )
+        authenticated = await database.aauthenticate_user(
+            db, username=test_user_data["username"], password=test_user_data["password"]
+        )
+        rejected = await database.aauthenticate_user(db, username=test_user_data["username"], password="wrong")
+        return new_user, authenticated, rejected
+
+    new_user, authenticated, rejected = run_with_db(test)
+    assert authenticated.id == new_user.id
+    assert rejected is None
+
+def test_astore_and_get_response_by_id(run_with_db):
+    """
+    Test storing a query asynchronously and reading its response back.
+    """
+    async def test(db):
+        new_query = await database.astore_query_and_response(db, **test_query_data)
+        return (
+            await database.aget_response_by_id(db, query_id=new_query.id),
+            await database.aget_response_by_id(db, query_id=999),
+        )
+
+    response, missing = run_with_db(test)
+    assert response == test_query_data["response"]
+    assert missing is None
+
+def test_aget_user_queries(run_with_db):
+    """
+    Test retrieving a user's queries asynchronously.
+    """
+    async def test(db):
+        new_query = await database.astore_query_and_response(db, **test_query_data)
+        return new_query, await database.aget_user_queries(db, user_id=test_query_data["user_id"])
+
+    new_query, user_queries = run_with_db(test)
+    assert [query.id for query in user_queries] == [new_query.id]
+
+def test_astore_queries_and_responses(run_with_db):
+    """
+    Test that a batch of rows is stored in one call and IDs come back in order.
+    """
+    async def test(db):
+        items = [
+            {key: value for key, value in test_query_data.items() if key != "user_id"} | {"query_text": f"query {i}"}
+            for i in range(5)
+        ]
+        query_ids = await database.astore_queries_and_responses(db, test_query_data["user_id"], items)
+        assert len(query_ids) == 5
+        for i, query_id in enumerate(query_ids):
+            query = await db.get(models.Query, query_id)
+            assert query.query_text == f"query {i}"
+        assert await database.astore_queries_and_responses(db, test_query_data["user_id"], []) == []
+
+    run_with_db(test)
+
+def test_get_response_endpoint_hides_other_users_queries(tmp_path):
+    """
+    Test that `/response/{query_id}` serves the owner's response and answers
+    404 to any other user, also once the response is cached.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.pool import NullPool
+
+    from api import routes
+    from core.services import cache
+    from core.services.cache import LRUCache, ReadThroughCache
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        async with session_factory() as db:
+            return (await database.astore_query_and_response(db, **test_query_data)).id
+
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    query_id = asyncio.run(setup())
+    current_user = {"id": test_query_data["user_id"]}
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.dependency_overrides[routes.get_current_user_id] = lambda: current_user["id"]
+    app.dependency_overrides[database.get_async_db] = get_db
+    with patch.object(cache, "_query_cache", ReadThroughCache(local=LRUCache(max_entries=8))):
+        client = TestClient(app)
+        assert client.get(f"/response/{query_id}").json() == {"response": test_query_data["response"]}
+        current_user["id"] = 2
+        assert client.get(f"/response/{query_id}").status_code == 404
+        assert client.get("/response/999").status_code == 404
+    asyncio.run(engine.dispose())
+
+def test_stream_endpoint_sends_fragments_then_done_or_error(tmp_path):
+    """
+    Test that `/query/stream` sends each fragment, stores the joined response
+    and ends with a `done` event, or ends with an `error` event when upstream fails.
+    """
+    import openai
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.pool import NullPool
+    from unittest.mock import AsyncMock
+
+    from api import routes
+    from core.services.openai_service import OpenAIService
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+
+    async def chunks():
+        for text in ("The meaning", " of life"):
+            yield {"choices": [{"text": text}]}
+
+    async def stored_response(query_id):
+        async with session_factory() as db:
+            return (await db.get(models.Query, query_id)).response
+
+    asyncio.run(setup())
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.dependency_overrides[routes.get_current_user_id] = lambda: test_query_data["user_id"]
+    request = {"query": test_query_data["query_text"], "parameters": test_query_data["parameters"]}
+    service = OpenAIService(cache=None)
+    with patch.object(routes, "openai_service", service), patch.object(database, "AsyncSessionLocal", session_factory):
+        client = TestClient(app)
+        with patch("openai.Completion.acreate", AsyncMock(return_value=chunks())):
+            body = client.post("/query/stream", json=request).text
+        assert body == (
+            'data: {"text": "The meaning"}\n\n'
+            'data: {"text": " of life"}\n\n'
+            'event: done\ndata: {"query_id": 1}\n\n'
+        )
+        assert asyncio.run(stored_response(1)) == "The meaning of life"
+
+        failure = openai.error.InvalidRequestError("Bad prompt", param="prompt")
+        with patch("openai.Completion.acreate", AsyncMock(side_effect=failure)):
+            body = client.post("/query/stream", json=request).text
+        assert body == 'event: error\ndata: {"detail": "Bad prompt"}\n\n'
+    asyncio.run(service.aclose())
+    asyncio.run(engine.dispose())
@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import hmac
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import fakeredis  # 2.26.1: In-memory Redis stand-in for tests
+import openai
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, StaticPool
+
+from core.database import database, models
+from core.services import jobs
+from core.services.jobs import JobWorkerPool, RedisJobBroker, SQLiteJobBroker
+from core.services.rate_limit import RateLimitExceeded
+
+# Test data
+test_model = "text-davinci-003"
+
+def payload(query: str, webhook_url=None):
+    return {"query": query, "model": test_model, "parameters": {}, "user_id": 1, "webhook_url": webhook_url}
+
+@pytest.fixture(params=["sqlite", "redis"])
+def broker(request, tmp_path):
+    """
+    Fixture providing each job broker implementation.
+    """
+    if request.param == "sqlite":
+        return SQLiteJobBroker(str(tmp_path / "jobs.db"))
+    return RedisJobBroker(fakeredis.FakeRedis(), prefix="test-jobs:")
+
+@pytest.fixture
+def session_factory():
+    """
+    Fixture providing sessions on an in-memory database.
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def test_reserve_orders_by_priority_then_submission(broker):
+    """
+    Test that higher priorities are reserved first, and equal priorities in submission order.
+    """
+    broker.enqueue(1, payload("a"), priority=1)
+    broker.enqueue(2, payload("b"), priority=9)
+    broker.enqueue(3, payload("c"), priority=1)
+    broker.enqueue(4, payload("d"), priority=9)
+    reserved = [broker.reserve(60) for _ in range(4)]
+    assert [job.id for job in reserved] == [2, 4, 1, 3]
+    assert reserved[0].payload == payload("b")
+    assert reserved[0].status == jobs.RUNNING and reserved[0].attempts == 1
+    assert broker.reserve(60) is None
+
+def test_expired_lease_is_redelivered(broker):
+    """
+    Test that an unacknowledged job is handed out again after its visibility timeout, and the old lease is void.
+    """
+    broker.enqueue(1, payload("a"))
+    first = broker.reserve(0.05)
+    assert broker.reserve(0.05) is None
+    time.sleep(0.1)
+    second = broker.reserve(60)
+    assert (second.id, second.attempts) == (1, 2)
+    assert not broker.complete(first)
+    assert broker.complete(second)
+    assert broker.get(1).status == jobs.SUCCEEDED
+    assert broker.reserve(60) is None
+
+def test_fail_requeues_with_delay_or_finishes(broker):
+    """
+    Test that a failed attempt is retried after its delay, and a final failure keeps the error.
+    """
+    broker.enqueue(1, payload("a"))
+    assert broker.fail(broker.reserve(60), "busy", retry_delay=0.05)
+    assert broker.get(1).status == jobs.QUEUED
+    assert broker.reserve(60) is None
+    time.sleep(0.1)
+    job = broker.reserve(60)
+    assert job.attempts == 2
+    assert broker.fail(job, "broken")
+    assert (broker.get(1).status, broker.get(1).error) == (jobs.FAILED, "broken")
+    assert broker.reserve(60) is None
+
+def make_pool(broker, service, session_factory, **kwargs):
+    return JobWorkerPool(broker, service, workers=1, retry_delay=0.01, session_factory=session_factory, cache=MagicMock(), **kwargs)
+
+def reserved_query(session_factory):
+    db = session_factory()
+    try:
+        return database.reserve_query(db, 1, "hello", test_model, {}).id
+    finally:
+        db.close()
+
+@patch.object(jobs, "send_webhook", return_value=True)
+def test_pool_stores_result_and_calls_webhook(send_webhook, broker, session_factory):
+    """
+    Test that a processed job fills in its query row, caches the response, succeeds and calls its webhook.
+    """
+    service = MagicMock()
+    service.process_query.return_value = "world"
+    query_id = reserved_query(session_factory)
+    broker.enqueue(query_id, payload("hello", "https://example.com/hook"))
+    pool = make_pool(broker, service, session_factory)
+    assert pool.run_once()
+    assert not pool.run_once()
+    service.process_query.assert_called_once_with("hello", test_model, {}, user_id=1, usage={})
+    db = session_factory()
+    try:
+        assert database.get_response_by_id(db, query_id) == "world"
+    finally:
+        db.close()
+    pool.cache.assert_called_once_with(database.response_cache_key(query_id, 1), "world")
+    assert broker.get(query_id).status == jobs.SUCCEEDED
+    send_webhook.assert_called_once_with(
+        "https://example.com/hook", {"query_id": query_id, "status": jobs.SUCCEEDED, "response": "world"}
+    )
+
+@patch.object(jobs, "send_webhook", return_value=True)
+def test_pool_retries_transient_errors_then_fails(send_webhook, broker, session_factory):
+    """
+    Test that transient errors are retried up to the attempt limit, and then reported once.
+    """
+    service = MagicMock()
+    service.process_query.side_effect = RateLimitExceeded("slow down", retry_after=0.01)
+    broker.enqueue(7, payload("hello", "https://example.com/hook"))
+    pool = make_pool(broker, service, session_factory, max_attempts=2)
+    assert pool.run_once()
+    assert broker.get(7).status == jobs.QUEUED
+    send_webhook.assert_not_called()
+    time.sleep(0.05)
+    assert pool.run_once()
+    assert (broker.get(7).status, broker.get(7).attempts) == (jobs.FAILED, 2)
+    assert pool.counters["retried"] == 1 and pool.counters["failed"] == 1
+    send_webhook.assert_called_once_with(
+        "https://example.com/hook", {"query_id": 7, "status": jobs.FAILED, "error": "slow down"}
+    )
+
+def test_pool_fails_permanent_errors_at_once(broker, session_factory):
+    """
+    Test that errors a retry cannot fix fail the job on the first attempt.
+    """
+    service = MagicMock()
+    service.process_query.side_effect = openai.error.InvalidRequestError("bad prompt", param="prompt")
+    broker.enqueue(1, payload("hello"))
+    pool = make_pool(broker, service, session_factory)
+    assert pool.run_once()
+    assert (broker.get(1).status, broker.get(1).error) == (jobs.FAILED, "bad prompt")
+
+def test_worker_threads_drain_queue(broker, session_factory):
+    """
+    Test that started workers pick up submitted jobs and stop cleanly.
+    """
+    service = MagicMock()
+    service.process_query.side_effect = lambda query, *args, **kwargs: query.upper()
+    pool = make_pool(broker, service, session_factory, poll_interval=0.01).start()
+    try:
+        for i in range(1, 6):
+            broker.enqueue(i, payload(f"q{i}"))
+        pool.notify()
+        deadline = time.monotonic() + 5
+        while pool.counters["succeeded"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pool.stop(timeout=5)
+    assert pool.counters["succeeded"] == 5
+    assert all(broker.get(i).status == jobs.SUCCEEDED for i in range(1, 6))
+
+def resolve_to(*addresses):
+    """Patches DNS resolution so every host resolves to `addresses`."""
+    return patch.object(
+        jobs.socket, "getaddrinfo", return_value=[(socket.AF_INET, socket.SOCK_STREAM, 6, "", (a, 0)) for a in addresses]
+    )
+
+@patch.object(jobs.settings, "WEBHOOK_ALLOWED_HOSTS", ["hooks.example.com"])
+def test_validate_webhook_url():
+    """
+    Test that only http(s) URLs on allowed hosts are accepted.
+    """
+    with resolve_to("93.184.216.34"):
+        jobs.validate_webhook_url("https://hooks.example.com/done")
+        for url in ("ftp://hooks.example.com/done", "not a url", "https://evil.example.com/done"):
+            with pytest.raises(ValueError):
+                jobs.validate_webhook_url(url)
+
+def test_validate_webhook_url_refuses_internal_addresses():
+    """
+    Test that hosts resolving to loopback, private, link-local or reserved
+    addresses are refused unless private addresses are allowed.
+    """
+    for address in ("127.0.0.1", "10.0.0.5", "192.168.1.1", "169.254.169.254", "0.0.0.0", "::1", "fd00::1", "240.0.0.1"):
+        with resolve_to("93.184.216.34", address), pytest.raises(ValueError):
+            jobs.validate_webhook_url("http://hooks.example.com:6379/")
+    with patch.object(jobs.settings, "WEBHOOK_ALLOW_PRIVATE_ADDRESSES", True), resolve_to("127.0.0.1"):
+        jobs.validate_webhook_url("http://localhost:8080/done")
+
+@patch.object(jobs.settings, "WEBHOOK_SECRET", "s3cret")
+@patch("requests.Session.post")
+def test_send_webhook_signs_and_retries(mock_post):
+    """
+    Test that webhooks carry an HMAC signature of the body and are retried on server errors.
+    """
+    mock_post.side_effect = [MagicMock(status_code=502, ok=False), MagicMock(status_code=200, ok=True)]
+    with patch.object(jobs.time, "sleep"), resolve_to("93.184.216.34"):
+        assert jobs.send_webhook("https://hooks.example.com/done", {"query_id": 1})
+    assert mock_post.call_count == 2
+    kwargs = mock_post.call_args.kwargs
+    expected = hmac.new(b"s3cret", kwargs["data"], hashlib.sha256).hexdigest()
+    assert kwargs["headers"]["X-Webhook-Signature"] == f"sha256={expected}"
+    assert kwargs["allow_redirects"] is False
+
+@patch("requests.Session.post")
+def test_send_webhook_revalidates_and_rejects_redirects(mock_post):
+    """
+    Test that the URL is checked again at send time and redirects are not delivered.
+    """
+    with resolve_to("127.0.0.1"):
+        assert not jobs.send_webhook("https://hooks.example.com/done", {"query_id": 1})
+    mock_post.assert_not_called()
+    mock_post.return_value = MagicMock(status_code=302, ok=True)
+    with resolve_to("93.184.216.34"):
+        assert not jobs.send_webhook("https://hooks.example.com/done", {"query_id": 1})
+    mock_post.assert_called_once()
+
+def test_send_webhook_connects_only_to_checked_addresses():
+    """
+    Test that a host resolving to a public address when validated and to an
+    internal one when connected to is refused without connecting.
+    """
+    public = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", 0))]
+    internal = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", 0))]
+    with patch.object(jobs.socket, "getaddrinfo", side_effect=[public, internal]), patch.object(
+        jobs.HTTPConnection, "_new_conn"
+    ) as new_conn:
+        assert not jobs.send_webhook("http://hooks.example.com/done", {"query_id": 1}, attempts=1)
+    new_conn.assert_not_called()
+
+@patch.object(jobs.settings, "WEBHOOK_ALLOW_PRIVATE_ADDRESSES", True)
+def test_send_webhook_delivers():
+    """
+    Test that webhooks reach the receiver through the address-checking session.
+    """
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(self.rfile.read(int(self.headers["Content-Length"])))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.handle_request, daemon=True)
+    thread.start()
+    try:
+        assert jobs.send_webhook(f"http://127.0.0.1:{server.server_port}/done", {"query_id": 1}, attempts=1)
+    finally:
+        thread.join(5)
+        server.server_close()
+    assert received == [b'{"query_id": 1}']
+
+def test_job_routes(tmp_path):
+    """
+    Test submitting a job, processing it, and polling its result through the API.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from api import routes
+
+    path = tmp_path / "queries.db"
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+
+    async def get_async_db():
+        async with async_sessionmaker(async_engine, expire_on_commit=False)() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.dependency_overrides[database.get_async_db] = get_async_db
+    app.dependency_overrides[routes.get_current_user_id] = lambda: 1
+    client = TestClient(app)
+    broker = SQLiteJobBroker(str(tmp_path / "jobs.db"))
+    try:
+        with patch.object(jobs, "_broker", None), patch.object(jobs.settings, "JOBS_ENABLED", False):
+            assert client.post("/jobs", json={"query": "hello"}).status_code == 503
+        with patch.object(jobs, "_broker", broker):
+            assert client.post("/jobs", json={"query": "hello", "webhook_url": "file:///etc/passwd"}).status_code == 400
+            assert client.post("/jobs", json={"query": "hello", "priority": 10}).status_code == 422
+
+            submitted = client.post("/jobs", json={"query": "hello", "priority": 7})
+            assert submitted.status_code == 202
+            query_id = submitted.json()["query_id"]
+            assert client.get(f"/jobs/{query_id}").json()["status"] == jobs.QUEUED
+
+            service = MagicMock()
+            service.process_query.return_value = "world"
+            assert make_pool(broker, service, sessionmaker(bind=engine)).run_once()
+            assert client.get(f"/jobs/{query_id}").json() == {
+                "query_id": query_id, "status": jobs.SUCCEEDED, "attempts": 1, "response": "world", "error": None
+            }
+
+            app.dependency_overrides[routes.get_current_user_id] = lambda: 2
+            assert client.get(f"/jobs/{query_id}").status_code == 404
+    finally:
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
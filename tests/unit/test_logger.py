@@ -0,0 +1,93 @@
+import json
+import logging
+import threading
+
+from core.utils.logger import DroppingQueueHandler, JsonFormatter, SamplingFilter, attach_queue, logger
+
+def make_record(level: int = logging.INFO, msg: str = "hello %s", args: tuple = ("world",), **extra) -> logging.LogRecord:
+    record = logging.LogRecord("test", level, __file__, 10, msg, args, None, func="test_func")
+    record.__dict__.update(extra)
+    return record
+
+def test_module_logger_is_configured_root_logger():
+    """
+    Test that the module-level logger is a real logging.Logger other modules propagate to.
+    """
+    assert logger is logging.getLogger()
+    assert any(isinstance(handler, DroppingQueueHandler) for handler in logger.handlers)
+
+def test_json_formatter_includes_extra_fields():
+    """
+    Test that JSON output has the standard fields and anything passed with `extra=`.
+    """
+    entry = json.loads(JsonFormatter().format(make_record(query_id=42)))
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["function"] == "test_func"
+    assert entry["query_id"] == 42
+    assert "args" not in entry
+
+def test_sampling_filter_only_samples_debug():
+    """
+    Test that the sample rate applies to DEBUG records and per-call overrides.
+    """
+    sampler = SamplingFilter(0.0)
+    assert not sampler.filter(make_record(logging.DEBUG))
+    assert sampler.filter(make_record(logging.INFO))
+    assert not sampler.filter(make_record(logging.INFO, sample_rate=0.0))
+
+    sampler = SamplingFilter(0.1)
+    kept = sum(sampler.filter(make_record(logging.DEBUG)) for _ in range(10000))
+    assert 700 < kept < 1300
+
+def test_queue_delivers_records_off_thread(tmp_path):
+    """
+    Test that records reach the file handler from the listener thread, formatted lazily.
+    """
+    path = tmp_path / "app.log"
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(threadName)s %(message)s"))
+    writer_threads = []
+    emit = handler.emit
+    handler.emit = lambda record: writer_threads.append(threading.current_thread()) or emit(record)
+
+    target = logging.getLogger("tests.logger.queue")
+    target.propagate = False
+    target.setLevel(logging.INFO)
+    listener = attach_queue(target, [handler])
+    try:
+        for i in range(100):
+            target.info("message %d", i)
+        target.debug("not logged %s", object())
+    finally:
+        listener.stop()
+        target.handlers.clear()
+        handler.close()
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 100
+    assert lines[-1].endswith("message 99")
+    assert threading.current_thread() not in writer_threads
+
+def test_full_queue_drops_instead_of_blocking():
+    """
+    Test that a full queue counts dropped records rather than blocking the caller.
+    """
+    target = logging.getLogger("tests.logger.full")
+    target.propagate = False
+    blocked = threading.Event()
+
+    class SlowHandler(logging.Handler):
+        def emit(self, record):
+            blocked.wait(5)
+
+    listener = attach_queue(target, [SlowHandler()], queue_size=2)
+    try:
+        for _ in range(50):
+            target.warning("burst")
+        queue_handler = next(h for h in target.handlers if isinstance(h, DroppingQueueHandler))
+        assert queue_handler.dropped >= 45
+    finally:
+        blocked.set()
+        listener.stop()
+        target.handlers.clear()
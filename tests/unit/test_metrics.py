@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from api import routes
+from core.database import database, models
+from core.services.cache import LRUCache, ResponseCache
+from core.utils import metrics, utils
+
+# Test data
+test_query_data = {
+    "user_id": 1,
+    "query_text": "What is the meaning of life?",
+    "model": "text-davinci-003",
+    "parameters": {"temperature": 0.7, "max_tokens": 256},
+    "response": "The meaning of life is a profound question...",
+}
+
+@pytest.fixture
+def enabled_metrics():
+    """
+    Fixture turning metrics collection on with a fresh registry for one test.
+    """
+    metrics.configure(True)
+    try:
+        yield metrics
+    finally:
+        metrics.configure(False)
+
+def sample(name: str, **labels) -> float:
+    return metrics.registry.get_sample_value(name, labels) or 0.0
+
+def test_disabled_metrics_are_noops():
+    """
+    Test that instrumentation does nothing while collection is disabled.
+    """
+    metrics.configure(False)
+    assert metrics.timer(metrics.UPSTREAM_LATENCY, outcome=True, model="m") is metrics._NOOP_TIMER
+    with metrics.timer(metrics.DB_COMMIT_LATENCY, operation="store_query"):
+        pass
+    metrics.count_cache_lookup("response", True)
+    assert metrics.render()[0] == b""
+
+def test_timer_records_outcome(enabled_metrics):
+    """
+    Test that timers observe durations labelled with the block's outcome.
+    """
+    with metrics.timer(metrics.UPSTREAM_LATENCY, outcome=True, model="m"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.timer(metrics.UPSTREAM_LATENCY, outcome=True, model="m"):
+            raise RuntimeError("upstream failed")
+    assert sample("upstream_completion_seconds_count", model="m", outcome="ok") == 1
+    assert sample("upstream_completion_seconds_count", model="m", outcome="error") == 1
+
+def test_cache_hit_ratio(enabled_metrics):
+    """
+    Test that response cache lookups are counted as hits and misses.
+    """
+    cache = ResponseCache(local=LRUCache())
+    cache.get("key")
+    cache.set("key", "value")
+    cache.get("key")
+    asyncio.run(cache.aget("key"))
+    assert sample("cache_lookups_total", cache="response", result="hit") == 2
+    assert sample("cache_lookups_total", cache="response", result="miss") == 1
+
+def test_store_query_and_password_hashing_are_timed(enabled_metrics, tmp_path):
+    """
+    Test that DB commits and bcrypt operations land in their histograms.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        database.store_query_and_response(db, **test_query_data)
+    finally:
+        db.close()
+        engine.dispose()
+    assert sample("db_commit_seconds_count", operation="store_query") == 1
+
+    utils.check_password("testpassword", utils.hash_password("testpassword"))
+    assert sample("password_hash_seconds_count", operation="hash") == 1
+    assert sample("password_hash_seconds_count", operation="check") == 1
+
+def test_route_latency_and_metrics_endpoint(enabled_metrics):
+    """
+    Test that requests are recorded per route template and exposed on /metrics.
+    """
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(routes.router)
+    client = TestClient(app)
+
+    assert client.get("/response/1").status_code == 401
+    assert client.get("/response/2").status_code == 401
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_seconds_count{method="GET",route="/response/{query_id}",status="401"} 2.0' in response.text
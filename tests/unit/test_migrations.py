@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from core.database import migrations
+from core.database.compression import compress
+from core.services.cache import content_hash
+from core.services.tokens import count_tokens
+
+# Schema of the queries table before content_hash and its indexes existed
+legacy_schema = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, password VARCHAR)",
+    "CREATE TABLE queries (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), query_text VARCHAR, "
+    "model VARCHAR, parameters JSON, response VARCHAR, timestamp DATETIME)",
+]
+
+@pytest.fixture(scope="function")
+def legacy_engine(tmp_path):
+    """
+    Fixture providing a SQLite database with the legacy schema and a few rows.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with engine.begin() as conn:
+        for statement in legacy_schema:
+            conn.execute(text(statement))
+        conn.execute(
+            text("INSERT INTO queries (user_id, query_text, model, parameters, response) VALUES (1, :q, 'm', '{}', 'r')"),
+            [{"q": f"query {i}"} for i in range(3)],
+        )
+    yield engine
+    engine.dispose()
+
+def test_upgrade_adds_indexes_and_backfills_hashes(legacy_engine):
+    """
+    Test that migrating a legacy database adds the new column, indexes and hashes.
+    """
+    applied = migrations.upgrade(legacy_engine)
+    assert applied == [version for version, _ in migrations.MIGRATIONS]
+
+    inspector = inspect(legacy_engine)
+    index_names = {index["name"] for index in inspector.get_indexes("queries")}
+    assert {"ix_queries_user_id_timestamp", "ix_queries_content_hash"} <= index_names
+
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(text("SELECT query_text, content_hash FROM queries ORDER BY id")).all()
+    assert [row.content_hash for row in rows] == [content_hash("m", row.query_text, {}) for row in rows]
+
+def test_upgrade_backfills_token_counts(legacy_engine):
+    """
+    Test that migrating a legacy database records token counts for existing rows.
+    """
+    migrations.upgrade(legacy_engine)
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(text("SELECT query_text, response, prompt_tokens, completion_tokens FROM queries")).all()
+    assert [(row.prompt_tokens, row.completion_tokens) for row in rows] == [
+        (count_tokens(row.query_text, "m"), count_tokens(row.response, "m")) for row in rows
+    ]
+
+def test_upgrade_decodes_existing_parameters_and_responses(legacy_engine):
+    """
+    Test that the backfills read parameters and responses in every stored form.
+    """
+    parameters = {"temperature": 0.2}
+    with legacy_engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO queries (user_id, query_text, model, parameters, response) VALUES (1, :q, 'm', :p, :r)"),
+            [
+                {"q": "plain", "p": '{"temperature": 0.2}', "r": "a plain response"},
+                {"q": "compressed", "p": compress(b'{"temperature": 0.2}'), "r": compress(b"a compressed response")},
+            ],
+        )
+    migrations.upgrade(legacy_engine)
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT query_text, content_hash, completion_tokens FROM queries WHERE query_text IN ('plain', 'compressed')")
+        ).all()
+    assert {row.query_text: row.content_hash for row in rows} == {
+        "plain": content_hash("m", "plain", parameters),
+        "compressed": content_hash("m", "compressed", parameters),
+    }
+    assert {row.query_text: row.completion_tokens for row in rows} == {
+        "plain": count_tokens("a plain response", "m"),
+        "compressed": count_tokens("a compressed response", "m"),
+    }
+
+def test_stored_values_parsed_by_the_driver():
+    """
+    Test that JSON values the Postgres driver already parsed are used as they are.
+    """
+    assert migrations._stored_json({"temperature": 0.2}) == {"temperature": 0.2}
+    assert migrations._stored_text({"temperature": 0.2}) == '{"temperature": 0.2}'
+
+def test_upgrade_is_idempotent(legacy_engine):
+    """
+    Test that a second upgrade applies nothing.
+    """
+    migrations.upgrade(legacy_engine)
+    assert migrations.upgrade(legacy_engine) == []
+
+def test_upgrade_on_fresh_database(tmp_path):
+    """
+    Test that migrations build a complete schema from an empty database.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrations.upgrade(engine)
+    assert {"users", "queries", "schema_migrations"} <= set(inspect(engine).get_table_names())
+    engine.dispose()
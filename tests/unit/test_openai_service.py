@@ -1,6 +1,11 @@
+import asyncio
 import pytest
+import openai
+import requests
 from unittest.mock import patch
-from core.services.openai_service import OpenAIService  # Version 1.52.0
+from benchmarks.stub_server import StubCompletionServer
+from config.settings import settings
+from core.services.openai_service import OpenAIService  # Version 0.28.1
 
 # Test data
 test_query = "What is the meaning of life?"
@@ -30,6 +35,7 @@ def test_process_query_success(mock_create, openai_service: OpenAIService):
         top_p=test_parameters.get("top_p"),
         frequency_penalty=test_parameters.get("frequency_penalty"),
         presence_penalty=test_parameters.get("presence_penalty"),
+        request_timeout=pytest.approx(settings.OPENAI_TIMEOUT, abs=1),
     )
 
 @patch("openai.Completion.create")
@@ -76,4 +82,141 @@ def test_openai_service_init(openai_service: OpenAIService):
     This test verifies that the OpenAIService is initialized with the correct
     API key from settings.
     """
-    assert openai_service.api_key == "sk-your-openai-api-key" # Replace with your API key
\ No newline at end of file
+    assert openai_service.api_key == "sk-your-openai-api-key" # Replace with your API key
+
+# Async path against the local stub server
+@pytest.fixture
+def stub_server():
+    """
+    Fixture serving the stub completion endpoint and pointing settings at it.
+    """
+    server = StubCompletionServer(("127.0.0.1", 0), latency=0.01).start()
+    original_api_base = settings.OPENAI_API_BASE
+    settings.OPENAI_API_BASE = server.base_url
+    try:
+        yield server
+    finally:
+        settings.OPENAI_API_BASE = original_api_base
+        openai.api_base = original_api_base
+        server.stop()
+
+def test_aprocess_query_success(stub_server):
+    """
+    Test that `aprocess_query` returns the completion text from the upstream.
+    """
+    service = OpenAIService()
+
+    async def run():
+        try:
+            return await service.aprocess_query(test_query, model=test_model, parameters=test_parameters)
+        finally:
+            await service.aclose()
+
+    assert asyncio.run(run()) == StubCompletionServer.completion_text(test_query)
+
+def test_aprocess_query_reuses_pooled_session(stub_server):
+    """
+    Test that concurrent async queries share one long-lived HTTP session.
+    """
+    service = OpenAIService()
+
+    async def run():
+        try:
+            session = service.async_session
+            responses = await asyncio.gather(
+                *(service.aprocess_query(f"{test_query} {i}", parameters=test_parameters) for i in range(20))
+            )
+            assert service.async_session is session
+            return responses
+        finally:
+            await service.aclose()
+
+    responses = asyncio.run(run())
+    assert responses == [StubCompletionServer.completion_text(f"{test_query} {i}") for i in range(20)]
+    assert stub_server.request_count == 20
+
+def test_astream_query_yields_fragments(stub_server):
+    """
+    Test that `astream_query` yields fragments that join into the full completion.
+    """
+    service = OpenAIService()
+
+    async def run():
+        try:
+            return [text async for text in service.astream_query(test_query, model=test_model, parameters=test_parameters)]
+        finally:
+            await service.aclose()
+
+    fragments = asyncio.run(run())
+    assert len(fragments) > 1
+    assert "".join(fragments) == StubCompletionServer.completion_text(test_query)
+
+def test_stream_query_yields_fragments(stub_server):
+    """
+    Test that the sync `stream_query` generator streams the same fragments.
+    """
+    service = OpenAIService()
+    fragments = list(service.stream_query(test_query, model=test_model, parameters=test_parameters))
+    assert fragments == StubCompletionServer.completion_tokens(test_query)
+
+def test_aprocess_queries_preserves_order(stub_server):
+    """
+    Test that `aprocess_queries` returns one completion per query in input order.
+    """
+    service = OpenAIService()
+    queries = [f"{test_query} {i}" for i in range(12)]
+
+    async def run():
+        try:
+            return await service.aprocess_queries(
+                queries[:6] + [{"query": query, "model": test_model} for query in queries[6:]],
+                parameters=test_parameters,
+                concurrency=3,
+            )
+        finally:
+            await service.aclose()
+
+    assert asyncio.run(run()) == [StubCompletionServer.completion_text(query) for query in queries]
+    assert stub_server.request_count == 12
+
+def test_aprocess_queries_bounds_concurrency_and_returns_partial_results():
+    """
+    Test that at most `concurrency` queries run at once and failures are returned in place.
+    """
+    service = OpenAIService()
+    in_flight = 0
+    peak = 0
+
+    async def fake_aprocess_query(query, model, parameters, timeout, user_id, usage=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if query == "fail":
+            raise openai.error.APIError("Test API error")
+        return query.upper()
+
+    with patch.object(service, "aprocess_query", side_effect=fake_aprocess_query):
+        results = asyncio.run(service.aprocess_queries(["a", "fail", "b", "c", "d"], concurrency=2))
+
+    assert results[0] == "A"
+    assert isinstance(results[1], openai.error.APIError)
+    assert results[2:] == ["B", "C", "D"]
+    assert peak == 2
+
+@patch("openai.Completion.create")
+def test_process_queries_returns_partial_results(mock_create, openai_service: OpenAIService):
+    """
+    Test that the sync `process_queries` keeps order and reports failures per query.
+    """
+    def create(engine, prompt, **params):
+        if prompt == "fail":
+            raise requests.exceptions.RequestException("Test network error")
+        return {"choices": [{"text": prompt.upper()}]}
+
+    mock_create.side_effect = create
+    results = openai_service.process_queries(["a", "fail", {"query": "b", "model": test_model}], concurrency=2)
+    assert results[0] == "A"
+    assert isinstance(results[1], requests.exceptions.RequestException)
+    assert results[2] == "B"
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from core.database import database, models
+
+# Test data
+test_user_id = 1
+base_time = datetime(2024, 1, 1)
+
+@pytest.fixture(scope="function")
+def db(tmp_path):
+    """
+    Fixture providing a session on a SQLite database seeded with 25 queries.
+
+    Pairs of rows share a timestamp so pagination must break ties on id.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    models.Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    session.add_all(
+        models.Query(
+            user_id=test_user_id if i < 25 else 2,
+            query_text=f"query {i}",
+            model="text-davinci-003",
+            parameters={},
+            response=f"response {i}",
+            timestamp=base_time + timedelta(minutes=i // 2),
+        )
+        for i in range(30)
+    )
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+def test_keyset_pages_cover_history_once(db):
+    """
+    Test that following cursors visits every query exactly once, newest first.
+    """
+    seen, cursor = [], None
+    while True:
+        page, cursor = database.get_user_queries_page(db, test_user_id, limit=10, cursor=cursor)
+        seen.extend(query.id for query in page)
+        if cursor is None:
+            break
+    assert seen == list(range(25, 0, -1))
+
+def test_summary_page_defers_response(db):
+    """
+    Test that summary mode loads only id, model and timestamp up front.
+    """
+    page, _ = database.get_user_queries_page(db, test_user_id, limit=5, summary=True)
+    unloaded = inspect(page[0]).unloaded
+    assert {"response", "query_text", "parameters"} <= unloaded
+    assert page[0].response == "response 24"
+
+def test_invalid_cursor_is_rejected(db):
+    """
+    Test that a malformed cursor raises ValueError.
+    """
+    with pytest.raises(ValueError):
+        database.get_user_queries_page(db, test_user_id, cursor="not-a-cursor")
+
+def test_iter_user_queries_streams_everything(db):
+    """
+    Test that the streaming iterator yields the user's full history in order.
+    """
+    ids = [query.id for query in database.iter_user_queries(db, test_user_id, batch_size=4)]
+    assert ids == list(range(25, 0, -1))
@@ -0,0 +1,129 @@
+import asyncio
+
+import fakeredis  # 2.26.1: In-memory Redis stand-in for tests
+import pytest
+import redis
+from unittest.mock import AsyncMock, patch
+
+from core.services.openai_service import OpenAIService
+from core.services.rate_limit import RateLimiter, RateLimitExceeded, RedisRateLimiter, estimate_tokens
+
+# Test data
+test_model = "text-davinci-003"
+test_query = "What is the meaning of life?"
+
+def test_estimate_tokens():
+    """
+    Test that token estimates cover prompt length plus the requested completion.
+    """
+    assert estimate_tokens("abcdefgh", 10) == 13
+    assert estimate_tokens(["abcd", "abcd"], 10) == 24
+    assert estimate_tokens("") == 1
+
+def test_unlimited_by_default():
+    """
+    Test that a limiter without limits never waits.
+    """
+    limiter = RateLimiter()
+    with patch("time.sleep") as sleep:
+        for _ in range(1000):
+            assert limiter.acquire(test_model, 100, user_id=1) == 0
+    sleep.assert_not_called()
+
+def test_bursts_are_queued_smoothly():
+    """
+    Test that requests beyond the bucket wait in turn instead of failing.
+    """
+    limiter = RateLimiter(model_limits={test_model: (60, 0)}, max_wait=5)
+    with patch("time.sleep") as sleep:
+        waits = [limiter.acquire(test_model) for _ in range(63)]
+    assert waits[:60] == [0] * 60
+    assert waits[60:] == pytest.approx([1, 2, 3], abs=0.05)
+    assert [call.args[0] for call in sleep.call_args_list] == waits[60:]
+    stats = limiter.stats()
+    assert stats["delayed"] == 3
+    assert stats["queue_depth"] == 0
+    assert stats["max_wait_seconds"] == pytest.approx(3, abs=0.05)
+
+def test_rejects_when_wait_exceeds_max_wait():
+    """
+    Test that a request is rejected, without consuming capacity, when it would wait too long.
+    """
+    limiter = RateLimiter(model_limits={test_model: (0, 600)}, max_wait=1)
+    with patch("time.sleep"):
+        limiter.acquire(test_model, tokens=600)
+        with pytest.raises(RateLimitExceeded) as excinfo:
+            limiter.acquire(test_model, tokens=100)
+        assert excinfo.value.retry_after == pytest.approx(10, abs=0.05)
+        assert limiter.acquire(test_model, tokens=5) == pytest.approx(0.5, abs=0.05)
+    assert limiter.stats()["rejected"] == 1
+
+def test_user_quotas_are_independent():
+    """
+    Test that one user exhausting their quota does not delay another.
+    """
+    limiter = RateLimiter(user_limits=(2, 0), max_wait=0)
+    limiter.acquire(test_model, user_id=1)
+    limiter.acquire(test_model, user_id=1)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(test_model, user_id=1)
+    assert limiter.acquire(test_model, user_id=2) == 0
+
+def test_redis_limiter_is_shared_across_workers():
+    """
+    Test that two limiters on one Redis draw from the same buckets atomically.
+    """
+    server = fakeredis.FakeServer()
+    workers = [
+        RedisRateLimiter(fakeredis.FakeRedis(server=server), model_limits={test_model: (4, 0)}, max_wait=0)
+        for _ in range(2)
+    ]
+    for i in range(4):
+        assert workers[i % 2].acquire(test_model) == 0
+    with pytest.raises(RateLimitExceeded):
+        workers[0].acquire(test_model)
+    with pytest.raises(RateLimitExceeded):
+        workers[1].acquire(test_model)
+
+def test_async_redis_limiter_queues_requests():
+    """
+    Test the asyncio Redis path queues requests past the bucket and reports the waits.
+    """
+    server = fakeredis.FakeServer()
+    limiter = RedisRateLimiter(
+        fakeredis.FakeRedis(server=server),
+        fakeredis.FakeAsyncRedis(server=server),
+        model_limits={test_model: (30, 0)},
+    )
+
+    async def run():
+        return await asyncio.gather(*(limiter.aacquire(test_model) for _ in range(32)))
+
+    with patch("core.services.rate_limit.asyncio.sleep", new=AsyncMock()) as sleep:
+        waits = sorted(asyncio.run(run()))
+    assert waits[:30] == [0] * 30
+    assert waits[30:] == pytest.approx([2, 4], abs=0.05)
+    assert sleep.await_count == 2
+    assert limiter.stats()["delayed"] == 2
+
+def test_redis_limiter_fails_open():
+    """
+    Test that an unreachable Redis lets requests through instead of failing them.
+    """
+    limiter = RedisRateLimiter(fakeredis.FakeRedis(), model_limits={test_model: (1, 0)}, max_wait=0)
+    with patch.object(limiter, "_script", side_effect=redis.ConnectionError("down")):
+        for _ in range(3):
+            assert limiter.acquire(test_model) == 0
+    assert limiter.redis_errors == 3
+
+@patch("openai.Completion.create")
+def test_service_throttles_upstream_calls(mock_create):
+    """
+    Test that OpenAIService consults the limiter and does not call upstream when rejected.
+    """
+    mock_create.return_value = {"choices": [{"text": "ok"}]}
+    service = OpenAIService(rate_limiter=RateLimiter(user_limits=(1, 0), max_wait=0))
+    assert service.process_query(test_query, user_id=7) == "ok"
+    with pytest.raises(RateLimitExceeded):
+        service.process_query(test_query, user_id=7)
+    assert mock_create.call_count == 1
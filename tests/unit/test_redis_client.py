@@ -0,0 +1,38 @@
+import asyncio
+
+import fakeredis  # 2.26.1: In-memory Redis stand-in for tests
+
+from core.utils import redis_client
+
+def test_get_redis_returns_shared_pooled_client():
+    """
+    Test that the factory builds one client and reuses it on every call.
+    """
+    redis_client.close_redis()
+    client = redis_client.get_redis()
+    try:
+        assert redis_client.get_redis() is client
+        assert client.connection_pool.max_connections == redis_client.settings.REDIS_MAX_CONNECTIONS
+    finally:
+        redis_client.close_redis()
+
+def test_set_many_and_get_many_round_trip():
+    """
+    Test pipelined multi-set and multi-get, including missing keys.
+    """
+    client = fakeredis.FakeRedis()
+    redis_client.set_many({"a": "1", "b": "2"}, ttl=60, client=client)
+    assert redis_client.get_many(["a", "missing", "b"], client=client) == ["1", None, "2"]
+    assert 0 < client.ttl("a") <= 60
+    assert redis_client.get_many([], client=client) == []
+
+def test_async_set_many_and_get_many_round_trip():
+    """
+    Test the asyncio multi-set and multi-get helpers.
+    """
+    async def run():
+        client = fakeredis.FakeAsyncRedis()
+        await redis_client.aset_many({"a": "1", "b": "2"}, client=client)
+        return await redis_client.aget_many(["b", "a", "missing"], client=client)
+
+    assert asyncio.run(run()) == ["2", "1", None]
@@ -0,0 +1,198 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+from benchmarks.stub_server import StubCompletionServer
+from config.settings import settings
+from core.services.openai_service import OpenAIService
+from core.services.resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy, RetryPolicy, is_retryable
+
+# Test data
+test_query = "What is the meaning of life?"
+test_model = "text-davinci-003"
+
+@pytest.fixture
+def stub_server():
+    """
+    Fixture serving the fault-injecting stub completion endpoint and pointing settings at it.
+    """
+    server = StubCompletionServer(("127.0.0.1", 0), latency=0.005).start()
+    original_api_base = settings.OPENAI_API_BASE
+    settings.OPENAI_API_BASE = server.base_url
+    try:
+        yield server
+    finally:
+        settings.OPENAI_API_BASE = original_api_base
+        openai.api_base = original_api_base
+        server.stop()
+
+def make_service(**policy_options) -> OpenAIService:
+    """
+    Builds a service whose policy retries quickly.
+    """
+    policy_options.setdefault("retry", RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02))
+    return OpenAIService(resilience=ResiliencePolicy(**policy_options))
+
+def aprocess(service: OpenAIService, query: str = test_query) -> str:
+    async def run():
+        try:
+            return await service.aprocess_query(query, model=test_model)
+        finally:
+            await service.aclose()
+
+    return asyncio.run(run())
+
+def test_backoff_is_jittered_and_capped():
+    """
+    Test that backoff delays grow exponentially but never exceed `max_delay`.
+    """
+    retry = RetryPolicy(max_attempts=5, base_delay=0.1, max_delay=0.3)
+    for attempt in range(1, 6):
+        for _ in range(50):
+            assert 0 <= retry.backoff(attempt) <= min(0.3, 0.1 * 2 ** (attempt - 1))
+
+def test_is_retryable():
+    """
+    Test that only transient upstream failures are retried.
+    """
+    assert is_retryable(openai.error.Timeout("timeout"))
+    assert is_retryable(openai.error.ServiceUnavailableError("unavailable"))
+    assert is_retryable(openai.error.RateLimitError("slow down"))
+    assert is_retryable(openai.error.APIError("server error", http_status=502))
+    assert not is_retryable(openai.error.APIError("unknown"))
+    assert not is_retryable(openai.error.InvalidRequestError("bad request", param=None))
+    assert not is_retryable(CircuitOpenError("open"))
+
+def test_circuit_breaker_opens_and_recovers():
+    """
+    Test the closed -> open -> half-open -> closed cycle.
+    """
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial call at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_cancelled_trial_call_releases_half_open_slot():
+    """
+    Test that cancelling the half-open trial call frees its slot instead of
+    leaving the circuit rejecting every call.
+    """
+    policy = ResiliencePolicy(failure_threshold=1, recovery_timeout=0.01)
+    breaker = policy.breaker("model")
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    async def hang(timeout: float) -> str:
+        await asyncio.sleep(10)
+        return "late"
+
+    async def ok(timeout: float) -> str:
+        return "ok"
+
+    async def run():
+        trial = asyncio.ensure_future(policy.acall("model", hang))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        return await policy.acall("model", ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_retries_transient_errors(stub_server):
+    """
+    Test that 5xx responses are retried until the upstream recovers.
+    """
+    stub_server.fail_next(2, status=503)
+    service = make_service()
+    assert aprocess(service) == StubCompletionServer.completion_text(test_query)
+    assert stub_server.request_count == 3
+    assert service.resilience.counters["retries"] == 2
+
+def test_sync_process_query_retries(stub_server):
+    """
+    Test that the sync path applies the same retry policy.
+    """
+    stub_server.fail_next(1, status=500)
+    service = make_service()
+    assert service.process_query(test_query, model=test_model) == StubCompletionServer.completion_text(test_query)
+    assert stub_server.request_count == 2
+
+def test_gives_up_after_max_attempts(stub_server):
+    """
+    Test that the last error is raised once every attempt has failed.
+    """
+    stub_server.fail_next(5, status=503)
+    service = make_service()
+    with pytest.raises(openai.error.ServiceUnavailableError):
+        aprocess(service)
+    assert stub_server.request_count == 3
+    assert service.resilience.counters["failures"] == 1
+
+def test_client_errors_are_not_retried(stub_server):
+    """
+    Test that a 4xx response fails immediately.
+    """
+    stub_server.fail_next(1, status=400)
+    service = make_service()
+    with pytest.raises(openai.error.InvalidRequestError):
+        aprocess(service)
+    assert stub_server.request_count == 1
+
+def test_deadline_bounds_slow_upstream(stub_server):
+    """
+    Test that a hung upstream call is abandoned at the model's deadline.
+    """
+    stub_server.fail_next(3, status=None, delay=2.0)
+    service = make_service(deadlines={test_model: 0.2})
+    started = time.perf_counter()
+    with pytest.raises(openai.error.Timeout):
+        aprocess(service)
+    assert time.perf_counter() - started < 1.0
+    assert service.resilience.counters["timeouts"] >= 1
+
+def test_open_circuit_short_circuits(stub_server):
+    """
+    Test that once the breaker opens, calls fail fast without reaching upstream.
+    """
+    stub_server.error_rate = 1.0
+    service = make_service(retry=RetryPolicy(max_attempts=1), failure_threshold=2, recovery_timeout=60)
+    for _ in range(2):
+        with pytest.raises(openai.error.ServiceUnavailableError):
+            service.process_query(test_query, model=test_model)
+    with pytest.raises(CircuitOpenError):
+        service.process_query(test_query, model=test_model)
+    assert stub_server.request_count == 2
+    assert service.resilience.stats()["breakers"] == {test_model: CircuitBreaker.OPEN}
+
+def test_hedged_request_trims_tail_latency(stub_server):
+    """
+    Test that a slow first attempt is overtaken by a hedged second attempt.
+    """
+    stub_server.fail_next(1, status=None, delay=2.0)
+    service = make_service(hedge_delay=0.05)
+    started = time.perf_counter()
+    assert aprocess(service) == StubCompletionServer.completion_text(test_query)
+    assert time.perf_counter() - started < 1.0
+    assert service.resilience.counters["hedges"] == 1
+    assert service.resilience.counters["hedge_wins"] == 1
@@ -0,0 +1,155 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from core.services import semantic_cache
+from core.services.openai_service import OpenAIService
+from core.services.semantic_cache import HashingEmbedder, SemanticCache, VectorIndex, load_embedder
+
+pytestmark = pytest.mark.skipif(semantic_cache.numpy is None, reason="numpy is not installed")
+numpy = semantic_cache.numpy
+
+# Test data
+test_query = "What is the capital city of France?"
+test_paraphrase = "what is the capital city of france"
+test_model = "text-davinci-003"
+test_parameters = {"temperature": 0.7, "max_tokens": 256}
+test_response = "The capital of France is Paris."
+
+def unit_vectors(count: int, dim: int = 32, seed: int = 0):
+    vectors = numpy.random.default_rng(seed).standard_normal((count, dim)).astype(numpy.float32)
+    return vectors / numpy.linalg.norm(vectors, axis=1, keepdims=True)
+
+def cosine(a, b) -> float:
+    return float(a @ b / (numpy.linalg.norm(a) * numpy.linalg.norm(b)))
+
+def test_hashing_embedder_scores_rewording_above_unrelated_text():
+    """
+    Test that the hashing embedder is deterministic and places rewordings near each other.
+    """
+    embed = HashingEmbedder(dim=256)
+    assert numpy.array_equal(embed(test_query), embed(test_query))
+    assert cosine(embed(test_query), embed(test_paraphrase)) == pytest.approx(1.0)
+    reworded = cosine(embed(test_query), embed("What's the capital city of France?"))
+    unrelated = cosine(embed(test_query), embed("Write a haiku about autumn leaves."))
+    assert reworded > 0.7 > unrelated
+
+def test_load_embedder_resolves_module_paths():
+    """
+    Test that SEMANTIC_CACHE_EMBEDDER accepts "hashing" or a "module:function" path.
+    """
+    assert isinstance(load_embedder("hashing", dim=64), HashingEmbedder)
+    assert load_embedder("core.services.semantic_cache:HashingEmbedder") is HashingEmbedder
+
+def test_vector_index_brute_force_and_ring_eviction():
+    """
+    Test nearest-neighbour search and that a full index overwrites its oldest rows.
+    """
+    vectors = unit_vectors(6)
+    index = VectorIndex(dim=32, max_entries=4)
+    assert [index.add(v) for v in vectors[:4]] == [0, 1, 2, 3]
+    slots, scores = index.search(vectors[2], k=2)
+    assert slots[0] == 2 and scores[0] == pytest.approx(1.0) and scores[0] >= scores[1]
+    assert [index.add(v) for v in vectors[4:]] == [0, 1]
+    assert len(index) == 4
+    assert index.search(vectors[4])[0][0] == 0
+    assert index.search(vectors[0])[1][0] < 0.99
+
+def test_vector_index_ivf_matches_brute_force():
+    """
+    Test that IVF trains once enough vectors are stored and finds the same
+    nearest neighbours as brute force when every list is probed.
+    """
+    vectors = unit_vectors(600)
+    index = VectorIndex(dim=32, max_entries=500, ivf_lists=8, ivf_nprobe=8, ivf_train_size=200)
+    exact = VectorIndex(dim=32, max_entries=500)
+    for v in vectors:
+        index.add(v)
+        exact.add(v)
+    assert index.trained and len(index) == 500
+    queries = unit_vectors(50, seed=1)
+    for q in queries:
+        assert index.search(q)[0][0] == exact.search(q)[0][0]
+    # Overwritten rows are no longer returned under their old vectors.
+    assert index.search(vectors[0])[1][0] < 0.99
+    assert index.search(vectors[599])[0][0] == 99
+
+def test_semantic_cache_threshold_per_model_and_parameters():
+    """
+    Test that hits require the model's threshold and the same model and parameters.
+    """
+    cache = SemanticCache(HashingEmbedder(dim=256), thresholds={"strict-model": 0.999}, default_threshold=0.7)
+    cache.store(test_model, test_query, test_parameters, test_response)
+    cache.store("strict-model", test_query, test_parameters, test_response)
+    assert cache.lookup(test_model, "What's the capital city of France?", test_parameters) == test_response
+    assert cache.lookup("strict-model", "What's the capital city of France?", test_parameters) is None
+    assert cache.lookup(test_model, test_query, {**test_parameters, "max_tokens": 16}) is None
+    assert cache.lookup(test_model, "Write a haiku about autumn leaves.", test_parameters) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["indexes"]) == (1, 3, 2, 2)
+    assert stats["hit_rate"] == pytest.approx(0.25)
+
+def test_semantic_cache_default_threshold_misses_negation():
+    """
+    Test that the default threshold does not answer a prompt with the
+    completion of its negation, which the hashing embedder scores close to it.
+    """
+    prompt = (
+        "Write a short polite email to my landlord explaining that I will be able to pay the rent "
+        "for this month on time and thanking them for their patience with the repairs"
+    )
+    negated = prompt.replace("I will be able", "I will not be able")
+    embed = HashingEmbedder()
+    assert cosine(embed(prompt), embed(negated)) > 0.95
+    cache = SemanticCache(embed)
+    cache.store(test_model, prompt, test_parameters, test_response)
+    assert cache.lookup(test_model, negated, test_parameters) is None
+    assert cache.lookup(test_model, prompt.lower(), test_parameters) == test_response
+
+def test_semantic_cache_bounds_parameter_sets():
+    """
+    Test that only `max_indexes` parameter sets are kept, least recently
+    used dropped first, and that unhashable parameter values work.
+    """
+    cache = SemanticCache(HashingEmbedder(dim=64), default_threshold=0.9, max_indexes=2)
+    for temperature in (0.1, 0.2, 0.3):
+        cache.store(test_model, test_query, {"temperature": temperature}, str(temperature))
+    assert cache.stats()["indexes"] == 2
+    assert cache.lookup(test_model, test_query, {"temperature": 0.1}) is None
+    assert cache.lookup(test_model, test_query, {"temperature": 0.2}) == "0.2"
+    cache.store(test_model, test_query, {"temperature": 0.4}, "0.4")
+    assert cache.lookup(test_model, test_query, {"temperature": 0.2}) == "0.2"
+    assert cache.lookup(test_model, test_query, {"temperature": 0.3}) is None
+    cache.store(test_model, test_query, {"stop": ["###"]}, test_response)
+    assert cache.lookup(test_model, test_query, {"stop": ["###"]}) == test_response
+
+@patch("openai.Completion.create")
+def test_process_query_uses_semantic_cache(mock_create):
+    """
+    Test that a reworded prompt is answered from the semantic cache with a
+    pluggable embedding function, without an upstream call.
+    """
+    embeddings = {test_query: [1.0, 0.0], test_paraphrase: [0.98, 0.2], "unrelated": [0.0, 1.0]}
+    cache = SemanticCache(embeddings.__getitem__, default_threshold=0.95)
+    mock_create.return_value = {"choices": [{"text": test_response}]}
+    service = OpenAIService(cache=None, semantic_cache=cache)
+    assert service.process_query(test_query, model=test_model, parameters=test_parameters) == test_response
+    assert service.process_query(test_paraphrase, model=test_model, parameters=test_parameters) == test_response
+    mock_create.assert_called_once()
+    service.process_query("unrelated", model=test_model, parameters=test_parameters)
+    assert mock_create.call_count == 2
+
+def test_aprocess_query_uses_semantic_cache():
+    """
+    Test the semantic cache on the async path.
+    """
+    service = OpenAIService(cache=None, semantic_cache=SemanticCache(HashingEmbedder(), default_threshold=0.9))
+    service._acomplete = AsyncMock(return_value=test_response)
+
+    async def run():
+        first = await service.aprocess_query(test_query, model=test_model, parameters=test_parameters)
+        second = await service.aprocess_query(test_paraphrase, model=test_model, parameters=test_parameters)
+        return first, second
+
+    assert asyncio.run(run()) == (test_response, test_response)
+    service._acomplete.assert_awaited_once()
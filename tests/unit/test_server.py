@@ -0,0 +1,264 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List
+
+import pytest
+from fastapi import FastAPI
+
+ROOT = Path(__file__).resolve().parents[2]
+
+def make_test_app() -> FastAPI:
+    """
+    App factory for the supervisor under test: records worker lifecycle
+    events in SERVER_TEST_EVENTS and serves a slow endpoint.
+    """
+    events = os.environ["SERVER_TEST_EVENTS"]
+
+    def record(event: str) -> None:
+        with open(events, "a") as f:
+            f.write(f"{event} {os.getpid()}\n")
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        record("start")
+        yield
+        record("stop")
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/slow")
+    async def slow(delay: float = 1.0):
+        await asyncio.sleep(delay)
+        return {"pid": os.getpid()}
+
+    return app
+
+def make_write_behind_app() -> FastAPI:
+    """
+    App factory whose worker queues rows with write-behind and takes longer
+    to flush them than the supervisor used to allow after the drain.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from core.database import models
+    from core.database.write_behind import WriteBehindQueue
+
+    events = os.environ["SERVER_TEST_EVENTS"]
+    engine = create_engine(f"sqlite:///{os.environ['SERVER_TEST_DB']}")
+    models.Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+
+    def slow_sessions():
+        db = sessions()
+        execute = db.execute
+
+        def slow_execute(*args, **kwargs):
+            time.sleep(6.5)
+            return execute(*args, **kwargs)
+
+        db.execute = slow_execute
+        return db
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.write_behind = WriteBehindQueue(slow_sessions, flush_interval=60)
+        with open(events, "a") as f:
+            f.write(f"start {os.getpid()}\n")
+        yield
+        app.state.write_behind.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.post("/write")
+    async def write():
+        app.state.write_behind.enqueue({"user_id": 1, "query_text": "q", "model": "m", "parameters": {}, "response": "r"})
+        return {"queued": True}
+
+    return app
+
+def make_metrics_app() -> FastAPI:
+    """
+    App factory for the test app with request metrics and a /metrics endpoint.
+    """
+    from fastapi.responses import Response
+
+    from core.utils import metrics
+
+    app = make_test_app()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics")
+    def get_metrics():
+        content, content_type = metrics.render()
+        return Response(content, media_type=content_type)
+
+    return app
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def read_events(path: Path, event: str) -> List[int]:
+    if not path.exists():
+        return []
+    return [int(line.split()[1]) for line in path.read_text().splitlines() if line.startswith(event)]
+
+def wait_for(condition, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met in time")
+        time.sleep(0.05)
+
+@pytest.fixture
+def server(tmp_path):
+    """
+    Fixture running the supervisor with two workers of the test app.
+    """
+    events = tmp_path / "events"
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "api.server",
+            "--app", "tests.unit.test_server:make_test_app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "2", "--graceful-timeout", "5",
+        ],
+        cwd=ROOT,
+        env={**os.environ, "SERVER_TEST_EVENTS": str(events)},
+    )
+    try:
+        wait_for(lambda: len(read_events(events, "start")) == 2)
+        yield process, port, events
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def test_sigterm_drains_in_flight_requests(server):
+    """
+    Test that SIGTERM lets in-flight requests finish and runs every worker's shutdown hook.
+    """
+    process, port, events = server
+    responses = []
+
+    def request() -> None:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/slow?delay=1", timeout=10) as response:
+            responses.append((response.status, json.load(response)))
+
+    client = threading.Thread(target=request)
+    client.start()
+    time.sleep(0.3)
+    process.send_signal(signal.SIGTERM)
+    client.join(10)
+
+    assert responses and responses[0][0] == 200
+    assert process.wait(15) == 0
+    assert sorted(read_events(events, "stop")) == sorted(read_events(events, "start"))
+
+def test_dead_workers_are_replaced(server):
+    """
+    Test that a worker killed outright is replaced by a fresh one.
+    """
+    process, port, events = server
+    os.kill(read_events(events, "start")[0], signal.SIGKILL)
+    wait_for(lambda: len(read_events(events, "start")) == 3)
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/slow?delay=0", timeout=10) as response:
+        assert response.status == 200
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(15) == 0
+
+def test_sigterm_keeps_pending_write_behind_rows(tmp_path):
+    """
+    Test that a worker flushing write-behind rows after the drain is not
+    killed before the flush commits.
+    """
+    from sqlalchemy import create_engine, text
+
+    events, database_path, port = tmp_path / "events", tmp_path / "test.db", free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "api.server",
+            "--app", "tests.unit.test_server:make_write_behind_app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "1", "--graceful-timeout", "1",
+        ],
+        cwd=ROOT,
+        env={
+            **os.environ,
+            "SERVER_TEST_EVENTS": str(events),
+            "SERVER_TEST_DB": str(database_path),
+            "WRITE_BEHIND_ENABLED": "true",
+        },
+    )
+    try:
+        wait_for(lambda: len(read_events(events, "start")) == 1)
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/write", method="POST")
+        with urllib.request.urlopen(request, timeout=10) as response:
+            assert response.status == 200
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(30) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    engine = create_engine(f"sqlite:///{database_path}")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM queries")).scalar_one() == 1
+    engine.dispose()
+
+def test_metrics_cover_every_worker(tmp_path):
+    """
+    Test that each scrape reports the requests of every worker, including
+    one that has since been replaced.
+    """
+    events, port = tmp_path / "events", free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "api.server",
+            "--app", "tests.unit.test_server:make_metrics_app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "2",
+        ],
+        cwd=ROOT,
+        env={
+            **{key: value for key, value in os.environ.items() if key != "PROMETHEUS_MULTIPROC_DIR"},
+            "SERVER_TEST_EVENTS": str(events),
+            "METRICS_ENABLED": "true",
+        },
+    )
+    sample = 'http_request_seconds_count{method="GET",route="/slow",status="200"} 6.0'
+
+    def scrape() -> str:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as response:
+            return response.read().decode()
+
+    try:
+        wait_for(lambda: len(read_events(events, "start")) == 2)
+        for _ in range(6):
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/slow?delay=0", timeout=10) as response:
+                assert response.status == 200
+        # Requests are observed once their response has been sent.
+        wait_for(lambda: sample in scrape())
+        os.kill(read_events(events, "start")[0], signal.SIGKILL)
+        wait_for(lambda: len(read_events(events, "start")) == 3)
+        for _ in range(4):
+            assert sample in scrape()
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(15) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
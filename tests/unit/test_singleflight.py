@@ -0,0 +1,134 @@
+import asyncio
+
+import fakeredis  # 2.26.1: In-memory Redis stand-in for tests
+from unittest.mock import AsyncMock, patch
+
+from core.services.openai_service import OpenAIService
+from core.services.singleflight import RedisSingleFlight, SingleFlight
+
+# Test data
+test_query = "What is the meaning of life?"
+test_response = "The meaning of life is a question that has been pondered..."
+
+def make_slow_call(result: str = test_response, delay: float = 0.05):
+    """
+    Returns a coroutine function that counts its calls and resolves after `delay`.
+    """
+    calls = {"count": 0}
+
+    async def call() -> str:
+        calls["count"] += 1
+        await asyncio.sleep(delay)
+        return result
+
+    return call, calls
+
+def test_singleflight_coalesces_concurrent_calls():
+    """
+    Test that concurrent callers of one key share a single execution.
+    """
+    singleflight = SingleFlight()
+    call, calls = make_slow_call()
+
+    async def run():
+        return await asyncio.gather(*(singleflight.do("key", call) for _ in range(10)))
+
+    assert asyncio.run(run()) == [test_response] * 10
+    assert calls["count"] == 1
+    assert singleflight.coalesced == 9
+    assert len(singleflight) == 0
+
+def test_singleflight_propagates_errors_to_all_callers():
+    """
+    Test that a failing leader raises the same error for every waiting caller.
+    """
+    singleflight = SingleFlight()
+
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(*(singleflight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(singleflight) == 0
+
+def test_singleflight_survives_cancelled_leader():
+    """
+    Test that cancelling the leader does not cancel its followers: one of
+    them runs the call again and all of them get its result.
+    """
+    singleflight = SingleFlight()
+    call, calls = make_slow_call()
+
+    async def run():
+        leader = asyncio.create_task(singleflight.do("key", call))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(singleflight.do("key", call)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        assert leader.cancelled()
+        return results
+
+    assert asyncio.run(run()) == [test_response] * 3
+    assert calls["count"] == 2
+    assert singleflight.leaders == 2
+    assert len(singleflight) == 0
+
+def test_singleflight_runs_again_after_completion():
+    """
+    Test that sequential calls are not coalesced once the first has finished.
+    """
+    singleflight = SingleFlight()
+    call, calls = make_slow_call(delay=0)
+
+    async def run():
+        await singleflight.do("key", call)
+        await singleflight.do("key", call)
+
+    asyncio.run(run())
+    assert calls["count"] == 2
+
+def test_redis_singleflight_coalesces_across_workers():
+    """
+    Test that two workers sharing Redis issue only one upstream call.
+    """
+    server = fakeredis.FakeServer()
+    call, calls = make_slow_call(delay=0.2)
+
+    async def run():
+        worker_a = RedisSingleFlight(fakeredis.FakeAsyncRedis(server=server), wait_timeout=5)
+        worker_b = RedisSingleFlight(fakeredis.FakeAsyncRedis(server=server), wait_timeout=5)
+        first = asyncio.create_task(worker_a.do("key", call))
+        await asyncio.sleep(0.05)
+        second = await worker_b.do("key", call)
+        return await first, second, worker_b.remote_hits
+
+    first, second, remote_hits = asyncio.run(run())
+    assert first == second == test_response
+    assert calls["count"] == 1
+    assert remote_hits == 1
+
+@patch("openai.Completion.acreate", new_callable=AsyncMock)
+def test_aprocess_query_coalesces_identical_queries(mock_acreate):
+    """
+    Test that identical concurrent async queries reach upstream once.
+    """
+    async def slow_completion(**kwargs):
+        await asyncio.sleep(0.05)
+        return {"choices": [{"text": test_response}]}
+
+    mock_acreate.side_effect = slow_completion
+    service = OpenAIService(singleflight=SingleFlight())
+
+    async def run():
+        try:
+            return await asyncio.gather(*(service.aprocess_query(test_query) for _ in range(5)))
+        finally:
+            await service.aclose()
+
+    assert asyncio.run(run()) == [test_response] * 5
+    assert mock_acreate.await_count == 1
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+from fastapi.testclient import TestClient
+
+from api.main import create_app
+from config.settings import settings
+from core.database import database
+from core.utils import utils
+
+ROOT = Path(__file__).resolve().parents[2]
+
+def import_times(code: str) -> Dict[str, int]:
+    """
+    Runs `code` in a fresh interpreter under `-X importtime` and returns the
+    cumulative import time, in microseconds, of every module it imported.
+    """
+    env = {**os.environ, "METRICS_ENABLED": "false"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times
+
+def test_importing_main_is_cheap():
+    """
+    Test that importing the entry point does not pull in the routes, database or server.
+    """
+    times = import_times("import api.main")
+    assert "api.main" in times
+    for module in ("api.routes", "sqlalchemy", "openai", "redis", "uvicorn"):
+        assert module not in times, f"{module} imported by api.main"
+
+def test_create_app_defers_engines_and_optional_modules():
+    """
+    Test that building the app neither connects the database nor imports disabled extras.
+    """
+    times = import_times("from api.main import create_app; create_app()")
+    assert "api.routes" in times
+    for module in ("uvicorn", "prometheus_client", "sqlalchemy.dialects.sqlite"):
+        assert module not in times, f"{module} imported by create_app()"
+
+def test_lifespan_creates_and_releases_resources(monkeypatch):
+    """
+    Test that the engine is created on startup, and that it and the password
+    hashing pool are released on shutdown.
+    """
+    monkeypatch.setattr(settings, "DATABASE_URL", "sqlite://")
+    database.dispose_engine()
+    with TestClient(create_app()):
+        assert database._engine is not None
+        utils._get_hashing_executor()
+    assert database._engine is None
+    assert utils._hashing_executor is None
@@ -0,0 +1,162 @@
+from unittest.mock import patch
+
+import openai
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from config.settings import settings
+from core.database import database, models
+from core.services import tokens
+from core.services.openai_service import OpenAIService
+from core.services.resilience import is_retryable
+from core.services.tokens import ContextWindowExceeded, clear_token_counts, context_window, count_tokens, fit_to_context
+
+# Test data
+test_model = "text-davinci-003"
+
+class WordEncoding:
+    """Stand-in tiktoken encoding with one token per whitespace-separated word."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, words):
+        return " ".join(words)
+
+@pytest.fixture
+def word_tokens():
+    """
+    Fixture counting one token per word for every model.
+    """
+    clear_token_counts()
+    with patch.object(tokens, "get_encoding", return_value=WordEncoding()):
+        yield
+    clear_token_counts()
+
+def words(n: int) -> str:
+    return " ".join(f"w{i}" for i in range(n))
+
+def test_count_tokens_uses_encoding_and_caches(word_tokens):
+    """
+    Test that counts come from the model's encoding and repeat prompts are not re-encoded.
+    """
+    assert count_tokens("one two three", test_model) == 3
+    with patch.object(WordEncoding, "encode") as encode:
+        assert count_tokens("one two three", test_model) == 3
+    encode.assert_not_called()
+
+def test_count_tokens_memoises_digests_of_prompts_only(word_tokens):
+    """
+    Test that the memo holds digests rather than texts, stays within its
+    size, and skips text counted with memoise=False.
+    """
+    with patch.object(settings, "TOKEN_COUNT_CACHE_SIZE", 2):
+        for text in ("one", "one two", "one two three"):
+            count_tokens(text, test_model)
+        assert count_tokens("a completion", test_model, memoise=False) == 2
+    assert len(tokens._token_counts) == 2
+    assert all(isinstance(digest, bytes) and len(digest) == 16 for _, digest in tokens._token_counts)
+    assert list(tokens._token_counts.values()) == [2, 3]
+
+def test_count_tokens_estimates_without_tokenizer():
+    """
+    Test the character-based estimate used when no encoding is available.
+    """
+    clear_token_counts()
+    with patch.object(tokens, "get_encoding", return_value=None):
+        assert count_tokens("abcdefgh", test_model) == 3
+    clear_token_counts()
+
+def test_context_window_lookup():
+    """
+    Test exact, prefix, configured and default context windows.
+    """
+    assert context_window("text-davinci-003") == 4097
+    assert context_window("gpt-4-0613") == 8192
+    assert context_window("gpt-4-32k-0613") == 32768
+    assert context_window("unknown-model") == settings.DEFAULT_CONTEXT_WINDOW
+    with patch.object(settings, "MODEL_CONTEXT_WINDOWS", {"my-fine-tune": 1000}):
+        assert context_window("my-fine-tune") == 1000
+
+def test_fit_rejects_oversized_requests(word_tokens):
+    """
+    Test that an overflowing request is rejected with its token counts, and is not retried.
+    """
+    with patch.dict(tokens.CONTEXT_WINDOWS, {"tiny": 100}):
+        assert fit_to_context(words(50), "tiny", 50) == (words(50), 50, 50, False)
+        with pytest.raises(ContextWindowExceeded) as excinfo:
+            fit_to_context(words(60), "tiny", 50)
+    error = excinfo.value
+    assert (error.prompt_tokens, error.max_tokens, error.context_window) == (60, 50, 100)
+    assert isinstance(error, openai.error.InvalidRequestError)
+    assert not is_retryable(error)
+
+def test_fit_truncates(word_tokens):
+    """
+    Test that truncation shortens the completion first, then drops the start of the prompt.
+    """
+    with patch.dict(tokens.CONTEXT_WINDOWS, {"tiny": 100}):
+        budget = fit_to_context(words(60), "tiny", 50, "truncate", min_completion_tokens=16)
+        assert (budget.prompt_tokens, budget.max_tokens, budget.truncated) == (60, 40, False)
+
+        budget = fit_to_context(words(95), "tiny", 50, "truncate", min_completion_tokens=16)
+        assert (budget.prompt_tokens, budget.max_tokens, budget.truncated) == (84, 16, True)
+        assert budget.prompt.endswith("w94")
+
+@patch("openai.Completion.create")
+def test_service_rejects_before_dispatch(mock_create, word_tokens):
+    """
+    Test that an oversized prompt never reaches upstream, and a truncated one is sent shortened.
+    """
+    mock_create.return_value = {"choices": [{"text": "ok"}]}
+    service = OpenAIService()
+    with patch.dict(tokens.CONTEXT_WINDOWS, {test_model: 100}):
+        with pytest.raises(ContextWindowExceeded):
+            service.process_query(words(99), model=test_model, parameters={"max_tokens": 50})
+        mock_create.assert_not_called()
+
+        with patch.object(settings, "CONTEXT_OVERFLOW_POLICY", "truncate"):
+            assert service.process_query(words(70), model=test_model, parameters={"max_tokens": 50}) == "ok"
+    assert mock_create.call_args.kwargs["max_tokens"] == 30
+
+def test_stored_rows_record_token_counts(word_tokens):
+    """
+    Test that stored queries carry the prompt and completion token counts.
+    """
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        query = database.store_query_and_response(db, 1, "how many tokens", test_model, {}, "four tokens right here")
+        assert (query.prompt_tokens, query.completion_tokens) == (3, 4)
+    finally:
+        db.close()
+        engine.dispose()
+
+@patch("openai.Completion.create")
+def test_truncated_prompts_are_stored_with_budgeted_tokens(mock_create, word_tokens):
+    """
+    Test that a truncated prompt is recorded with the token count that was
+    sent, not the count of the original query text.
+    """
+    mock_create.return_value = {"choices": [{"text": "ok"}]}
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        usage = {}
+        with patch.dict(tokens.CONTEXT_WINDOWS, {test_model: 100}), patch.object(settings, "CONTEXT_OVERFLOW_POLICY", "truncate"):
+            response = OpenAIService().process_query(words(95), model=test_model, parameters={"max_tokens": 50}, usage=usage)
+        assert usage == {"prompt_tokens": 84}
+
+        query = database.store_query_and_response(db, 1, words(95), test_model, {}, response, prompt_tokens=usage["prompt_tokens"])
+        assert query.prompt_tokens == 84
+        pending = database.reserve_query(db, 1, words(95), test_model, {})
+        assert pending.prompt_tokens == 95
+        database.complete_query(db, pending.id, response, usage["prompt_tokens"])
+        db.refresh(pending)
+        assert pending.prompt_tokens == 84
+    finally:
+        db.close()
+        engine.dispose()
@@ -0,0 +1,143 @@
+import io
+import json
+
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.database import database, models, transfer
+
+# Test data
+test_model = "text-davinci-003"
+test_parameters = {"temperature": 0.7, "max_tokens": 256}
+
+def make_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    return engine
+
+@pytest.fixture
+def source(tmp_path):
+    """
+    Fixture providing a database with 25 queries of user 1 and 5 of user 2.
+    """
+    engine = make_engine(tmp_path / "source.db")
+    db = sessionmaker(bind=engine)()
+    try:
+        database.store_queries_and_responses(
+            db, 1, [dict(query_text=f"q{i}", model=test_model, parameters=test_parameters, response=f"r{i}") for i in range(25)]
+        )
+        database.store_queries_and_responses(
+            db, 2, [dict(query_text=f"other {i}", model=test_model, parameters={}, response="x") for i in range(5)]
+        )
+    finally:
+        db.close()
+    yield engine
+    engine.dispose()
+
+def test_export_streams_bounded_batches(source):
+    """
+    Test that exports are read in batches of at most `batch_size` rows, oldest first.
+    """
+    db = sessionmaker(bind=source)()
+    try:
+        batches = list(transfer.iter_export_batches(db, user_id=1, batch_size=10))
+    finally:
+        db.close()
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    records = [record for batch in batches for record in batch]
+    assert [record["query_text"] for record in records] == [f"q{i}" for i in range(25)]
+    assert set(records[0]) == set(transfer.EXPORT_COLUMNS)
+    assert records[0]["parameters"] == test_parameters
+
+def test_ndjson_round_trip(source, tmp_path):
+    """
+    Test exporting a user's history as NDJSON and importing it into another database.
+    """
+    output = io.BytesIO()
+    db = sessionmaker(bind=source)()
+    try:
+        assert transfer.export(db, output, "ndjson", user_id=1, batch_size=7) == 25
+    finally:
+        db.close()
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 25
+    exported = [json.loads(line) for line in lines]
+
+    target = make_engine(tmp_path / "target.db")
+    try:
+        assert transfer.import_rows(target, transfer.read_ndjson(io.BytesIO(output.getvalue())), user_id=9, batch_size=10) == 25
+        db = sessionmaker(bind=target)()
+        try:
+            imported = [record for batch in transfer.iter_export_batches(db, user_id=9) for record in batch]
+        finally:
+            db.close()
+    finally:
+        target.dispose()
+    strip = lambda record: {k: v for k, v in record.items() if k not in ("id", "user_id")}
+    assert [strip(record) for record in imported] == [strip(record) for record in exported]
+
+def test_import_keeps_ids(source, tmp_path):
+    """
+    Test that `keep_ids` preserves exported row IDs.
+    """
+    db = sessionmaker(bind=source)()
+    try:
+        records = [record for batch in transfer.iter_export_batches(db, user_id=2) for record in batch]
+    finally:
+        db.close()
+    target = make_engine(tmp_path / "target.db")
+    try:
+        transfer.import_rows(target, records, keep_ids=True)
+        db = sessionmaker(bind=target)()
+        try:
+            assert [query.id for query in db.query(models.Query).order_by(models.Query.id)] == [26, 27, 28, 29, 30]
+        finally:
+            db.close()
+    finally:
+        target.dispose()
+
+def test_export_endpoint(source, tmp_path):
+    """
+    Test that the export endpoint streams only the caller's history.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from api import routes
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'source.db'}", poolclass=NullPool)
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.dependency_overrides[routes.get_current_user_id] = lambda: 2
+    with patch.object(database, "AsyncSessionLocal", async_sessionmaker(async_engine, expire_on_commit=False)):
+        response = TestClient(app).get("/queries/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.content.splitlines()]
+    assert [record["query_text"] for record in records] == [f"other {i}" for i in range(5)]
+    assert TestClient(app).get("/queries/export?format=csv").status_code == 422
+
+@pytest.mark.skipif(transfer.pyarrow is None, reason="pyarrow is not installed")
+def test_parquet_round_trip(source, tmp_path):
+    """
+    Test exporting to Parquet, one row group per batch, and importing it back.
+    """
+    path = tmp_path / "history.parquet"
+    db = sessionmaker(bind=source)()
+    try:
+        with open(path, "wb") as output:
+            assert transfer.export(db, output, "parquet", user_id=1, batch_size=10) == 25
+    finally:
+        db.close()
+    assert transfer.pyarrow.parquet.ParquetFile(path).num_row_groups == 3
+    records = list(transfer.read_parquet(str(path)))
+    assert records[0]["parameters"] == test_parameters
+    target = make_engine(tmp_path / "target.db")
+    try:
+        assert transfer.import_rows(target, records) == 25
+    finally:
+        target.dispose()
@@ -1,7 +1,9 @@
+import asyncio
 import unittest
+from unittest.mock import patch
 import bcrypt
 import jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from core.utils import utils
 from config.settings import settings
@@ -20,7 +22,7 @@ class TestUtils(unittest.TestCase):
         # Verify token structure and payload
         decoded_token = jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"])
         self.assertEqual(decoded_token["user_id"], user_id)
-        self.assertGreater(decoded_token["exp"], datetime.utcnow())
+        self.assertGreater(decoded_token["exp"], datetime.now(timezone.utc).timestamp())
 
     def test_verify_token(self):
         """
@@ -34,10 +36,42 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(payload["user_id"], user_id)
 
         # Generate an expired token
-        expired_token = jwt.encode({"user_id": 789, "exp": datetime.utcnow() - timedelta(minutes=1)}, settings.JWT_SECRET, algorithm="HS256").decode("utf-8")
+        expired_token = jwt.encode({"user_id": 789, "exp": datetime.utcnow() - timedelta(minutes=1)}, settings.JWT_SECRET, algorithm="HS256")
         payload = utils.verify_token(expired_token)
         self.assertIsNone(payload)
 
+    def test_verify_token_uses_cache(self):
+        """
+        Tests that a repeated token is served from the verified-token cache.
+        """
+        utils.token_cache.clear()
+        token = utils.generate_token(321)
+        self.assertEqual(utils.verify_token(token)["user_id"], 321)
+        with patch("jwt.decode") as mock_decode:
+            self.assertEqual(utils.verify_token(token)["user_id"], 321)
+            mock_decode.assert_not_called()
+        self.assertEqual(utils.token_cache.hits, 1)
+
+    def test_verify_token_cache_respects_expiry(self):
+        """
+        Tests that cached payloads are not served past the token's expiry.
+        """
+        utils.token_cache.clear()
+        digest = utils.token_cache.digest("token")
+        utils.token_cache.set(digest, {"user_id": 1, "exp": datetime.utcnow().timestamp() - 1})
+        self.assertIsNone(utils.token_cache.get(digest))
+
+    def test_revoke_token(self):
+        """
+        Tests that a revoked token is rejected even after being cached.
+        """
+        utils.token_cache.clear()
+        token = utils.generate_token(654)
+        self.assertIsNotNone(utils.verify_token(token))
+        utils.revoke_token(token)
+        self.assertIsNone(utils.verify_token(token))
+        self.assertIsNotNone(utils.verify_token(utils.generate_token(655)))
+
     def test_hash_password(self):
         """
         Tests the hash_password function, verifying that it generates a bcrypt hash.
@@ -60,6 +94,32 @@ class TestUtils(unittest.TestCase):
         # Incorrect password
         self.assertFalse(utils.check_password("wrongpassword", hashed_password))
 
+    @patch.object(settings, "BCRYPT_ROUNDS", 4)
+    def test_async_hash_and_check_password(self):
+        """
+        Tests that the async wrappers hash and verify passwords on the worker pool.
+        """
+        async def run():
+            hashed_password = await utils.ahash_password("testpassword")
+            return (
+                hashed_password,
+                await utils.acheck_password("testpassword", hashed_password),
+                await utils.acheck_password("wrongpassword", hashed_password),
+            )
+
+        hashed_password, correct, incorrect = asyncio.run(run())
+        self.assertTrue(hashed_password.startswith("$2b$04$"))
+        self.assertTrue(correct)
+        self.assertFalse(incorrect)
+
+    @patch.object(settings, "BCRYPT_MAX_PENDING", 0)
+    def test_async_check_password_fails_fast_when_busy(self):
+        """
+        Tests that a saturated hashing pool rejects work instead of queueing it.
+        """
+        with self.assertRaises(utils.PasswordHashingBusy):
+            asyncio.run(utils.acheck_password("testpassword", "$2b$04$invalid"))
+
     def test_cache_response(self):
         """
         Tests the cache_response function, simulating Redis caching behavior.
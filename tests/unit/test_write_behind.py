@@ -0,0 +1,128 @@
+import pytest
+from unittest.mock import Mock
+from sqlalchemy import create_engine, exc, func, select
+from sqlalchemy.orm import sessionmaker
+
+from core.database import models
+from core.database.write_behind import WriteBehindQueue
+
+# Test data
+test_row = {
+    "user_id": 1,
+    "query_text": "What is the meaning of life?",
+    "model": "text-davinci-003",
+    "parameters": {"temperature": 0.7, "max_tokens": 256},
+    "response": "The meaning of life is a profound question...",
+}
+
+@pytest.fixture(scope="function")
+def session_factory(tmp_path):
+    """
+    Fixture providing a session factory for a fresh SQLite database.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    models.Base.metadata.create_all(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+def count_rows(session_factory) -> int:
+    db = session_factory()
+    try:
+        return db.execute(select(func.count()).select_from(models.Query)).scalar_one()
+    finally:
+        db.close()
+
+def test_rows_are_flushed_in_batches(session_factory):
+    """
+    Test that queued rows are written with bulk inserts once a batch fills up.
+    """
+    write_behind = WriteBehindQueue(session_factory, batch_size=100, flush_interval=60)
+    for _ in range(250):
+        write_behind.enqueue(dict(test_row))
+    assert write_behind.flush(timeout=5)
+    assert count_rows(session_factory) == 250
+    assert write_behind.batches_written == 3
+    write_behind.close()
+
+def test_close_flushes_pending_rows(session_factory):
+    """
+    Test that closing the queue writes everything still buffered.
+    """
+    write_behind = WriteBehindQueue(session_factory, batch_size=1000, flush_interval=60)
+    for _ in range(10):
+        write_behind.enqueue(dict(test_row))
+    write_behind.close(timeout=5)
+    assert count_rows(session_factory) == 10
+    assert write_behind.depth == 0
+
+def test_failed_batches_are_retried(session_factory):
+    """
+    Test that a batch is retried until it commits instead of being dropped.
+    """
+    failures = {"remaining": 2}
+
+    def flaky_session_factory():
+        db = session_factory()
+        if failures["remaining"]:
+            failures["remaining"] -= 1
+            db.execute = Mock(side_effect=RuntimeError("database unavailable"))
+        return db
+
+    write_behind = WriteBehindQueue(flaky_session_factory, batch_size=5, flush_interval=0.01)
+    for _ in range(5):
+        write_behind.enqueue(dict(test_row))
+    assert write_behind.flush(timeout=5)
+    write_behind.close()
+    assert write_behind.failed_batches == 2
+    assert count_rows(session_factory) == 5
+
+def test_outages_never_drop_rows(session_factory):
+    """
+    Test that a batch is kept and retried for as long as the database is
+    unavailable, and nothing is dead-lettered.
+    """
+    failures = {"remaining": 12}
+
+    def unavailable_session_factory():
+        db = session_factory()
+        if failures["remaining"]:
+            failures["remaining"] -= 1
+            db.execute = Mock(side_effect=exc.OperationalError("INSERT", {}, Exception("connection reset")))
+        return db
+
+    write_behind = WriteBehindQueue(unavailable_session_factory, batch_size=5, flush_interval=0.01, max_retry_delay=0.01)
+    for _ in range(5):
+        write_behind.enqueue(dict(test_row))
+    assert write_behind.flush(timeout=5)
+    write_behind.close()
+    assert write_behind.failed_batches == 12
+    assert (write_behind.dead_lettered, write_behind.rows_written) == (0, 5)
+    assert count_rows(session_factory) == 5
+
+def test_failing_rows_are_dead_lettered(session_factory):
+    """
+    Test that a batch the database keeps rejecting is written row by row,
+    the bad row dead-lettered, and the writer keeps going.
+    """
+    write_behind = WriteBehindQueue(session_factory, batch_size=5, flush_interval=0.01)
+    for i in range(4):
+        write_behind.enqueue(dict(test_row))
+    write_behind.enqueue({**test_row, "id": 1})  # duplicates the first row's primary key
+    assert write_behind.flush(timeout=5)
+    write_behind.enqueue(dict(test_row))
+    assert write_behind.flush(timeout=5)
+    write_behind.close(timeout=5)
+    assert count_rows(session_factory) == 5
+    assert write_behind.dead_lettered == 1
+    assert write_behind.dead_letters[0]["id"] == 1
+    assert write_behind.sync_fallbacks == 0
+
+def test_closed_queue_writes_synchronously(session_factory):
+    """
+    Test that rows enqueued after shutdown has begun are written directly.
+    """
+    write_behind = WriteBehindQueue(session_factory, batch_size=1000, flush_interval=60)
+    write_behind.close()
+    write_behind.enqueue(dict(test_row))
+    assert write_behind.sync_fallbacks == 1
+    assert count_rows(session_factory) == 1